@@ -7,6 +7,7 @@ from sanic.log import logger
 import os
 import asyncio
 import json
+import threading
 from pathlib import Path
 from typing import Optional, List, Tuple
 
@@ -23,6 +24,8 @@ from modules.esqueleto import (
     ensure_file as ensure_pose_model,
     DEFAULT_MODEL_URLS as POSE_MODEL_URLS,
     draw_pose_skeleton_bgr,
+    POSE_LANDMARK_PRESETS,
+    NUM_POSE_LANDMARKS,
 )
 
 # Face (tu módulo existente “puntos_faciales”)
@@ -32,42 +35,84 @@ from modules.puntos_faciales import (
     ensure_file as ensure_face_model,
     DEFAULT_MODEL_URLS as FACE_MODEL_URLS,
     draw_landmarks_bgr as face_draw_landmarks,
+    FACE_LANDMARK_PRESETS,
+    NUM_FACE_LANDMARKS,
 )
 
 # ─────────────── WebRTC en módulo aparte ───────────────
 from connection.webrtc import build_webrtc_blueprint, TaskAdapter  # <— UPDATED
+from connection.temporal import TemporalConfig
+from connection.roi import RoiConfig
+from connection.procpool import INFER_PROCS, ProcessInferencePool, pool_adapter
 
 app = Sanic("MiAppHttpWebSocket")
 
 # ─────────────── Globals (pose + face + locks) ───────────────
 pose_landmarker_image: Optional[object] = None
 pose_landmarker_video: Optional[object] = None
-pose_lock: asyncio.Lock | None = None
+# Locks de hilo: los landmarkers de MediaPipe no son thread-safe y la detección
+# corre en hilos del executor (no en el loop).
+pose_lock = threading.Lock()
 
 face_landmarker: Optional[object] = None
-face_lock: asyncio.Lock | None = None
+face_lock = threading.Lock()
 
 # ─────────────── Flags/ENV necesarios aquí ───────────────
 POSE_USE_VIDEO = os.getenv("POSE_USE_VIDEO", "0") == "1"
+# Formato PD para la cara (vacío → PD_VERSION global; 4 = compensación de movimiento)
+FACE_PD_VERSION = int(os.getenv("FACE_PD_VERSION", "0")) or None
+# Inferencia cada N frames como máximo (0/1 = todos); entre medias se envían puntos
+# filtrados y extrapolados. La cadencia vuelve a 1 en cuanto hay movimiento.
+POSE_INFER_EVERY = int(os.getenv("POSE_INFER_EVERY", "0"))
+FACE_INFER_EVERY = int(os.getenv("FACE_INFER_EVERY", "0"))
+TEMPORAL_FILTER = os.getenv("TEMPORAL_FILTER", "one_euro")  # "one_euro" | "cv"
+
+# Inferencia sobre un recorte alrededor de los landmarks previos (pasada completa cada N)
+POSE_ROI = os.getenv("POSE_ROI", "0") == "1"
+FACE_ROI = os.getenv("FACE_ROI", "0") == "1"
+ROI_FULL_EVERY = int(os.getenv("ROI_FULL_EVERY", "30"))
+
+# Cara condicionada a la pose (si ambas tareas están activas en la sesión): solo se
+# ejecuta si la pose detectó una cabeza, y sobre el recorte alrededor de ella.
+FACE_AFTER_POSE = os.getenv("FACE_AFTER_POSE", "0") == "1"
+_POSE_HEAD = np.asarray(POSE_LANDMARK_PRESETS["head"], dtype=np.int32)
+
+
+def _pose_has_head(upstream) -> bool:
+    pose = upstream.get("pose")
+    return pose is None or pose.size > 0
+
+
+def _pose_head_points(upstream) -> Optional[np.ndarray]:
+    pose = upstream.get("pose")
+    if pose is None or pose.size == 0:
+        return None
+    return pose[:, _POSE_HEAD]
+
+
+def _temporal(max_every: int) -> Optional[TemporalConfig]:
+    return TemporalConfig(max_every=max_every, filter=TEMPORAL_FILTER) if max_every > 1 else None
+
+# Inferencia WebRTC en INFER_PROCS procesos aparte (0 = en este proceso). Cada worker
+# crea sus propios landmarkers; los frames viajan por memoria compartida.
+infer_pool: Optional[ProcessInferencePool] = (
+    ProcessInferencePool("modules.landmarkers_proceso:init_landmarkers", procs=INFER_PROCS,
+                         warn=logger.warning)
+    if INFER_PROCS > 0 else None
+)
 
 # ─────────────── Lifecycle ───────────────
 @app.listener("before_server_start")
 async def _setup(app, loop):
     """Inicializa modelos de Pose y Face (IMAGE y opcional VIDEO)."""
-    global pose_landmarker_image, pose_landmarker_video, pose_lock
-    global face_landmarker, face_lock
+    global pose_landmarker_image, pose_landmarker_video
+    global face_landmarker
 
     HERE = Path(__file__).resolve().parent
     ROOT = HERE.parent if HERE.name == "tests" else HERE
     MODEL_DIR = ROOT / "models"
     MODEL_DIR.mkdir(parents=True, exist_ok=True)
 
-    # Locks
-    if pose_lock is None:
-        pose_lock = asyncio.Lock()
-    if face_lock is None:
-        face_lock = asyncio.Lock()
-
     # ---- Pose (IMAGE) ----
     POSE_MODEL_PATH = Path(
         os.getenv("POSE_LANDMARKER_PATH", str(MODEL_DIR / "pose_landmarker.task"))
@@ -119,6 +164,20 @@ async def _setup(app, loop):
     face_landmarker = FaceLandmarkerFactory(face_cfg).create_with_fallback()
     logger.info("FaceLandmarker (IMAGE) inicializado.")
 
+    # ---- Workers de inferencia (opcional) ----
+    if infer_pool is not None:
+        # mismos umbrales que el landmarker que usaría WebRTC en este proceso
+        pose_cfg_webrtc = pose_cfg_video if POSE_USE_VIDEO else pose_cfg_image
+        infer_pool.init_args = dict(
+            pose_model=str(POSE_MODEL_PATH),
+            face_model=str(FACE_MODEL_PATH),
+            pose_min_detection=pose_cfg_webrtc.min_pose_detection_confidence,
+            pose_min_tracking=pose_cfg_webrtc.min_tracking_confidence,
+            face_min_detection=face_cfg.min_face_detection_confidence,
+        )
+        await infer_pool.start()
+        logger.info(f"Inferencia WebRTC en {infer_pool.procs} procesos: {list(infer_pool.tasks)}")
+
 @app.listener("after_server_stop")
 async def _cleanup(app, loop):
     """Libera los recursos de los landmarkers."""
@@ -145,6 +204,9 @@ async def _cleanup(app, loop):
         pass
     face_landmarker = None
 
+    if infer_pool is not None:
+        infer_pool.close()
+
     logger.info("Pose/Face Landmarkers liberados.")
 
 # ─────────────── Serializadores / Procesamiento (HTTP/WS) ───────────────
@@ -172,15 +234,9 @@ def _results_pose_to_json(result, img_shape):
 
 async def _process_pose(img_bgr: np.ndarray, return_image: bool):
     """Corre Pose (IMAGE) y opcionalmente dibuja, devolviendo JPEG bytes."""
-    global pose_landmarker_image, pose_lock
-    if pose_landmarker_image is None or pose_lock is None:
-        raise RuntimeError("PoseLandmarker (IMAGE) no está inicializado.")
-
     rgb = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB)
     mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb)
-
-    async with pose_lock:
-        result = pose_landmarker_image.detect(mp_image)
+    result = await asyncio.to_thread(_detect_pose_image, mp_image)
 
     if not return_image:
         return None, result
@@ -215,15 +271,9 @@ def _results_face_to_json(result, img_shape):
 
 async def _process_face(img_bgr: np.ndarray, return_image: bool):
     """Corre Face (IMAGE) y opcionalmente dibuja, devolviendo JPEG bytes."""
-    global face_landmarker, face_lock
-    if face_landmarker is None or face_lock is None:
-        raise RuntimeError("FaceLandmarker no está inicializado.")
-
     rgb = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB)
     mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb)
-
-    async with face_lock:
-        result = face_landmarker.detect(mp_image)
+    result = await asyncio.to_thread(_detect_face_image, mp_image)
 
     if not return_image:
         return None, result
@@ -235,95 +285,98 @@ async def _process_face(img_bgr: np.ndarray, return_image: bool):
         raise RuntimeError("No se pudo codificar JPEG.")
     return buf.tobytes(), result
 
-def _poses_px_from_result(result, img_shape) -> Tuple[int, int, List[List[Tuple[int, int]]]]:
-    """Convierte landmarks normalizados → píxeles absolutos."""
+def _landmarks_px(landmark_lists, w: int, h: int, indices=None) -> np.ndarray:
+    """Landmarks normalizados → (N,K,2) int32 en píxeles, recortados a la imagen (vectorizado).
+    Con `indices` solo se convierten esos puntos (subconjunto por sesión)."""
+    if not landmark_lists:
+        return np.zeros((0, 0, 2), dtype=np.int32)
+    if indices is None:
+        rows = [[(lm.x, lm.y) for lm in lms] for lms in landmark_lists]
+    else:
+        rows = [[(lms[i].x, lms[i].y) for i in indices] for lms in landmark_lists]
+    xy = np.array(rows, dtype=np.float64)
+    xy = np.rint(xy * (w, h))
+    np.clip(xy, 0, (w - 1, h - 1), out=xy)
+    return xy.astype(np.int32)
+
+def _poses_px_from_result(result, img_shape, indices=None) -> Tuple[int, int, np.ndarray]:
+    """Convierte landmarks normalizados → píxeles absolutos, (N,K,2) int32."""
     h, w = img_shape[:2]
-    poses_px: List[List[Tuple[int, int]]] = []
-    if not result or not getattr(result, "pose_landmarks", None):
-        return w, h, poses_px
-    for lms in result.pose_landmarks:
-        pts: List[Tuple[int, int]] = []
-        for lm in lms:
-            x = int(round(lm.x * w))
-            y = int(round(lm.y * h))
-            x = 0 if x < 0 else (w - 1 if x >= w else x)
-            y = 0 if y < 0 else (h - 1 if y >= h else y)
-            pts.append((x, y))
-        poses_px.append(pts)
-    return w, h, poses_px
+    return w, h, _landmarks_px(getattr(result, "pose_landmarks", None) if result else None, w, h, indices)
 
 # ───────── Face → píxeles y wrappers (para WebRTC) ─────────
-def _faces_px_from_result(result, img_shape) -> Tuple[int, int, List[List[Tuple[int, int]]]]:
-    """Convierte landmarks faciales normalizados → píxeles absolutos."""
+def _faces_px_from_result(result, img_shape, indices=None) -> Tuple[int, int, np.ndarray]:
+    """Convierte landmarks faciales normalizados → píxeles absolutos, (N,K,2) int32."""
     h, w = img_shape[:2]
-    faces_px: List[List[Tuple[int, int]]] = []
-    if not result or not getattr(result, "face_landmarks", None):
-        return w, h, faces_px
-    for lms in result.face_landmarks:
-        pts: List[Tuple[int, int]] = []
-        for lm in lms:
-            x = int(round(lm.x * w))
-            y = int(round(lm.y * h))
-            x = 0 if x < 0 else (w - 1 if x >= w else x)
-            y = 0 if y < 0 else (h - 1 if y >= h else y)
-            pts.append((x, y))
-        faces_px.append(pts)
-    return w, h, faces_px
+    return w, h, _landmarks_px(getattr(result, "face_landmarks", None) if result else None, w, h, indices)
 
 def _make_mp_image(rgb_np: np.ndarray):
     # rgb_np: (H,W,3) uint8
     return mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb_np)
 
-async def _detect_pose_image(mp_image: mp.Image):
-    global pose_landmarker_image, pose_lock
-    if pose_landmarker_image is None or pose_lock is None:
+# Detectores síncronos: el bucle WebRTC los ejecuta en el scheduler (INFER_SCHEDULER=1)
+# o en el executor de inferencia (fijado a los núcleos 'infer' con CPU_AFFINITY).
+# El lock por landmarker sigue serializando las sesiones sobre el mismo modelo.
+def _detect_pose_image(mp_image: mp.Image):
+    if pose_landmarker_image is None:
         raise RuntimeError("PoseLandmarker (IMAGE) no está inicializado.")
-    async with pose_lock:
+    with pose_lock:
         return pose_landmarker_image.detect(mp_image)
 
-async def _detect_pose_video(mp_image: mp.Image, ts_ms: int):
-    global pose_landmarker_video, pose_landmarker_image, pose_lock
-    if pose_lock is None:
-        raise RuntimeError("pose_lock no está inicializado.")
-    async with pose_lock:
+def _detect_pose_video(mp_image: mp.Image, ts_ms: int):
+    with pose_lock:
         if pose_landmarker_video is not None:
             return pose_landmarker_video.detect_for_video(mp_image, ts_ms)
         if pose_landmarker_image is None:
             raise RuntimeError("No hay landmarker de pose inicializado.")
         return pose_landmarker_image.detect(mp_image)
 
-async def _detect_face_image(mp_image: mp.Image):
+def _detect_face_image(mp_image: mp.Image):
     """Face en modo IMAGE (usado también en WebRTC)."""
-    global face_landmarker, face_lock
-    if face_landmarker is None or face_lock is None:
+    if face_landmarker is None:
         raise RuntimeError("FaceLandmarker no está inicializado.")
-    async with face_lock:
+    with face_lock:
         return face_landmarker.detect(mp_image)
 
-async def _detect_face_video(mp_image: mp.Image, ts_ms: int):
+def _detect_face_video(mp_image: mp.Image, ts_ms: int):
     """Wrapper VIDEO para Face que delega a IMAGE."""
-    return await _detect_face_image(mp_image)
+    return _detect_face_image(mp_image)
 
 # ───────── Registrar el Blueprint WebRTC (dos tareas: pose + face) ─────────
-webrtc_bp = build_webrtc_blueprint(
-    adapters={
-        "pose": TaskAdapter(
-            name="pose",
-            make_mp_image=_make_mp_image,
-            detect_image=_detect_pose_image,
-            detect_video=_detect_pose_video,
-            points_from_result=_poses_px_from_result,
-        ),
-        "face": TaskAdapter(
-            name="face",
-            make_mp_image=_make_mp_image,
-            detect_image=_detect_face_image,
-            detect_video=_detect_face_video,
-            points_from_result=_faces_px_from_result,
-        ),
-    },
-    url_prefix="",
-)
+_webrtc_adapters = {
+    "pose": TaskAdapter(
+        name="pose",
+        make_mp_image=_make_mp_image,
+        detect_image=_detect_pose_image,
+        detect_video=_detect_pose_video,
+        points_from_result=_poses_px_from_result,
+        landmark_presets=POSE_LANDMARK_PRESETS,
+        num_landmarks=NUM_POSE_LANDMARKS,
+        temporal=_temporal(POSE_INFER_EVERY),
+        roi=RoiConfig(full_every=ROI_FULL_EVERY) if POSE_ROI else None,
+    ),
+    "face": TaskAdapter(
+        name="face",
+        make_mp_image=_make_mp_image,
+        detect_image=_detect_face_image,
+        detect_video=_detect_face_video,
+        points_from_result=_faces_px_from_result,
+        pd_version=FACE_PD_VERSION,
+        landmark_presets=FACE_LANDMARK_PRESETS,
+        num_landmarks=NUM_FACE_LANDMARKS,
+        temporal=_temporal(FACE_INFER_EVERY),
+        # recorte de cabeza de pose: más margen (orejas/boca no cubren frente ni mentón)
+        roi=RoiConfig(full_every=ROI_FULL_EVERY, margin=0.6 if FACE_AFTER_POSE else 0.25)
+        if (FACE_ROI or FACE_AFTER_POSE) else None,
+        depends_on=("pose",) if FACE_AFTER_POSE else (),
+        run_if=_pose_has_head if FACE_AFTER_POSE else None,
+        roi_from=_pose_head_points if FACE_AFTER_POSE else None,
+    ),
+}
+if infer_pool is not None:
+    _webrtc_adapters = {k: pool_adapter(infer_pool, ad) for k, ad in _webrtc_adapters.items()}
+
+webrtc_bp = build_webrtc_blueprint(adapters=_webrtc_adapters, url_prefix="")
 app.blueprint(webrtc_bp)
 
 # ─────────────── Endpoints HTTP/WS (no WebRTC) ───────────────
@@ -337,6 +390,13 @@ async def http_handler(request):
     )
     return response.text(f"Datos recibidos vía HTTP (POST): {data_recibida}")
 
+@app.route("/webrtc/procs", methods=["GET"])
+async def infer_procs_handler(request):
+    """Estado de los workers de inferencia (INFER_PROCS)."""
+    if infer_pool is None:
+        return response.json({"enabled": False})
+    return response.json(dict(infer_pool.snapshot(), enabled=True))
+
 @app.route("/", methods=["GET"])
 async def root_handler(request):
     return response.text(
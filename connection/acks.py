@@ -0,0 +1,173 @@
+# connection/acks.py — ctrl-channel ACK v2: bounded in-flight window + RTT/loss estimates
+#
+# Client → server on 'ctrl' (binary, see packing.pack_ack):
+#   "AK" ver=2 seq:u16 mask:u32
+#   seq  = newest results seq the client has received
+#   mask = bit i set → seq-1-i received as well (32 packets of history)
+# Everything older than the mask is settled: still in flight on the server → lost.
+# Inside the mask a missing packet counts as lost once REORDER newer ones arrived
+# (the results DC is unordered). A client may batch: one AK every few packets is
+# enough as long as it comes before 32 newer packets pile up.
+#
+# Legacy "ACK <seq>" / 5-byte binary acks still work; they confirm one seq only, so
+# with them loss is detected by timeout alone.
+#
+# Sequence numbers are u16 and wrap; all comparisons go through seq_diff().
+
+from __future__ import annotations
+
+from collections import deque
+from typing import Deque, Dict, Optional
+
+ACK_MASK_BITS = 32
+REORDER = 3
+
+
+def seq_diff(a: int, b: int) -> int:
+    """a - b in u16 sequence space (−32768 … 32767)."""
+    return ((a - b + 0x8000) & 0xFFFF) - 0x8000
+
+
+class AckWindow:
+    """Server side: results packets in flight (sent, not yet acked or declared lost).
+    Holds at most `size` entries; callers stop sending while full()."""
+
+    def __init__(self, size: int = 32, min_loss_ms: int = 400):
+        self.size = max(1, int(size))
+        self.min_loss_ms = int(min_loss_ms)
+        self._inflight: Dict[int, int] = {}     # seq → sent ms
+        self._order: Deque[int] = deque()       # send order; settled seqs are skipped lazily
+        self._rtt_win: Deque[float] = deque(maxlen=64)
+        self.srtt = 0.0
+        self.rttvar = 0.0
+        self.min_rtt = 0.0
+        self.loss = 0.0                         # EWMA of lost / (acked + lost)
+        self.last_acked: Optional[int] = None
+        self.stats: Dict[str, int] = dict(sent=0, acked=0, lost=0, evicted=0, dup_acks=0)
+
+    # ── sender ──
+    def full(self) -> bool:
+        return len(self._inflight) >= self.size
+
+    def on_sent(self, seq: int, now_ms: int) -> None:
+        if seq in self._inflight or len(self._inflight) >= self.size:
+            # caller ignored full() (or the seq wrapped onto a stale entry): oldest gives way
+            head = self._head()
+            if head is not None:
+                self._settle(head, lost=True)
+                self.stats["evicted"] += 1
+        self._inflight[seq] = now_ms
+        self._order.append(seq)
+        self.stats["sent"] += 1
+
+    def loss_after_ms(self) -> float:
+        # RFC 6298 RTO, never below the configured floor
+        return max(float(self.min_loss_ms), self.srtt + 4.0 * self.rttvar) if self.srtt else float(self.min_loss_ms)
+
+    def expire(self, now_ms: int) -> int:
+        """Declares in-flight packets older than loss_after_ms() lost; returns how many.
+        Only the head of the send order is inspected."""
+        n = 0
+        limit = self.loss_after_ms()
+        head = self._head()
+        while head is not None and now_ms - self._inflight[head] > limit:
+            self._settle(head, lost=True)
+            n += 1
+            head = self._head()
+        return n
+
+    # ── receiver feedback ──
+    def on_ack(self, seq: int, mask: int, now_ms: int, cumulative: bool = True) -> int:
+        """Applies one AK (cumulative=True) or a legacy single-seq ACK. Returns newly lost."""
+        sent_ms = self._inflight.get(seq)
+        if sent_ms is None:
+            self.stats["dup_acks"] += 1
+        else:
+            self._settle(seq, lost=False)
+            self._rtt_sample(now_ms - sent_ms)  # only the newest seq: its ACK was not delayed by batching
+        if self.last_acked is None or seq_diff(seq, self.last_acked) > 0:
+            self.last_acked = seq
+        if not cumulative:
+            return 0
+
+        i = 0
+        while mask:
+            if mask & 1:
+                s = (seq - 1 - i) & 0xFFFF
+                if s in self._inflight:
+                    self._settle(s, lost=False)
+            mask >>= 1
+            i += 1
+        # what is left older than seq is either outside the mask (settled) or
+        # missing from it with REORDER+ newer packets received → lost
+        lost = 0
+        for s in list(self._inflight):
+            if seq_diff(seq, s) > REORDER:
+                self._settle(s, lost=True)
+                lost += 1
+        return lost
+
+    # ── internals ──
+    def _head(self) -> Optional[int]:
+        o = self._order
+        while o and o[0] not in self._inflight:
+            o.popleft()
+        return o[0] if o else None
+
+    def _settle(self, seq: int, lost: bool) -> None:
+        self._inflight.pop(seq, None)
+        self.stats["lost" if lost else "acked"] += 1
+        self.loss += 0.05 * ((1.0 if lost else 0.0) - self.loss)
+
+    def _rtt_sample(self, rtt_ms: float) -> None:
+        rtt_ms = max(float(rtt_ms), 0.0)
+        if not self.srtt:
+            self.srtt, self.rttvar = rtt_ms, rtt_ms / 2.0
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt_ms)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt_ms
+        self._rtt_win.append(rtt_ms)
+        self.min_rtt = min(self._rtt_win)
+
+    def snapshot(self) -> Dict[str, object]:
+        return dict(
+            self.stats,
+            window=self.size,
+            in_flight=len(self._inflight),
+            srtt_ms=round(self.srtt, 1),
+            rttvar_ms=round(self.rttvar, 1),
+            min_rtt_ms=round(self.min_rtt, 1),
+            loss=round(self.loss, 4),
+            loss_after_ms=round(self.loss_after_ms(), 1),
+            last_acked=self.last_acked,
+        )
+
+
+class AckBitmap:
+    """Client side: builds the (seq, mask) pair of the next AK from received seqs."""
+
+    def __init__(self):
+        self.seq: Optional[int] = None
+        self.mask = 0
+        self.pending = 0  # packets received since the last AK
+
+    def on_received(self, seq: int) -> None:
+        seq &= 0xFFFF
+        self.pending += 1
+        if self.seq is None:
+            self.seq, self.mask = seq, 0
+            return
+        d = seq_diff(seq, self.seq)
+        if d > 0:
+            # newer: shift the history, the previous newest becomes bit d-1
+            self.mask = ((self.mask << d) | (1 << (d - 1))) & 0xFFFFFFFF if d <= ACK_MASK_BITS else 0
+            self.seq = seq
+        elif -ACK_MASK_BITS <= d < 0:
+            self.mask |= 1 << (-d - 1)
+
+    def take(self):
+        """→ (seq, mask) to send, resetting the pending counter; None before any packet."""
+        if self.seq is None:
+            return None
+        self.pending = 0
+        return self.seq, self.mask
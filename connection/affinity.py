@@ -0,0 +1,232 @@
+# connection/affinity.py — optional CPU-affinity layout for the WebRTC stack
+# Pins the inference workers, the GLib/GStreamer threads and the asyncio loop
+# to disjoint core sets, and samples per-core utilization from /proc/stat.
+#
+# Layout (ENV CPU_AFFINITY), roles separated by ';', cores as cpulist:
+#   CPU_AFFINITY="infer=0-3;gst=4-5;loop=6"
+# Roles:
+#   infer → dedicated ThreadPoolExecutor (infer_executor / run_infer) on which the
+#           WebRTC loop runs synchronous detect calls (the scheduler's workers when
+#           INFER_SCHEDULER=1); torch/OpenMP pools created from those threads
+#           inherit the mask. The loop's default executor (asyncio.to_thread) is
+#           left alone, so unrelated blocking work is neither capped nor pinned.
+#           Adapters whose detect is a coroutine run on the loop thread instead.
+#   gst   → GLib MainLoop thread + GStreamer streaming threads (STREAM_STATUS).
+#   loop  → the asyncio (Sanic) event-loop thread.
+# Unset / empty → nothing is pinned (default behaviour unchanged).
+
+from __future__ import annotations
+
+import asyncio
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Set
+
+CPU_AFFINITY = os.getenv("CPU_AFFINITY", "").strip()
+INFER_WORKERS = int(os.getenv("INFER_WORKERS", "0"))  # 0 = one per 'infer' core
+
+ROLES = ("infer", "gst", "loop")
+
+# thread native id → (role, thread name)
+_pinned_threads: Dict[int, tuple[str, str]] = {}
+_pinned_lock = threading.Lock()
+
+
+def _can_pin() -> bool:
+    return hasattr(os, "sched_setaffinity") and hasattr(os, "sched_getaffinity")
+
+
+def parse_cpu_list(text: str) -> Set[int]:
+    """'0-3,6,8-9' → {0, 1, 2, 3, 6, 8, 9} (same syntax as taskset -c)."""
+    cores: Set[int] = set()
+    for part in (text or "").replace(" ", "").split(","):
+        if not part:
+            continue
+        if "-" in part:
+            lo, hi = part.split("-", 1)
+            cores.update(range(int(lo), int(hi) + 1))
+        else:
+            cores.add(int(part))
+    return cores
+
+
+def parse_layout(spec: str) -> Dict[str, Set[int]]:
+    """Parses 'infer=0-3;gst=4;loop=5'. Unknown roles and offline cores are dropped."""
+    layout: Dict[str, Set[int]] = {}
+    if not spec:
+        return layout
+    allowed = os.sched_getaffinity(0) if _can_pin() else set(range(os.cpu_count() or 1))
+    for item in spec.split(";"):
+        if "=" not in item:
+            continue
+        role, cpus = item.split("=", 1)
+        role = role.strip().lower()
+        if role not in ROLES:
+            continue
+        cores = parse_cpu_list(cpus) & allowed
+        if cores:
+            layout[role] = cores
+    return layout
+
+
+def layout_overlaps(layout: Dict[str, Set[int]]) -> List[str]:
+    """Pairs of roles that share cores (the layout is meant to be disjoint)."""
+    out: List[str] = []
+    roles = sorted(layout)
+    for i, a in enumerate(roles):
+        for b in roles[i + 1:]:
+            shared = layout[a] & layout[b]
+            if shared:
+                out.append(f"{a}/{b} share {sorted(shared)}")
+    return out
+
+
+LAYOUT: Dict[str, Set[int]] = parse_layout(CPU_AFFINITY)
+
+
+def enabled(role: Optional[str] = None) -> bool:
+    if not _can_pin() or not LAYOUT:
+        return False
+    return role is None or role in LAYOUT
+
+
+def pin_current_thread(role: str) -> bool:
+    """Pins the calling thread to the cores of `role` (pid 0 = calling thread on Linux)."""
+    if not enabled(role):
+        return False
+    try:
+        os.sched_setaffinity(0, LAYOUT[role])
+    except OSError:
+        return False
+    th = threading.current_thread()
+    with _pinned_lock:
+        _pinned_threads[threading.get_native_id()] = (role, th.name)
+    return True
+
+
+def make_infer_executor() -> Optional[ThreadPoolExecutor]:
+    """Executor whose workers are pinned to the 'infer' cores (None if not configured)."""
+    if not enabled("infer"):
+        return None
+    workers = INFER_WORKERS or len(LAYOUT["infer"])
+    return ThreadPoolExecutor(
+        max_workers=max(1, workers),
+        thread_name_prefix="infer",
+        initializer=pin_current_thread,
+        initargs=("infer",),
+    )
+
+
+_infer_executor: Optional[ThreadPoolExecutor] = None
+
+
+def infer_executor() -> Optional[ThreadPoolExecutor]:
+    """The process-wide pinned inference executor (created on first use; None if
+    no 'infer' cores are configured)."""
+    global _infer_executor
+    if _infer_executor is None:
+        _infer_executor = make_infer_executor()
+    return _infer_executor
+
+
+async def run_infer(fn, *args):
+    """Runs a blocking inference call on the 'infer' cores (a plain worker thread
+    when none are configured)."""
+    ex = infer_executor()
+    if ex is None:
+        return await asyncio.to_thread(fn, *args)
+    return await asyncio.get_running_loop().run_in_executor(ex, fn, *args)
+
+
+def _limit_torch_threads() -> None:
+    # Only if torch is already loaded; never import it just for this.
+    torch = sys.modules.get("torch")
+    if torch is None or not enabled("infer"):
+        return
+    try:
+        torch.set_num_threads(len(LAYOUT["infer"]))
+    except Exception:
+        pass
+
+
+def install_loop_affinity(loop) -> Dict[str, object]:
+    """Call from the event-loop thread: pins it to 'loop' and creates the pinned
+    inference executor (not the loop's default one). Returns what was applied."""
+    applied: Dict[str, object] = {"loop": False, "infer_executor": False}
+    if not enabled():
+        return applied
+    applied["loop"] = pin_current_thread("loop")
+    if infer_executor() is not None:
+        applied["infer_executor"] = True
+        _limit_torch_threads()
+    return applied
+
+
+# ─────────────── Per-core utilization (/proc/stat) ───────────────
+class CpuUsageSampler:
+    """Per-core busy% between consecutive `sample()` calls (Linux /proc/stat)."""
+
+    def __init__(self):
+        self._last: Dict[int, tuple[int, int]] = self._read()
+
+    @staticmethod
+    def _read() -> Dict[int, tuple[int, int]]:
+        out: Dict[int, tuple[int, int]] = {}
+        try:
+            with open("/proc/stat", "r") as f:
+                for line in f:
+                    if not line.startswith("cpu") or line.startswith("cpu "):
+                        continue
+                    parts = line.split()
+                    core = int(parts[0][3:])
+                    vals = [int(v) for v in parts[1:]]
+                    idle = vals[3] + (vals[4] if len(vals) > 4 else 0)  # idle + iowait
+                    out[core] = (sum(vals), idle)
+        except (OSError, ValueError):
+            pass
+        return out
+
+    def sample(self) -> Dict[int, float]:
+        now = self._read()
+        usage: Dict[int, float] = {}
+        for core, (total, idle) in now.items():
+            t0, i0 = self._last.get(core, (0, 0))
+            dt = total - t0
+            usage[core] = round(100.0 * (1.0 - (idle - i0) / dt), 1) if dt > 0 else 0.0
+        self._last = now
+        return usage
+
+
+_sampler: Optional[CpuUsageSampler] = None
+
+
+def cpu_report() -> Dict[str, object]:
+    """Layout, per-core utilization since the previous report, and pinned threads."""
+    global _sampler
+    if _sampler is None:
+        _sampler = CpuUsageSampler()
+    per_core = _sampler.sample()
+    roles_by_core: Dict[int, List[str]] = {}
+    for role, cores in LAYOUT.items():
+        for c in cores:
+            roles_by_core.setdefault(c, []).append(role)
+    with _pinned_lock:
+        threads = [
+            {"tid": tid, "role": role, "name": name}
+            for tid, (role, name) in sorted(_pinned_threads.items())
+        ]
+    return {
+        "enabled": enabled(),
+        "layout": {r: sorted(c) for r, c in LAYOUT.items()},
+        "overlaps": layout_overlaps(LAYOUT),
+        "per_core_util_pct": {
+            str(c): {"util": u, "roles": roles_by_core.get(c, [])} for c, u in sorted(per_core.items())
+        },
+        "role_util_pct": {
+            r: round(sum(per_core.get(c, 0.0) for c in cores) / max(1, len(cores)), 1)
+            for r, cores in LAYOUT.items()
+        },
+        "pinned_threads": threads,
+    }
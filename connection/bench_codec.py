@@ -0,0 +1,130 @@
+# connection/bench_codec.py — bytes/frame of PD v2 vs v3 vs v4 (motion-compensated)
+#
+#   python -m connection.bench_codec                      # synthetic face stream
+#   python -m connection.bench_codec --points face.npy    # recorded (T,N,K,2) points
+#   python -m connection.bench_codec --video clip.mp4 --save-points face.npy
+#
+# --video runs the MediaPipe FaceLandmarker (modules/puntos_faciales.py) on each
+# frame and converts landmarks to pixels exactly like app._faces_px_from_result.
+# Every stream is encoded with the same seq/keyframe schedule for each version and
+# decoded back; v2 reports its reconstruction drift (±127 clamp), v3/v4 must be exact.
+
+from __future__ import annotations
+
+import argparse
+import os
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .packing import decode_pose_packet, pack_pose_frame_delta_np
+
+
+def synthetic_face_stream(frames: int, *, k: int = 478, w: int = 1280, h: int = 720, seed: int = 0) -> np.ndarray:
+    """Mesh-like point cloud under a global random-walk translation, slow zoom and
+    sparse per-point jitter (blinks/mouth), (T,1,K,2) int32."""
+    rng = np.random.default_rng(seed)
+    shape = rng.normal(0.0, 1.0, size=(k, 2)) * (70.0, 90.0)
+    center = np.array([w / 2, h / 2])
+    out = np.empty((frames, 1, k, 2), dtype=np.int32)
+    local = np.zeros((k, 2))
+    for t in range(frames):
+        center += rng.normal(0.0, 2.5, size=2)
+        scale = 1.0 + 0.15 * np.sin(t / 40.0)
+        moving = rng.random(k) < 0.05
+        local[moving] += rng.normal(0.0, 1.5, size=(int(moving.sum()), 2))
+        local *= 0.9
+        pts = center + shape * scale + local
+        out[t, 0] = np.clip(np.rint(pts), 0, (w - 1, h - 1))
+    return out
+
+
+def face_points_from_video(path: str, model: Optional[str] = None, max_frames: int = 0) -> np.ndarray:
+    import cv2
+    import mediapipe as mp
+    from mediapipe.tasks.python import vision
+    from modules.puntos_faciales import AppConfig, DEFAULT_MODEL_URLS, LandmarkerFactory, ensure_file
+
+    model_path = Path(model or os.getenv("FACE_LANDMARKER_PATH", "models/face_landmarker.task"))
+    ensure_file(model_path, DEFAULT_MODEL_URLS)
+    cfg = AppConfig(model_path=model_path, model_urls=list(DEFAULT_MODEL_URLS),
+                    delegate_preference="auto", running_mode=vision.RunningMode.IMAGE, max_faces=1)
+    lm = LandmarkerFactory(cfg).create_with_fallback()
+    cap = cv2.VideoCapture(path)
+    frames: List[np.ndarray] = []
+    try:
+        while not max_frames or len(frames) < max_frames:
+            ok, bgr = cap.read()
+            if not ok:
+                break
+            h, w = bgr.shape[:2]
+            rgb = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+            res = lm.detect(mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb))
+            if not res.face_landmarks:
+                continue
+            xy = np.array([[(p.x, p.y) for p in res.face_landmarks[0]]], dtype=np.float64)
+            frames.append(np.clip(np.rint(xy * (w, h)), 0, (w - 1, h - 1)).astype(np.int32))
+    finally:
+        cap.release()
+        lm.close()
+    if not frames:
+        raise RuntimeError(f"no faces detected in {path}")
+    return np.stack(frames)
+
+
+def encode_stream(stream: np.ndarray, ver: int, *, kf_every: int, w: int = 1280, h: int = 720) -> Dict[str, float]:
+    sizes: List[int] = []
+    kfs = 0
+    max_err = 0
+    prev_sent: Optional[np.ndarray] = None
+    prev_dec: Optional[np.ndarray] = None
+    for t, cur in enumerate(stream):
+        force = kf_every > 0 and t % kf_every == 0
+        pkt = pack_pose_frame_delta_np(prev_sent, cur, w, h, keyframe=force, seq=t, ver=ver)
+        dec = decode_pose_packet(pkt, prev_dec)
+        kfs += int(dec.keyframe)
+        sizes.append(len(pkt))
+        max_err = max(max_err, int(np.abs(dec.points - cur).max()) if cur.size else 0)
+        # v2 sender tracks true points; receiver accumulates clamped deltas (drift)
+        prev_sent, prev_dec = cur, dec.points
+    arr = np.asarray(sizes)
+    return {
+        "bytes_avg": float(arr.mean()),
+        "bytes_p95": float(np.percentile(arr, 95)),
+        "kf_ratio": kfs / len(sizes),
+        "max_err_px": max_err,
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="PD v2/v3/v4 bytes-per-frame benchmark")
+    ap.add_argument("--points", help=".npy with (T,N,K,2) int points")
+    ap.add_argument("--video", help="video file; face landmarks are extracted with MediaPipe")
+    ap.add_argument("--model", help="face_landmarker.task (default FACE_LANDMARKER_PATH)")
+    ap.add_argument("--save-points", help="write the extracted/synthetic stream to this .npy")
+    ap.add_argument("--frames", type=int, default=600, help="synthetic length / max video frames")
+    ap.add_argument("--kf-every", type=int, default=0, help="forced keyframe period (0 = first only)")
+    args = ap.parse_args()
+
+    if args.points:
+        stream = np.load(args.points).astype(np.int32)
+        src = args.points
+    elif args.video:
+        stream = face_points_from_video(args.video, args.model, args.frames)
+        src = args.video
+    else:
+        stream = synthetic_face_stream(args.frames)
+        src = "synthetic"
+    if args.save_points:
+        np.save(args.save_points, stream)
+
+    print(f"stream={src} frames={stream.shape[0]} objects={stream.shape[1]} points={stream.shape[2]}")
+    print(f"{'ver':<6}{'bytes/frame':>12}{'p95':>8}{'kf%':>7}{'max err px':>12}")
+    for ver in (2, 3, 4):
+        r = encode_stream(stream, ver, kf_every=args.kf_every)
+        print(f"PD v{ver:<3}{r['bytes_avg']:>12.1f}{r['bytes_p95']:>8.0f}{100 * r['kf_ratio']:>6.1f}%{r['max_err_px']:>12}")
+
+
+if __name__ == "__main__":
+    main()
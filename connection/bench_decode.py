@@ -0,0 +1,327 @@
+# connection/bench_decode.py — throughput / CPU / latency of every available decode path
+#
+#   python -m connection.bench_decode                          # all codecs, 640x480 test clip
+#   python -m connection.bench_decode --codecs H264 VP8 --frames 600 --width 1280 --height 720
+#   python -m connection.bench_decode --file clip.mp4 --write-prefs decoder_prefs.json
+#
+# For each codec with a local encoder + RTP payloader, a clip (videotestsrc "ball",
+# or --file) is encoded once into RTP packets in memory. Every installed decoder
+# from decoding.DECODER_CANDIDATES is then run with each thread setting below on
+# the exact bin the server uses (build_rtp_video_decode_bin), fed from an appsrc:
+#   • throughput pass: packets pushed as fast as the bin accepts them → fps and
+#                      CPU ms/frame (process rusage over the pass)
+#   • latency pass   : packets pushed at the clip's frame rate → per-frame time
+#                      from the frame's last RTP packet to the appsink (p50/p90)
+# Only for the benchmark, the leaky queue and the dropping appsink at the end of
+# the bin are made lossless, so every frame is counted.
+#
+# --write-prefs picks, per codec, the lowest-latency variant that still decodes at
+# ≥ --min-fps (else the fastest) and writes the file decoding.DECODER_PREFS reads.
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import resource
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+import gi
+
+gi.require_version("Gst", "1.0")
+gi.require_version("GstApp", "1.0")
+from gi.repository import Gst, GstApp  # noqa: F401
+
+from .decoding import DECODER_CANDIDATES, _has_factory, build_rtp_video_decode_bin
+
+Gst.init(None)
+
+# codec → (encoder candidates with their low-latency settings, parser, payloader)
+ENCODERS: Dict[str, Tuple[List[Tuple[str, Dict[str, Any]]], Optional[str], str]] = {
+    "H264": ([("x264enc", {"tune": "zerolatency", "speed-preset": "ultrafast", "key-int-max": 60})],
+             "h264parse", "rtph264pay"),
+    "H265": ([("x265enc", {"tune": "zerolatency", "speed-preset": "ultrafast", "key-int-max": 60})],
+             "h265parse", "rtph265pay"),
+    "VP8": ([("vp8enc", {"deadline": 1, "keyframe-max-dist": 60})], None, "rtpvp8pay"),
+    "VP9": ([("vp9enc", {"deadline": 1, "cpu-used": 8, "keyframe-max-dist": 60})], None, "rtpvp9pay"),
+    "AV1": ([("svtav1enc", {"preset": 12}), ("av1enc", {"cpu-used": 8, "usage-profile": "realtime"}),
+             ("rav1enc", {"speed-preset": 10, "low-latency": True})], "av1parse", "rtpav1pay"),
+}
+
+# encoder → (bitrate property, multiplier from kbps)
+_BITRATE_PROP = {
+    "x264enc": ("bitrate", 1), "x265enc": ("bitrate", 1), "vp8enc": ("target-bitrate", 1000),
+    "vp9enc": ("target-bitrate", 1000), "svtav1enc": ("target-bitrate", 1), "av1enc": ("target-bitrate", 1),
+    "rav1enc": ("bitrate", 1000),
+}
+
+# Thread settings compared per decoder family (0 = the decoder's own auto choice)
+_THREADS = (1, 2, 4, 0)
+
+
+def decoder_variants(decoder: str) -> List[Dict[str, Any]]:
+    if decoder.startswith("avdec_"):
+        return [{"threads": t, "thread-type": tt} for t in _THREADS for tt in ("slice", "frame")]
+    if decoder in ("vp8dec", "vp9dec"):
+        return [{"threads": t} for t in _THREADS if t]
+    if decoder == "dav1dec":
+        return [{"n-threads": t, "max-frame-delay": 1} for t in _THREADS]
+    return [{}]
+
+
+@dataclass
+class RtpClip:
+    codec: str
+    encoder: str
+    caps: Gst.Caps
+    packets: List[Tuple[bytes, int]]  # (RTP packet, pts ns)
+    frames: int
+    fps: int
+
+
+def _make(name: str, props: Dict[str, Any]) -> Optional[Gst.Element]:
+    elem = Gst.ElementFactory.make(name, None)
+    if elem is None:
+        return None
+    for k, v in props.items():
+        if elem.find_property(k):
+            try:
+                Gst.util_set_object_arg(elem, k, str(v).lower() if isinstance(v, bool) else str(v))
+            except Exception:
+                pass
+    return elem
+
+
+def encode_clip(codec: str, frames: int, width: int, height: int, fps: int, kbps: int,
+                file: Optional[str] = None) -> Optional[RtpClip]:
+    """Encodes `frames` frames into RTP packets; None when no encoder/payloader exists."""
+    encs, parser, payloader = ENCODERS[codec]
+    enc_name, enc_props = next(((n, p) for n, p in encs if _has_factory(n)), (None, None))
+    if enc_name is None or not _has_factory(payloader):
+        return None
+    prop, mult = _BITRATE_PROP[enc_name]
+    enc_props = dict(enc_props, **{prop: kbps * mult})
+
+    pipe = Gst.Pipeline.new(f"enc-{codec}")
+    cvt = Gst.ElementFactory.make("videoconvert", None)
+    scale = Gst.ElementFactory.make("videoscale", None)
+    rate = Gst.ElementFactory.make("videorate", None)
+    caps = Gst.ElementFactory.make("capsfilter", None)
+    caps.set_property("caps", Gst.Caps.from_string(
+        f"video/x-raw,format=I420,width={width},height={height},framerate={fps}/1"))
+    enc = _make(enc_name, enc_props)
+    parse = _make(parser, {}) if parser and _has_factory(parser) else None
+    pay = _make(payloader, {"mtu": 1200, "pt": 96, "config-interval": -1})
+    sink = _make("appsink", {"sync": False, "max-buffers": 0})
+    chain = [cvt, scale, rate, caps, enc] + ([parse] if parse else []) + [pay, sink]
+    if file:
+        src = Gst.ElementFactory.make("uridecodebin", None)
+        src.set_property("uri", Gst.filename_to_uri(os.path.abspath(file)))
+        src.connect("pad-added", lambda _e, pad: pad.link(cvt.get_static_pad("sink"))
+                    if pad.query_caps(None).to_string().startswith("video/") else None)
+    else:
+        src = _make("videotestsrc", {"pattern": "ball", "num-buffers": frames, "is-live": False})
+    pipe.add(src)
+    for e in chain:
+        pipe.add(e)
+    for a, b in zip(chain[:-1], chain[1:]):
+        if not a.link(b):
+            raise RuntimeError(f"{codec}: cannot link {a.get_name()} → {b.get_name()}")
+    if not file:
+        src.link(cvt)
+
+    packets: List[Tuple[bytes, int]] = []
+    clip_caps = None
+    pts_seen = set()
+    pipe.set_state(Gst.State.PLAYING)
+    try:
+        while True:
+            sample = sink.emit("try-pull-sample", 10 * Gst.SECOND)
+            if sample is None:
+                break
+            buf = sample.get_buffer()
+            clip_caps = clip_caps or sample.get_caps()
+            if buf.pts not in pts_seen and len(pts_seen) >= frames:
+                break
+            pts_seen.add(buf.pts)
+            packets.append((buf.extract_dup(0, buf.get_size()), int(buf.pts)))
+    finally:
+        pipe.set_state(Gst.State.NULL)
+    if not packets:
+        return None
+    return RtpClip(codec, enc_name, clip_caps, packets, len(pts_seen), fps)
+
+
+def run_decoder(clip: RtpClip, decoder: str, props: Dict[str, Any], *, paced: bool) -> Dict[str, Any]:
+    """One pass of `clip` through the server's decode bin with `decoder` forced."""
+    push_ns: Dict[int, int] = {}
+    lat_ms: List[float] = []
+    n_out = [0]
+
+    def on_sample(sink):
+        sample = sink.emit("pull-sample")
+        t = time.monotonic_ns()
+        if sample is not None:
+            t0 = push_ns.get(int(sample.get_buffer().pts))
+            if t0:
+                lat_ms.append((t - t0) / 1e6)
+            n_out[0] += 1
+        return Gst.FlowReturn.OK
+
+    pipe = Gst.Pipeline.new("bench-dec")
+    src = _make("appsrc", {"format": "time", "is-live": False, "block": True, "max-bytes": 4 << 20})
+    src.set_property("caps", clip.caps)
+    bin_, sink = build_rtp_video_decode_bin(clip.codec, on_sample, decoder=decoder, decoder_props=props,
+                                            name="benchdecbin")
+    q = bin_.get_by_name("leaky_to_sink")
+    q.set_property("leaky", 0)
+    q.set_property("max-size-buffers", 4)
+    sink.set_property("drop", False)
+    sink.set_property("max-buffers", 0)
+    pipe.add(src)
+    pipe.add(bin_)
+    src.get_static_pad("src").link(bin_.get_static_pad("sink"))
+    pipe.set_state(Gst.State.PLAYING)
+
+    frame_idx: Dict[int, int] = {}
+    ru0 = resource.getrusage(resource.RUSAGE_SELF)
+    t_start = time.monotonic_ns()
+    for data, pts in clip.packets:
+        if paced:
+            i = frame_idx.setdefault(pts, len(frame_idx))
+            delay = t_start + i * 1e9 / clip.fps - time.monotonic_ns()
+            if delay > 0:
+                time.sleep(delay / 1e9)
+        buf = Gst.Buffer.new_wrapped(data)
+        buf.pts = buf.dts = pts
+        push_ns[pts] = time.monotonic_ns()  # the frame's last packet wins
+        if src.emit("push-buffer", buf) != Gst.FlowReturn.OK:
+            break
+    src.emit("end-of-stream")
+    msg = pipe.get_bus().timed_pop_filtered(60 * Gst.SECOND, Gst.MessageType.EOS | Gst.MessageType.ERROR)
+    wall_s = (time.monotonic_ns() - t_start) / 1e9
+    ru1 = resource.getrusage(resource.RUSAGE_SELF)
+    pipe.set_state(Gst.State.NULL)
+
+    error = None
+    if msg is None:
+        error = "timeout"
+    elif msg.type == Gst.MessageType.ERROR:
+        error = msg.parse_error()[0].message
+    n = n_out[0]
+    cpu_s = (ru1.ru_utime - ru0.ru_utime) + (ru1.ru_stime - ru0.ru_stime)
+    lat = np.asarray(lat_ms, dtype=np.float64)
+    return {
+        "frames": n,
+        "dropped": max(0, clip.frames - n),
+        "fps": round(n / wall_s, 1) if wall_s > 0 else 0.0,
+        "cpu_ms_per_frame": round(cpu_s * 1000.0 / n, 3) if n else None,
+        "latency_ms_p50": round(float(np.percentile(lat, 50)), 2) if lat.size else None,
+        "latency_ms_p90": round(float(np.percentile(lat, 90)), 2) if lat.size else None,
+        "error": error,
+    }
+
+
+def bench_codec(clip: RtpClip, latency_frames: int) -> List[Dict[str, Any]]:
+    rows: List[Dict[str, Any]] = []
+    keep = set(sorted({pts for _data, pts in clip.packets})[:latency_frames])
+    lat_clip = RtpClip(clip.codec, clip.encoder, clip.caps, [p for p in clip.packets if p[1] in keep],
+                       len(keep), clip.fps)
+    for decoder in DECODER_CANDIDATES.get(clip.codec, []):
+        if not _has_factory(decoder):
+            continue
+        probe = Gst.ElementFactory.make(decoder, None)
+        for props in decoder_variants(decoder):
+            if any(not probe.find_property(k) for k in props):
+                continue
+            thr = run_decoder(clip, decoder, props, paced=False)
+            lat = run_decoder(lat_clip, decoder, props, paced=True)
+            rows.append({
+                "codec": clip.codec, "decoder": decoder, "props": props,
+                "fps": thr["fps"], "cpu_ms_per_frame": thr["cpu_ms_per_frame"], "dropped": thr["dropped"],
+                "latency_ms_p50": lat["latency_ms_p50"], "latency_ms_p90": lat["latency_ms_p90"],
+                "error": thr["error"] or lat["error"],
+            })
+    return rows
+
+
+def pick_best(rows: List[Dict[str, Any]], min_fps: float) -> Optional[Dict[str, Any]]:
+    ok = [r for r in rows if not r["error"] and r["latency_ms_p50"] is not None]
+    if not ok:
+        return None
+    fast = [r for r in ok if r["fps"] >= min_fps]
+    if fast:
+        return min(fast, key=lambda r: (r["latency_ms_p50"], r["cpu_ms_per_frame"] or 0.0))
+    return max(ok, key=lambda r: r["fps"])
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Decoder throughput / CPU / latency benchmark")
+    ap.add_argument("--codecs", nargs="*", default=list(ENCODERS), type=str.upper)
+    ap.add_argument("--frames", type=int, default=300, help="frames in the throughput pass")
+    ap.add_argument("--latency-frames", type=int, default=120, help="frames in the paced latency pass")
+    ap.add_argument("--width", type=int, default=640)
+    ap.add_argument("--height", type=int, default=480)
+    ap.add_argument("--fps", type=int, default=30)
+    ap.add_argument("--bitrate", type=int, default=1500, help="kbps")
+    ap.add_argument("--file", help="encode this video instead of the synthetic pattern")
+    ap.add_argument("--min-fps", type=float, default=60.0, help="throughput a preferred variant must reach")
+    ap.add_argument("--write-prefs", nargs="?", const=os.getenv("DECODER_PREFS", "decoder_prefs.json"),
+                    help="write the preference file (default: $DECODER_PREFS or decoder_prefs.json)")
+    ap.add_argument("--json", help="also write every measurement here")
+    args = ap.parse_args()
+
+    all_rows: List[Dict[str, Any]] = []
+    best: Dict[str, Dict[str, Any]] = {}
+    print(f"{'codec':<6}{'decoder':<14}{'props':<34}{'fps':>8}{'cpu ms/f':>10}{'lat p50':>9}{'lat p90':>9}  note")
+    for codec in args.codecs:
+        if codec not in ENCODERS:
+            print(f"{codec:<6}unknown codec; choose from {list(ENCODERS)}")
+            continue
+        clip = encode_clip(codec, args.frames, args.width, args.height, args.fps, args.bitrate, args.file)
+        if clip is None:
+            print(f"{codec:<6}no encoder/payloader installed; skipped")
+            continue
+        rows = bench_codec(clip, args.latency_frames)
+        if not rows:
+            print(f"{codec:<6}no decoder installed; skipped")
+            continue
+        for r in rows:
+            props = ",".join(f"{k}={v}" for k, v in r["props"].items()) or "-"
+            note = r["error"] or (f"{r['dropped']} dropped" if r["dropped"] else "")
+            print(f"{codec:<6}{r['decoder']:<14}{props:<34}{r['fps']:>8.1f}"
+                  f"{r['cpu_ms_per_frame'] or 0:>10.2f}{r['latency_ms_p50'] or 0:>9.2f}{r['latency_ms_p90'] or 0:>9.2f}  {note}")
+        all_rows.extend(rows)
+        pick = pick_best(rows, args.min_fps)
+        if pick is not None:
+            best[codec] = pick
+            print(f"{codec:<6}→ {pick['decoder']} {pick['props']}")
+
+    clip_info = {"width": args.width, "height": args.height, "fps": args.fps, "frames": args.frames,
+                 "bitrate_kbps": args.bitrate, "file": args.file}
+    if args.write_prefs and best:
+        prefs = {
+            "version": 1,
+            "generated": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "host": platform.node(),
+            "cpu_count": os.cpu_count(),
+            "clip": clip_info,
+            "min_fps": args.min_fps,
+            "codecs": {c: {k: r[k] for k in ("decoder", "props", "fps", "cpu_ms_per_frame", "latency_ms_p50")}
+                       for c, r in best.items()},
+        }
+        with open(args.write_prefs, "w") as f:
+            json.dump(prefs, f, indent=2)
+        print(f"wrote {args.write_prefs}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"clip": clip_info, "results": all_rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,388 @@
+# connection/bench_loopback.py — end-to-end WebRTC benchmark on localhost (no browser)
+#
+#   python -m connection.bench_loopback --sessions 4 --seconds 20 --codec vp8
+#   python -m connection.bench_loopback --codec h264 --detect-ms 15 --fps 30
+#   python -m connection.bench_loopback --file clip.mp4 --app      # real pose/face adapters (app.py)
+#
+# Starts the Sanic app in-process and, per session, a GStreamer sending peer:
+#   appsrc (RGB frames) → videoconvert → vp8enc | x264enc → RTP payloader → webrtcbin
+# The offer is POSTed to /webrtc/offer ({"mux": true}); results arrive on the
+# negotiated 'results' DC as MX containers and are decoded with connection.packing
+# (a lost delta asks for a keyframe with "KF" on 'ctrl', like the web client).
+#
+# Every frame carries a 16-bit frame-id barcode in its top-left corner. The default
+# "frameid" task reads it back on the server and returns it as a single point, so each
+# result maps to the exact frame it came from:
+#   latency = result received − frame pushed into appsrc  (glass-to-result)
+# With --app the MediaPipe adapters don't echo the id; latency then falls back to
+# result received − MX ts_ms (server dequeue → client), both on CLOCK_MONOTONIC.
+# "frameid" reads the barcode at sender resolution: keep INFER_WIDTH/HEIGHT unset.
+
+from __future__ import annotations
+
+import os
+
+# the offer answer must carry the server's candidates (no trickle endpoint)
+os.environ.setdefault("WAIT_FOR_ICE_MS", "1500")
+
+import argparse
+import asyncio
+import json
+import threading
+import time
+import urllib.request
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import gi
+
+gi.require_version("Gst", "1.0")
+gi.require_version("GstWebRTC", "1.0")
+gi.require_version("GstSdp", "1.0")
+from gi.repository import GLib, Gst, GstSdp, GstWebRTC  # noqa: E402
+
+from . import webrtc as W  # noqa: E402
+from .acks import AckBitmap  # noqa: E402
+from .packing import decode_pose_packet, pack_ack, packet_ref_seq, unpack_mux_frame  # noqa: E402
+from .robust_bytes import _as_bytes  # noqa: E402
+
+BAR_BITS = 16
+BAR_CELL = 16  # px per bit; large, flat blocks survive VP8/H.264 at low bitrates
+ACK_EVERY = 4  # results per ctrl AK
+REF_HISTORY = 128  # decoded frames kept per task for PD v5 references
+
+
+# ─────────────── frame-id barcode ───────────────
+def stamp_frame_id(rgb: np.ndarray, fid: int) -> None:
+    for b in range(BAR_BITS):
+        rgb[:BAR_CELL, b * BAR_CELL:(b + 1) * BAR_CELL] = 255 if (fid >> b) & 1 else 0
+
+
+def read_frame_id(rgb: np.ndarray) -> int:
+    c = BAR_CELL // 2
+    row = rgb[c // 2:c + c // 2, : BAR_BITS * BAR_CELL].reshape(c, BAR_BITS, BAR_CELL, -1)
+    bits = row[:, :, c // 2:c + c // 2].mean(axis=(0, 2, 3)) > 127
+    return int(sum(1 << i for i, on in enumerate(bits) if on))
+
+
+def frameid_adapter(detect_ms: float = 0.0) -> W.TaskAdapter:
+    """Server-side task that echoes the barcode as one point (x, y) = divmod over the width."""
+
+    def detect(img):
+        if detect_ms > 0:
+            time.sleep(detect_ms / 1000.0)  # stand-in for model cost
+        return read_frame_id(img)
+
+    def points(fid, shape, indices=None):
+        h, w = shape[:2]
+        y, x = divmod(int(fid), w)
+        return w, h, np.array([[[x, y % h]]], dtype=np.int32)
+
+    return W.TaskAdapter(
+        name="frameid",
+        make_mp_image=lambda rgb: rgb,
+        detect_image=detect,
+        detect_video=lambda img, _ts: detect(img),
+        points_from_result=points,
+        pd_version=3,  # lossless deltas: the id jumps when frames are skipped
+    )
+
+
+# ─────────────── sending peer ───────────────
+@dataclass
+class PeerStats:
+    pushed: int = 0
+    results: int = 0
+    bytes: int = 0
+    undecodable: int = 0
+    kf_requests: int = 0
+    latencies_ms: List[float] = field(default_factory=list)
+    first_result_s: Optional[float] = None
+
+
+class LoopbackPeer:
+    def __init__(self, idx: int, *, codec: str, width: int, height: int, fps: int,
+                 bitrate_kbps: int, frame_ids: bool):
+        self.idx = idx
+        self.codec = codec
+        self.size = (width, height)
+        self.fps = fps
+        self.frame_ids = frame_ids
+        self.stats = PeerStats()
+        self.sid: Optional[str] = None
+        self._push_ms: Dict[int, float] = {}
+        self._prev: Dict[str, np.ndarray] = {}
+        self._hist: Dict[str, Dict[int, np.ndarray]] = {}  # task → {seq: points} (PD v5)
+        self._acks = AckBitmap()
+        self._measuring = False
+        self._stop = threading.Event()
+        self._offer_ready: Optional[asyncio.Future] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        enc = {
+            "vp8": f"vp8enc deadline=1 cpu-used=8 lag-in-frames=0 error-resilient=partitions "
+                   f"keyframe-max-dist={fps * 2} target-bitrate={bitrate_kbps * 1000} "
+                   f"! rtpvp8pay pt=96 ! application/x-rtp,media=video,encoding-name=VP8,payload=96",
+            "h264": f"x264enc tune=zerolatency speed-preset=ultrafast key-int-max={fps * 2} "
+                    f"bitrate={bitrate_kbps} ! video/x-h264,profile=constrained-baseline "
+                    f"! rtph264pay pt=102 config-interval=-1 aggregate-mode=zero-latency "
+                    f"! application/x-rtp,media=video,encoding-name=H264,payload=102",
+        }[codec]
+        self.pipeline = Gst.parse_launch(
+            f"appsrc name=src is-live=true format=time do-timestamp=true "
+            f"caps=video/x-raw,format=RGB,width={width},height={height},framerate={fps}/1 "
+            f"! videoconvert ! queue max-size-buffers=2 leaky=downstream ! {enc} "
+            f"! webrtcbin name=wb bundle-policy=max-bundle latency=0"
+        )
+        self.src = self.pipeline.get_by_name("src")
+        self.webrtc = self.pipeline.get_by_name("wb")
+        self.webrtc.connect("on-negotiation-needed", self._on_negotiation_needed)
+        self.webrtc.connect("notify::ice-gathering-state", self._on_gathering_state)
+        self.results_dc = self._make_dc("results", W.DC_RESULTS_ID, ordered=False)
+        self.ctrl_dc = self._make_dc("ctrl", W.DC_CTRL_ID, ordered=True)
+        self.results_dc.connect("on-message-data", self._on_results)
+
+    def _make_dc(self, label: str, dcid: int, *, ordered: bool):
+        # mirrors GSTWebRTCSession._precreate_negotiated_dcs
+        opts = Gst.Structure.new_empty("application/webrtc-data-channel")
+        opts.set_value("ordered", ordered)
+        if not ordered:
+            opts.set_value("max-retransmits", 0)
+        opts.set_value("negotiated", True)
+        opts.set_value("id", dcid)
+        return self.webrtc.emit("create-data-channel", label, opts)
+
+    # ── signaling ──
+    def _on_negotiation_needed(self, webrtc):
+        def _on_offer(promise, _wb, _data):
+            offer = promise.get_reply().get_value("offer")
+            webrtc.emit("set-local-description", offer, Gst.Promise.new())
+        webrtc.emit("create-offer", None, Gst.Promise.new_with_change_func(_on_offer, webrtc, None))
+
+    def _on_gathering_state(self, webrtc, _pspec):
+        if webrtc.get_property("ice-gathering-state") != GstWebRTC.WebRTCICEGatheringState.COMPLETE:
+            return
+        sdp = webrtc.get_property("local-description").sdp.as_text()
+        fut = self._offer_ready
+        if fut is not None:
+            self._loop.call_soon_threadsafe(lambda: fut.done() or fut.set_result(sdp))
+
+    async def connect(self, base_url: str, tasks: List[str]) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._offer_ready = self._loop.create_future()
+        self.pipeline.set_state(Gst.State.PLAYING)
+        sdp = await asyncio.wait_for(self._offer_ready, timeout=10.0)
+        body = json.dumps({"sdp": sdp, "type": "offer", "mux": True, "tasks": tasks}).encode()
+        req = urllib.request.Request(f"{base_url}/webrtc/offer", data=body,
+                                     headers={"Content-Type": "application/json"})
+        resp = await asyncio.to_thread(lambda: json.loads(urllib.request.urlopen(req, timeout=15).read()))
+        if "sdp" not in resp:
+            raise RuntimeError(f"offer rejected: {resp}")
+        self.sid = resp.get("sid")
+        _ret, msg = GstSdp.sdp_message_new()
+        GstSdp.sdp_message_parse_buffer(resp["sdp"].encode(), msg)
+        answer = GstWebRTC.WebRTCSessionDescription.new(GstWebRTC.WebRTCSDPType.ANSWER, msg)
+        self.webrtc.emit("set-remote-description", answer, Gst.Promise.new())
+
+    # ── media ──
+    def run_source(self, frames_iter) -> None:
+        """Feeder thread: pushes RGB frames at the target rate, stamping ids + push times."""
+        period = 1.0 / self.fps
+        t_next = time.monotonic()
+        fid = 0
+        for rgb in frames_iter:
+            if self._stop.is_set():
+                break
+            if self.frame_ids:
+                stamp_frame_id(rgb, fid & 0xFFFF)
+            now = time.monotonic()
+            if self._measuring:
+                self._push_ms[fid & 0xFFFF] = now * 1000.0
+            self.src.emit("push-buffer", Gst.Buffer.new_wrapped(rgb.tobytes()))
+            self.stats.pushed += int(self._measuring)
+            fid += 1
+            t_next += period
+            time.sleep(max(0.0, t_next - time.monotonic()))
+
+    def _on_results(self, _ch, data):
+        now_ms = time.monotonic() * 1000.0
+        raw = _as_bytes(data)
+        try:
+            seq, ts_ms, entries = unpack_mux_frame(raw)
+        except Exception:
+            self.stats.undecodable += 1
+            return
+        # batched ctrl v2 ACK (only used by the server with RESULTS_REQUIRE_ACK=1)
+        self._acks.on_received(seq)
+        if self._acks.pending >= ACK_EVERY:
+            self.ctrl_dc.emit("send-data", GLib.Bytes(pack_ack(*self._acks.take())))
+        if self.stats.first_result_s is None:
+            self.stats.first_result_s = now_ms / 1000.0
+        measuring = self._measuring
+        if measuring:
+            self.stats.results += 1
+            self.stats.bytes += len(raw)
+        latency = None
+        # decode during warm-up too: acked frames must be in the history (PD v5 references)
+        for name, pkt in entries:
+            ref = packet_ref_seq(pkt)
+            hist = self._hist.setdefault(name, {})
+            try:
+                dec = decode_pose_packet(pkt, self._prev.get(name) if ref is None else hist.get(ref))
+            except Exception:
+                # delta without a usable reference (lost packet) → ask for a keyframe
+                self._prev.pop(name, None)
+                self.stats.undecodable += int(measuring)
+                self.stats.kf_requests += int(measuring)
+                self.ctrl_dc.emit("send-string", "KF")
+                continue
+            self._prev[name] = dec.points
+            hist[seq] = dec.points
+            if len(hist) > REF_HISTORY:
+                del hist[next(iter(hist))]
+            if name == "frameid" and dec.points.size:
+                x, y = (int(v) for v in dec.points[0, 0])
+                t_push = self._push_ms.get((y * dec.image_w + x) & 0xFFFF)
+                if t_push is not None:
+                    latency = now_ms - t_push
+        if not measuring:
+            return
+        if latency is None and not self.frame_ids:
+            latency = (now_ms - ts_ms) % 2**32
+        if latency is not None:
+            self.stats.latencies_ms.append(latency)
+
+    def start_measuring(self) -> None:
+        self._measuring = True
+
+    def close(self) -> None:
+        self._stop.set()
+        self.pipeline.set_state(Gst.State.NULL)
+
+
+def synthetic_frames(width: int, height: int):
+    """Moving gradient: cheap, and never identical between frames."""
+    yy, xx = np.mgrid[0:height, 0:width]
+    base = np.stack([(xx * 255 // width), (yy * 255 // height), ((xx + yy) * 127 // (width + height))], -1)
+    base = base.astype(np.uint8)
+    t = 0
+    while True:
+        yield np.roll(base, t * 4, axis=1)
+        t += 1
+
+
+def file_frames(path: str, width: int, height: int):
+    import cv2
+
+    while True:  # loop the clip
+        cap = cv2.VideoCapture(path)
+        ok, bgr = cap.read()
+        if not ok:
+            raise RuntimeError(f"cannot read {path}")
+        while ok:
+            yield cv2.cvtColor(cv2.resize(bgr, (width, height)), cv2.COLOR_BGR2RGB)
+            ok, bgr = cap.read()
+        cap.release()
+
+
+# ─────────────── in-process server ───────────────
+async def start_server(args) -> Tuple[object, List[str]]:
+    from sanic import Sanic
+
+    if args.app:
+        from app import app as sanic_app  # real pose/face adapters + model setup
+        tasks = args.tasks or ["pose"]
+    else:
+        sanic_app = Sanic("bench_loopback")
+        sanic_app.blueprint(W.build_webrtc_blueprint(
+            adapters={"frameid": frameid_adapter(args.detect_ms)}, default_task="frameid"))
+        tasks = ["frameid"]
+    server = await sanic_app.create_server(
+        host="127.0.0.1", port=args.port, return_asyncio_server=True, access_log=False)
+    await server.startup()
+    await server.before_start()
+    await server.after_start()
+    return server, tasks
+
+
+def _pct(vals: List[float], q: float) -> float:
+    return float(np.percentile(vals, q)) if vals else float("nan")
+
+
+def report(peers: List[LoopbackPeer], seconds: float, t0_s: float) -> None:
+    print(f"{'sess':<8}{'pushed':>8}{'results':>9}{'fps':>7}{'kB/s':>8}{'p50 ms':>8}{'p90':>7}"
+          f"{'p99':>7}{'max':>7}{'ttfr ms':>9}{'bad':>5}")
+    all_lat: List[float] = []
+    for p in peers:
+        s = p.stats
+        all_lat += s.latencies_ms
+        ttfr = (s.first_result_s - t0_s) * 1000.0 if s.first_result_s else float("nan")
+        print(f"{(p.sid or '-'):<8}{s.pushed:>8}{s.results:>9}{s.results / seconds:>7.1f}"
+              f"{s.bytes / seconds / 1000:>8.2f}{_pct(s.latencies_ms, 50):>8.1f}{_pct(s.latencies_ms, 90):>7.1f}"
+              f"{_pct(s.latencies_ms, 99):>7.1f}{max(s.latencies_ms, default=float('nan')):>7.1f}"
+              f"{ttfr:>9.0f}{s.undecodable:>5}")
+    total = sum(p.stats.results for p in peers)
+    print(f"{'all':<8}{sum(p.stats.pushed for p in peers):>8}{total:>9}{total / seconds:>7.1f}"
+          f"{sum(p.stats.bytes for p in peers) / seconds / 1000:>8.2f}{_pct(all_lat, 50):>8.1f}"
+          f"{_pct(all_lat, 90):>7.1f}{_pct(all_lat, 99):>7.1f}{max(all_lat, default=float('nan')):>7.1f}")
+
+
+async def run(args) -> None:
+    Gst.init(None)
+    server, tasks = await start_server(args)
+    base_url = f"http://127.0.0.1:{args.port}"
+    peers = [
+        LoopbackPeer(i, codec=args.codec, width=args.width, height=args.height, fps=args.fps,
+                     bitrate_kbps=args.bitrate, frame_ids=not args.app)
+        for i in range(args.sessions)
+    ]
+    threads: List[threading.Thread] = []
+    t0_s = time.monotonic()
+    try:
+        await asyncio.gather(*(p.connect(base_url, tasks) for p in peers))
+        for p in peers:
+            frames = file_frames(args.file, args.width, args.height) if args.file else \
+                synthetic_frames(args.width, args.height)
+            th = threading.Thread(target=p.run_source, args=(frames,), daemon=True)
+            th.start()
+            threads.append(th)
+        print(f"{len(peers)} session(s) connected ({args.codec} {args.width}x{args.height}@{args.fps}); "
+              f"warming up {args.warmup:.0f}s…")
+        await asyncio.sleep(args.warmup)
+        for p in peers:
+            p.start_measuring()
+        await asyncio.sleep(args.seconds)
+        report(peers, args.seconds, t0_s)
+        if args.snapshot:
+            for sess in list(W._sessions):
+                print(json.dumps({"sid": sess.sid, "stats": sess.stats}, default=str))
+    finally:
+        for p in peers:
+            p.close()
+        await server.before_stop()
+        await server.close()
+        await server.after_stop()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Loopback WebRTC benchmark (latency / FPS / bytes per session)")
+    ap.add_argument("--sessions", type=int, default=1)
+    ap.add_argument("--seconds", type=float, default=15.0, help="measurement window")
+    ap.add_argument("--warmup", type=float, default=3.0)
+    ap.add_argument("--codec", choices=("vp8", "h264"), default="vp8")
+    ap.add_argument("--width", type=int, default=640)
+    ap.add_argument("--height", type=int, default=480)
+    ap.add_argument("--fps", type=int, default=30)
+    ap.add_argument("--bitrate", type=int, default=1500, help="kbps")
+    ap.add_argument("--file", help="video file instead of the synthetic pattern (looped)")
+    ap.add_argument("--app", action="store_true", help="serve app.py (MediaPipe adapters) instead of 'frameid'")
+    ap.add_argument("--tasks", nargs="*", help="tasks to request with --app (default: pose)")
+    ap.add_argument("--detect-ms", type=float, default=0.0, help="simulated inference cost for 'frameid'")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--snapshot", action="store_true", help="print each server session's stats at the end")
+    asyncio.run(run(ap.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# connection/bench_packing.py — micro-benchmark: struct.pack vs NumPy PO/PD encoders
+#
+#   python -m connection.bench_packing [--frames 2000] [--objects 1]
+#
+# Simulates a random-walk landmark stream at pose (33) and face (478) point
+# counts, checks that both encoders emit identical bytes and that the decoder
+# round-trips, then reports µs/packet for each path.
+
+from __future__ import annotations
+
+import argparse
+import time
+from typing import Callable, List
+
+import numpy as np
+
+from .packing import (
+    decode_pose_packet,
+    pack_pose_frame,
+    pack_pose_frame_delta,
+    pack_pose_frame_delta_np,
+    pack_pose_frame_np,
+)
+
+POINT_COUNTS = {"pose": 33, "face": 478}
+
+
+def make_stream(frames: int, n_obj: int, k: int, *, w: int = 1280, h: int = 720, seed: int = 0) -> np.ndarray:
+    """(T,N,K,2) int32 random walk; ~30% of points move by a few px each frame."""
+    rng = np.random.default_rng(seed)
+    base = rng.integers(0, [w, h], size=(n_obj, k, 2))
+    steps = rng.integers(-3, 4, size=(frames, n_obj, k, 2))
+    steps[rng.random((frames, n_obj, k)) > 0.3] = 0
+    return np.clip(base + np.cumsum(steps, axis=0), 0, [w - 1, h - 1]).astype(np.int32)
+
+
+def _time_us(fn: Callable[[int], bytes], frames: int) -> float:
+    t0 = time.perf_counter()
+    for i in range(frames):
+        fn(i)
+    return (time.perf_counter() - t0) * 1e6 / frames
+
+
+def run(frames: int, n_obj: int) -> List[str]:
+    lines = [f"{'case':<12}{'enc':>10}{'struct µs':>12}{'numpy µs':>12}{'speedup':>9}{'bytes':>8}"]
+    for label, k in POINT_COUNTS.items():
+        arr = make_stream(frames, n_obj, k)
+        lists = [[[tuple(map(int, p)) for p in obj] for obj in fr] for fr in arr]
+
+        # correctness: identical bytes + decoder round-trip
+        prev_dec = None
+        for i in range(min(frames, 200)):
+            prev_l = lists[i - 1] if i else None
+            prev_a = arr[i - 1] if i else None
+            a = pack_pose_frame_delta(prev_l, lists[i], 1280, 720, keyframe=(i % 50 == 0), seq=i, ver=2)
+            b = pack_pose_frame_delta_np(prev_a, arr[i], 1280, 720, keyframe=(i % 50 == 0), seq=i, ver=2)
+            assert a == b, f"{label}: PD mismatch at frame {i}"
+            assert pack_pose_frame(1280, 720, lists[i]) == pack_pose_frame_np(1280, 720, arr[i])
+            prev_dec = decode_pose_packet(b, prev_dec).points
+            assert np.array_equal(prev_dec, arr[i]), f"{label}: decode mismatch at frame {i}"
+
+        cases = {
+            "PO": (
+                lambda i: pack_pose_frame(1280, 720, lists[i]),
+                lambda i: pack_pose_frame_np(1280, 720, arr[i]),
+            ),
+            "PD Δ": (
+                lambda i: pack_pose_frame_delta(lists[i - 1], lists[i], 1280, 720, False, seq=i),
+                lambda i: pack_pose_frame_delta_np(arr[i - 1], arr[i], 1280, 720, False, seq=i),
+            ),
+            "PD Δ (list)": (
+                lambda i: pack_pose_frame_delta(lists[i - 1], lists[i], 1280, 720, False, seq=i),
+                lambda i: pack_pose_frame_delta_np(lists[i - 1], lists[i], 1280, 720, False, seq=i),
+            ),
+        }
+        for enc, (py_fn, np_fn) in cases.items():
+            rng = range(1, frames)
+            py_us = _time_us(lambda j: py_fn(rng[j]), len(rng))
+            np_us = _time_us(lambda j: np_fn(rng[j]), len(rng))
+            nbytes = len(np_fn(frames - 1))
+            lines.append(
+                f"{label + f' K={k}':<12}{enc:>10}{py_us:>12.1f}{np_us:>12.1f}{py_us / np_us:>8.1f}x{nbytes:>8}"
+            )
+
+        dec_packets = [pack_pose_frame_delta_np(arr[i - 1], arr[i], 1280, 720, False, seq=i) for i in range(1, frames)]
+        t0 = time.perf_counter()
+        for i, pkt in enumerate(dec_packets, start=1):
+            decode_pose_packet(pkt, arr[i - 1])
+        dec_us = (time.perf_counter() - t0) * 1e6 / len(dec_packets)
+        lines.append(f"{label + f' K={k}':<12}{'decode Δ':>10}{'-':>12}{dec_us:>12.1f}")
+    return lines
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="PO/PD encoder micro-benchmark")
+    ap.add_argument("--frames", type=int, default=2000)
+    ap.add_argument("--objects", type=int, default=1, help="objects (poses/faces) per frame")
+    args = ap.parse_args()
+    for line in run(args.frames, args.objects):
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+# connection/dcsend.py — per-channel send gate driven by buffered-amount-low
+#
+# Every results packet used to read the channel's ready-state and buffered-amount
+# (GObject property reads that take webrtcbin's locks) and was dropped when the
+# backlog was over 32 KiB. A DcSendGate instead keeps an estimate of the backlog —
+# the last value read plus the bytes sent since — and reads buffered-amount only
+# when that estimate reaches `high`:
+#
+#   open     → send now
+#   ≥ high   → pause: packets offered meanwhile wait in a one-slot holder, each
+#              replacing the previous one (only the newest result is worth sending)
+#   low      → the channel's on-buffered-amount-low signal (buffered-amount-low-
+#              threshold = `low`) resumes the gate and flushes the held packet
+#
+# Time a packet spends in the holder is its send-queue residency. Between two known
+# backlog levels (a read, or the low signal) the gate also measures the channel's
+# drain rate, which the send pacer uses instead of sampling buffered-amount itself.
+# ready-state comes from on-open / on-close. Everything here runs on the asyncio
+# loop: the session posts the GStreamer-thread signals there. If the low signal
+# never comes (older webrtcbin), a paused gate re-reads buffered-amount at most
+# every `probe_ms` when a packet is offered or poll() is called.
+
+from __future__ import annotations
+
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Optional, Tuple
+
+import numpy as np
+
+SENT, HELD, REPLACED = "sent", "held", "replaced"
+
+# commit(held_ms): bookkeeping once the packet is on the channel (0.0 = sent directly)
+Commit = Callable[[float], None]
+
+
+class DcSendGate:
+    def __init__(self, read_level: Callable[[], int], *, high: int, low: int,
+                 probe_ms: float = 250.0, window: int = 512):
+        self.read_level = read_level
+        self.high = max(1, int(high))
+        self.low = max(0, min(int(low), self.high - 1))
+        self.probe_ns = int(probe_ms * 1e6)
+        self.open = False
+        self.paused = False
+        self.level = 0  # estimated buffered-amount (upper bound: drain is only seen on reads/low)
+        self.drain_bps = 0.0
+        self._mark_ns = 0  # last known level, its time and the bytes sent since
+        self._mark_level = 0
+        self._sent_since_mark = 0
+        self._paused_ns = 0
+        self._probe_ns = 0
+        self._slot: Optional[Tuple[bytes, Callable[[bytes], None], Commit, int, bool]] = None
+        self._resid_ms: Deque[float] = deque(maxlen=max(1, window))
+        self.stats: Dict[str, int | float] = dict(
+            sent=0, held=0, replaced=0, flushed=0, pauses=0, level_reads=0, paused_ms=0.0,
+        )
+
+    @property
+    def holding(self) -> bool:
+        return self._slot is not None
+
+    @property
+    def holding_key(self) -> bool:
+        """The held packet is a keyframe: its replacement must be one too."""
+        return self._slot is not None and self._slot[4]
+
+    def offer(self, packet: bytes, send: Callable[[bytes], None], commit: Commit, *, key: bool = False) -> str:
+        """Sends `packet` now (SENT, commit already called) or holds it until the
+        channel drains (HELD / REPLACED an older held packet). send() errors propagate."""
+        now = self.poll()
+        if self.paused:
+            replaced = self._slot is not None
+            self._slot = (packet, send, commit, now, key)
+            self.stats["replaced" if replaced else "held"] += 1
+            return REPLACED if replaced else HELD
+        self._send(packet, send, commit, 0.0)
+        return SENT
+
+    def poll(self) -> int:
+        """While paused, probes buffered-amount (at most every probe_ms) in case the
+        low signal was missed; returns the monotonic time used."""
+        now = time.monotonic_ns()
+        if self.paused and now - self._probe_ns >= self.probe_ns:
+            self._probe_ns = now
+            if self._read() < self.high:
+                self._resume(now)
+        return now
+
+    def on_low(self) -> None:
+        """on-buffered-amount-low: the backlog fell to `low` or below."""
+        now = time.monotonic_ns()
+        self._mark(min(self.level, self.low), now)
+        if self.paused:
+            self._resume(now)
+
+    def set_open(self, is_open: bool) -> None:
+        self.open = is_open
+        if not is_open:
+            if self._slot is not None:
+                self.stats["replaced"] += 1  # never sent: counted with the superseded ones
+            self._slot = None
+            self.paused = False
+            self.level = 0
+
+    def _read(self) -> int:
+        self.stats["level_reads"] += 1
+        self._mark(int(self.read_level()), time.monotonic_ns())
+        return self.level
+
+    def _mark(self, level: int, now: int) -> None:
+        # backlogged at both ends → the buffer drained at the channel's rate in between
+        if self._mark_level > 0 and level > 0 and now > self._mark_ns:
+            drained = self._mark_level + self._sent_since_mark - level
+            rate = max(drained, 0) * 1e9 / (now - self._mark_ns)
+            self.drain_bps = rate if not self.drain_bps else self.drain_bps * 0.8 + rate * 0.2
+        self._mark_ns, self._mark_level, self._sent_since_mark = now, level, 0
+        self.level = level
+
+    def _send(self, packet: bytes, send: Callable[[bytes], None], commit: Commit, held_ms: float) -> None:
+        send(packet)
+        self.level += len(packet)
+        self._sent_since_mark += len(packet)
+        self.stats["sent"] += 1
+        commit(held_ms)
+        if self.level >= self.high and self._read() >= self.high:
+            self.paused = True
+            self._paused_ns = self._probe_ns = time.monotonic_ns()
+            self.stats["pauses"] += 1
+
+    def _resume(self, now: int) -> None:
+        self.paused = False
+        self.stats["paused_ms"] += (now - self._paused_ns) / 1e6
+        slot, self._slot = self._slot, None
+        if slot is None:
+            return
+        packet, send, commit, t_ns, _key = slot
+        held_ms = (now - t_ns) / 1e6
+        self._resid_ms.append(held_ms)
+        self.stats["flushed"] += 1
+        self._send(packet, send, commit, held_ms)
+
+    def snapshot(self) -> Dict[str, object]:
+        r = np.asarray(self._resid_ms, dtype=np.float64)
+        return dict(
+            self.stats,
+            paused_ms=round(float(self.stats["paused_ms"]), 1),
+            open=self.open,
+            paused=self.paused,
+            holding=self.holding,
+            level=self.level,
+            drain_bytes_per_s=round(self.drain_bps, 1),
+            high=self.high,
+            low=self.low,
+            residency_ms_p50=round(float(np.percentile(r, 50)), 2) if r.size else 0.0,
+            residency_ms_p90=round(float(np.percentile(r, 90)), 2) if r.size else 0.0,
+            residency_ms_max=round(float(r.max()), 2) if r.size else 0.0,
+        )
@@ -10,8 +10,10 @@
 
 from __future__ import annotations
 import contextlib
+import functools
+import json
 import os
-from typing import Callable, Optional, Tuple
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 
 import gi
 gi.require_version("Gst", "1.0")
@@ -34,11 +36,81 @@ except Exception:
 # Prefer VA-API for H.264 (fallback to NV then software)
 CANDIDATE_DECODERS_H264 = ["vah264dec", "vaapih264dec", "nvh264dec", "avdec_h264"]
 
-
+# Every decoder the benchmark (connection/bench_decode.py) may compare, per codec.
+# Without a preference file the choice below is unchanged (availability order).
+DECODER_CANDIDATES: Dict[str, List[str]] = {
+    "H264": CANDIDATE_DECODERS_H264,
+    "H265": CANDIDATE_DECODERS,
+    "VP8": ["vp8dec", "avdec_vp8"],
+    "VP9": ["vp9dec", "avdec_vp9"],
+    "AV1": ["av1dec", "dav1dec"],
+}
+
+# Measured preferences written by `python -m connection.bench_decode --write-prefs`:
+#   {"codecs": {"H264": {"decoder": "avdec_h264", "props": {"threads": 2, ...}}, ...}}
+# An entry whose decoder isn't installed is ignored. Its props replace the generic
+# low-latency tweaks for that decoder.
+DECODER_PREFS = os.getenv("DECODER_PREFS", "decoder_prefs.json")
+
+
+# The plugin registry doesn't change while the server runs: probe each name once.
+@functools.lru_cache(maxsize=None)
 def _has_factory(name: str) -> bool:
     return Gst.ElementFactory.find(name) is not None
 
 
+@functools.lru_cache(maxsize=None)
+def _first_factory(names: Tuple[str, ...]) -> Optional[str]:
+    return _find_first_factory(list(names))
+
+
+def codec_key(encoding: str) -> str:
+    """RTP encoding-name → DECODER_CANDIDATES / preference key."""
+    enc = (encoding or "").upper()
+    if enc.startswith("H264"):
+        return "H264"
+    if enc.startswith("H265") or enc == "HEVC":
+        return "H265"
+    if "AV1" in enc:
+        return "AV1"
+    return enc
+
+
+@functools.lru_cache(maxsize=None)
+def decoder_preferences(path: str = DECODER_PREFS) -> Dict[str, Dict[str, Any]]:
+    """{codec: {"decoder", "props"}} from the preference file, installed decoders only."""
+    try:
+        with open(path) as f:
+            codecs = json.load(f).get("codecs") or {}
+    except (OSError, ValueError, AttributeError):
+        return {}
+    out: Dict[str, Dict[str, Any]] = {}
+    for codec, entry in codecs.items():
+        if isinstance(entry, dict) and entry.get("decoder") and _has_factory(str(entry["decoder"])):
+            out[codec_key(codec)] = {"decoder": str(entry["decoder"]), "props": dict(entry.get("props") or {})}
+    return out
+
+
+_PROBED_ELEMENTS = (
+    "rtpjitterbuffer", "queue", "rtpvp8depay", "rtpvp9depay", "rtph264depay", "rtph265depay",
+    "rtpav1depay", "h264parse", "h265parse", "vp8dec", "vp9dec", "av1dec", "dav1dec",
+    "vapostproc", "vaapipostproc", "nvvideoconvert", "nvvidconv", "videoscale", "videoconvert",
+    "capsfilter", "appsink",
+)
+
+
+def probe_factories(extra: Iterable[str] = ()) -> Dict[str, object]:
+    """Fills the factory caches at startup (decode-chain elements + decoder choices)."""
+    found = {n: _has_factory(n) for n in (*_PROBED_ELEMENTS, *extra)}
+    prefs = decoder_preferences()
+    return {
+        "elements": found,
+        "h264_decoder": (prefs.get("H264") or {}).get("decoder") or _first_factory(tuple(CANDIDATE_DECODERS_H264)),
+        "h265_decoder": (prefs.get("H265") or {}).get("decoder") or _first_factory(tuple(CANDIDATE_DECODERS)),
+        "decoder_prefs": prefs,
+    }
+
+
 # ──────────────────────── HW detection helpers + logging ───────────────────────
 
 def _is_va_factory(factory_name: str) -> bool:
@@ -167,6 +239,19 @@ def _apply_decoder_latency_tweaks(dec: Gst.Element, dbg: Callable[[str], None] |
         _set_prop("threads", threads)
 
 
+def _apply_decoder_props(dec: Gst.Element, props: Dict[str, Any], dbg: Callable[[str], None] | None = None) -> None:
+    """Sets measured decoder properties; values go through Gst's string
+    deserialisation, so enums/flags may be given by nick ("slice")."""
+    for name, value in (props or {}).items():
+        if not dec.find_property(name):
+            continue
+        text = str(value).lower() if isinstance(value, bool) else str(value)
+        with contextlib.suppress(Exception):
+            Gst.util_set_object_arg(dec, name, text)
+            if dbg:
+                dbg(f"Decoder preference: {dec.get_factory().get_name()}.{name}={text}")
+
+
 def _make_depay_and_parse(encoding: str) -> Tuple[Optional[Gst.Element], Optional[Gst.Element]]:
     enc = (encoding or "").upper()
     depay = parse = None
@@ -204,25 +289,37 @@ def _make_depay_and_parse(encoding: str) -> Tuple[Optional[Gst.Element], Optiona
 def _make_decoder_for(
     encoding: str,
     dbg: Callable[[str], None] | None = None,
-    warn: Callable[[str], None] | None = None
+    warn: Callable[[str], None] | None = None,
+    decoder: Optional[str] = None,
+    decoder_props: Optional[Dict[str, Any]] = None,
 ) -> Optional[Gst.Element]:
+    """`decoder` forces a factory (no fallback); otherwise the preference file's
+    choice, then the built-in candidates."""
     enc = (encoding or "").upper()
     dec = None
-    if enc in ("VP8",):
+    if decoder is None:
+        pref = decoder_preferences().get(codec_key(enc))
+        if pref is not None:
+            decoder, decoder_props = pref["decoder"], pref["props"]
+    if decoder is not None:
+        dec = Gst.ElementFactory.make(decoder, None)
+    elif enc in ("VP8",):
         dec = Gst.ElementFactory.make("vp8dec", None)
     elif enc in ("VP9",):
         dec = Gst.ElementFactory.make("vp9dec", None)
     elif enc in ("H264", "H264-SVC"):
-        name = _find_first_factory(CANDIDATE_DECODERS_H264) or "avdec_h264"
+        name = _first_factory(tuple(CANDIDATE_DECODERS_H264)) or "avdec_h264"
         dec = Gst.ElementFactory.make(name, None)
     elif enc in ("H265", "HEVC", "H265/90000"):
-        name = _find_first_factory(CANDIDATE_DECODERS) or "avdec_h265"
+        name = _first_factory(tuple(CANDIDATE_DECODERS)) or "avdec_h265"
         dec = Gst.ElementFactory.make(name, None)
     elif "AV1" in enc:
         dec = (Gst.ElementFactory.make("av1dec", None)
                or Gst.ElementFactory.make("dav1dec", None))
     if dec:
         _apply_decoder_latency_tweaks(dec, dbg)
+        if decoder_props:
+            _apply_decoder_props(dec, decoder_props, dbg)
     if dbg and dec:
         _log_decoder_hw_details(dec, enc, dbg)
     if warn and not dec:
@@ -283,11 +380,69 @@ def _maybe_postproc_after(
     return postproc, caps_to_sys
 
 
+def _set_if_supported(elem: Gst.Element, prop: str, value, dbg: Callable[[str], None] | None = None) -> bool:
+    if elem is None or not elem.find_property(prop):
+        return False
+    with contextlib.suppress(Exception):
+        elem.set_property(prop, value)
+        if dbg:
+            dbg(f"{elem.get_factory().get_name()}.{prop}={value}")
+        return True
+    return False
+
+
+def _caps_size(info: Gst.PadProbeInfo) -> Optional[Tuple[int, int]]:
+    ev = info.get_event()
+    if ev is None or ev.type != Gst.EventType.CAPS:
+        return None
+    st = ev.parse_caps().get_structure(0)
+    ok_w, w = st.get_int("width")
+    ok_h, h = st.get_int("height")
+    return (int(w), int(h)) if ok_w and ok_h else None
+
+
+def _watch_input_size(dec: Gst.Element, on_src_size: Callable[[int, int], None]) -> None:
+    """Reports the sender's width/height: the coded size on the decoder's sink pad
+    (parsers and most depayloaders put it in the caps), else the decoder's output
+    size scaled back up by its 'lowres' factor."""
+    shift = 0
+    with contextlib.suppress(Exception):
+        if dec.find_property("lowres") is not None:
+            shift = int(dec.get_property("lowres"))
+    coded = [False]
+
+    def _on_sink(_pad, info):
+        wh = _caps_size(info)
+        if wh is not None:
+            coded[0] = True
+            with contextlib.suppress(Exception):
+                on_src_size(*wh)
+        return Gst.PadProbeReturn.OK
+
+    def _on_src(_pad, info):
+        wh = _caps_size(info)
+        if wh is not None and not coded[0]:
+            with contextlib.suppress(Exception):
+                on_src_size(wh[0] << shift, wh[1] << shift)
+        return Gst.PadProbeReturn.OK
+
+    dec.get_static_pad("sink").add_probe(Gst.PadProbeType.EVENT_DOWNSTREAM, _on_sink)
+    dec.get_static_pad("src").add_probe(Gst.PadProbeType.EVENT_DOWNSTREAM, _on_src)
+
+
 def build_rtp_video_decode_bin(
     encoding_name: str,
-    on_new_sample: Callable[[GstApp.AppSink], Gst.FlowReturn],
+    on_new_sample: Optional[Callable[[GstApp.AppSink], Gst.FlowReturn]],
     *,
     want_rgb: bool = True,
+    out_width: Optional[int] = None,
+    out_height: Optional[int] = None,
+    out_format: str = "RGB",
+    convert_threads: int = 0,
+    decoder_lowres: int = 0,
+    decoder: Optional[str] = None,
+    decoder_props: Optional[Dict[str, Any]] = None,
+    on_src_size: Callable[[int, int], None] | None = None,
     dbg: Callable[[str], None] | None = None,
     warn: Callable[[str], None] | None = None,
     name: str = "rxdecbin",
@@ -295,7 +450,15 @@ def build_rtp_video_decode_bin(
     """
     Creates a Gst.Bin with a *ghost sink pad* that accepts application/x-rtp (video)
     and ends in an appsink (CPU memory, RGB if want_rgb=True).
+    out_width/out_height cap the delivered size (videoscale, downscale only; a
+    missing dimension follows the display aspect ratio) and `on_src_size(w, h)`
+    reports the sender's size (before lowres decoding and scaling). convert_threads sets n-threads on
+    videoscale/videoconvert (0 = element default). decoder_lowres (0/1/2) asks
+    decoders with a 'lowres' property (avdec_*) for 1/2 or 1/4 resolution output.
+    decoder/decoder_props force a decoder factory and its properties (benchmarks);
+    by default the preference file (DECODER_PREFS) or the candidate lists decide.
     Returns (bin, appsink). Caller must add to pipeline and link the src pad → bin.sink.
+    With on_new_sample=None the callbacks are left for wire_decode_bin (pre-built bins).
     """
     bin_ = Gst.Bin.new(name)
     if bin_ is None:
@@ -303,21 +466,44 @@ def build_rtp_video_decode_bin(
 
     q_in = Gst.ElementFactory.make("queue", None)
     depay, parse = _make_depay_and_parse(encoding_name)
-    dec = _make_decoder_for(encoding_name, dbg=dbg, warn=warn)
+    dec = _make_decoder_for(encoding_name, dbg=dbg, warn=warn, decoder=decoder, decoder_props=decoder_props)
     if depay is None or dec is None:
         raise RuntimeError(f"No depay/decoder available for encoding '{encoding_name}'")
 
+    dec.set_name("dec")  # wire_decode_bin finds it again on pre-built bins
     postproc, caps_to_sys = _maybe_postproc_after(dec, dbg=dbg)
+    if decoder_lowres > 0:
+        _set_if_supported(dec, "lowres", int(decoder_lowres), dbg)
+    # sender size for points_shape: read at the decoder, so lowres and scaling both undo
+    if on_src_size and on_new_sample is not None:
+        _watch_input_size(dec, on_src_size)
+
+    # Scale before colour conversion so videoconvert touches fewer pixels
+    vscale = None
+    if out_width or out_height:
+        vscale = Gst.ElementFactory.make("videoscale", "vscale")
+        if vscale is None and warn:
+            warn("videoscale not available; delivering native resolution")
 
     swcvt = Gst.ElementFactory.make("videoconvert", "swcvt")  # ensures CPU colorspace
     # Enable QoS on the CPU converter (optional but recommended)
     with contextlib.suppress(Exception):
         swcvt.set_property("qos", True)
+    if convert_threads > 0:
+        _set_if_supported(swcvt, "n-threads", int(convert_threads), dbg)
+        _set_if_supported(vscale, "n-threads", int(convert_threads), dbg)
 
     caps_rgb = None
-    if want_rgb:
+    if want_rgb or vscale:
+        caps_str = f"video/x-raw,format={out_format}" if want_rgb else "video/x-raw"
+        if vscale and out_width:
+            caps_str += f",width=(int)[16,{int(out_width)}]"   # range → never upscales
+        if vscale and out_height:
+            caps_str += f",height=(int)[16,{int(out_height)}]"
         caps_rgb = Gst.ElementFactory.make("capsfilter", "caps_rgb")
-        caps_rgb.set_property("caps", Gst.Caps.from_string("video/x-raw,format=RGB"))
+        caps_rgb.set_property("caps", Gst.Caps.from_string(caps_str))
+        if dbg and vscale:
+            dbg(f"Output caps constrained: {caps_str}")
 
     # Create the leaky queue right before appsink
     q2 = Gst.ElementFactory.make("queue", "leaky_to_sink")
@@ -331,7 +517,8 @@ def build_rtp_video_decode_bin(
     appsink.set_property("sync", False)
     appsink.set_property("max-buffers", 1)
     appsink.set_property("drop", True)
-    appsink.connect("new-sample", on_new_sample)
+    if on_new_sample is not None:
+        appsink.connect("new-sample", on_new_sample)
 
     # Build the chain, inserting q2 just before appsink
     chain = [q_in, depay]
@@ -342,6 +529,8 @@ def build_rtp_video_decode_bin(
         chain.append(postproc)
     if caps_to_sys:
         chain.append(caps_to_sys)
+    if vscale:
+        chain.append(vscale)
     if swcvt:
         chain.append(swcvt)
     if caps_rgb:
@@ -382,6 +571,20 @@ def build_rtp_video_decode_bin(
     return bin_, appsink
 
 
+def wire_decode_bin(
+    bin_: Gst.Bin,
+    on_new_sample: Callable[[GstApp.AppSink], Gst.FlowReturn],
+    on_src_size: Callable[[int, int], None] | None = None,
+) -> GstApp.AppSink:
+    """Connects the per-session callbacks of a bin built with on_new_sample=None."""
+    appsink = bin_.get_by_name("appsink")
+    appsink.connect("new-sample", on_new_sample)
+    dec = bin_.get_by_name("dec")
+    if dec is not None and on_src_size:
+        _watch_input_size(dec, on_src_size)
+    return appsink
+
+
 def attach_rtp_video_decode_chain(
     pipeline: Gst.Pipeline,
     src_pad: Gst.Pad,
@@ -390,14 +593,25 @@ def attach_rtp_video_decode_chain(
     *,
     dbg: Callable[[str], None] | None = None,
     warn: Callable[[str], None] | None = None,
+    prebuilt: Optional[Gst.Bin] = None,
+    **bin_opts,
 ) -> Gst.Bin:
     """
     Convenience wrapper: builds the bin, adds it to the pipeline, links src_pad→bin.sink,
     and syncs it to the parent's state. Returns the created bin.
+    `bin_opts` are forwarded to build_rtp_video_decode_bin (out_width, out_height, ...).
+    `prebuilt` (a bin from build_rtp_video_decode_bin(..., on_new_sample=None) with the
+    same options) is wired and used instead of building a new one.
     """
-    bin_, _appsink = build_rtp_video_decode_bin(
-        encoding_name, on_new_sample, dbg=dbg, warn=warn
-    )
+    if prebuilt is not None:
+        bin_ = prebuilt
+        wire_decode_bin(bin_, on_new_sample, bin_opts.get("on_src_size"))
+        if dbg:
+            dbg(f"Using pre-built decode bin '{bin_.get_name()}' for '{encoding_name}'")
+    else:
+        bin_, _appsink = build_rtp_video_decode_bin(
+            encoding_name, on_new_sample, dbg=dbg, warn=warn, **bin_opts
+        )
     pipeline.add(bin_)
     # Link webrtcbin's newly-added src pad → our bin sink
     ret = src_pad.link(bin_.get_static_pad("sink"))
@@ -0,0 +1,149 @@
+# connection/events.py — structured event log for the WebRTC hot path
+#
+# Call sites guard on a plain attribute so a disabled log costs one flag check:
+#
+#     if EVENTS.on:
+#         EVENTS.emit("packet", self.sid, "seq=%d bytes=%d", seq, len(packet))
+#
+# Arguments are stored as-is; "%"-formatting happens only when a record is echoed
+# (PRINT_LOGS=1) or dumped. Pass scalars or immutable values — the record keeps
+# references until it falls out of the ring.
+#
+# EVENT_LOG enables the log and tunes it per event type ("*" = default rule):
+#     EVENT_LOG="packet=every:10,rate:20;appsink=rate:5;*=rate:200"
+#   every:N  keep 1 of N events of that type (sampling)
+#   rate:R   at most R events/s (token bucket, burst = R)
+#   off      drop that type
+# EVENT_LOG="1" keeps everything else. Rules merge over DEFAULT_RULES, which keep
+# the per-frame types at the cadence the old debug prints used. Records go to a
+# ring of EVENT_RING entries.
+
+from __future__ import annotations
+
+import os
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+EVENT_LOG = os.getenv("EVENT_LOG", "")
+EVENT_RING = int(os.getenv("EVENT_RING", "2048"))
+
+DEFAULT_RULES = "appsink=every:30;process=every:30;rtp=every:50"
+
+_Record = Tuple[float, str, str, str, tuple]  # wall time, type, sid, fmt, args
+
+
+@dataclass
+class _Rule:
+    every: int = 1
+    rate: float = 0.0  # 0 = unlimited
+    off: bool = False
+    seen: int = 0
+    kept: int = 0
+    tokens: float = 0.0
+    t_last: float = 0.0
+
+    def admit(self) -> bool:
+        self.seen += 1
+        if self.off or (self.every > 1 and (self.seen - 1) % self.every):
+            return False
+        if self.rate > 0:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.t_last) * self.rate)
+            self.t_last = now
+            if self.tokens < 1.0:
+                return False
+            self.tokens -= 1.0
+        self.kept += 1
+        return True
+
+
+def parse_rules(spec: str) -> Dict[str, _Rule]:
+    """'type=every:N,rate:R;…' → {type: _Rule}. Raises ValueError on bad options."""
+    rules: Dict[str, _Rule] = {}
+    for part in filter(None, (p.strip() for p in spec.split(";"))):
+        if part in ("1", "on", "all"):
+            continue
+        etype, _, opts = part.partition("=")
+        rule = _Rule()
+        for opt in filter(None, (o.strip() for o in opts.split(","))):
+            key, _, val = opt.partition(":")
+            if key == "every":
+                rule.every = max(1, int(val))
+            elif key == "rate":
+                rule.rate = float(val)
+                rule.tokens = rule.rate
+            elif key == "off":
+                rule.off = True
+            else:
+                raise ValueError(f"unknown EVENT_LOG option '{opt}' for '{etype}'")
+        rules[etype.strip()] = rule
+    return rules
+
+
+class EventLog:
+    def __init__(self, spec: str = EVENT_LOG, ring: int = EVENT_RING):
+        self._ring: Deque[_Record] = deque(maxlen=ring)
+        self._rules: Dict[str, _Rule] = {}
+        self._echo: Optional[Callable[[str], None]] = None
+        self.on = False
+        self.configure(spec)
+
+    def configure(self, spec: str) -> None:
+        rules = parse_rules(DEFAULT_RULES)
+        rules.update(parse_rules(spec))
+        rules.setdefault("*", _Rule())
+        self._rules = rules
+        self.on = bool(spec) or self._echo is not None
+
+    def set_echo(self, fn: Optional[Callable[[str], None]]) -> None:
+        """Also print each kept record through `fn` (formatted line)."""
+        self._echo = fn
+        self.on = self.on or fn is not None
+
+    def emit(self, etype: str, sid: str, fmt: str, *args: Any) -> None:
+        rule = self._rules.get(etype)
+        if rule is None:
+            rule = self._rules[etype] = _Rule(**{k: getattr(self._rules["*"], k) for k in ("every", "rate", "off")})
+            rule.tokens = rule.rate
+        if not rule.admit():
+            return
+        rec = (time.time(), etype, sid, fmt, args)
+        self._ring.append(rec)
+        if self._echo is not None:
+            self._echo(self.format(rec))
+
+    @staticmethod
+    def format(rec: _Record) -> str:
+        _t, etype, sid, fmt, args = rec
+        try:
+            msg = fmt % args if args else fmt
+        except (TypeError, ValueError):
+            msg = f"{fmt} {args!r}"
+        return f"[{etype}] [WebRTC {sid}] {msg}"
+
+    def dump(self, *, etype: Optional[str] = None, sid: Optional[str] = None, limit: int = 200) -> List[Dict[str, Any]]:
+        out: List[Dict[str, Any]] = []
+        for rec in reversed(self._ring):
+            if (etype and rec[1] != etype) or (sid and rec[2] != sid):
+                continue
+            out.append({"t": round(rec[0], 6), "type": rec[1], "sid": rec[2], "msg": self.format(rec)})
+            if len(out) >= limit:
+                break
+        out.reverse()
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "on": self.on,
+            "ring": len(self._ring),
+            "ring_max": self._ring.maxlen,
+            "types": {
+                k: {"seen": r.seen, "kept": r.kept, "every": r.every, "rate": r.rate, "off": r.off}
+                for k, r in self._rules.items() if k != "*" or r.seen
+            },
+        }
+
+
+EVENTS = EventLog()
@@ -0,0 +1,138 @@
+# connection/framering.py — preallocated per-session frame slots for appsink → processing
+#
+# The GStreamer streaming thread copies each decoded RGB buffer into a free slot
+# (no per-frame allocation) and publishes it as the *pending* frame; the asyncio
+# processor takes the pending slot and holds it until it asks for the next one.
+# Three slots are enough for one writer + one pending + one held. A newer frame
+# replaces a pending one that was never taken (counted as overwritten).
+#
+# The pending slot is the mailbox: the processor only needs a loop wake-up when it
+# parked on an empty ring (take_or_park → None). write() reports that case once per
+# park, so a busy processor costs the writer no call_soon_threadsafe hop at all.
+
+from __future__ import annotations
+
+import threading
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+
+def rgb_view(data, w: int, h: int) -> np.ndarray:
+    """(h, w, 3) uint8 view over a mapped RGB buffer, honouring row padding
+    (GStreamer aligns RGB rows to 4 bytes when w*3 is not a multiple of 4)."""
+    flat = np.frombuffer(data, dtype=np.uint8)
+    row = w * 3
+    if flat.size == h * row:
+        return flat.reshape(h, w, 3)
+    stride = flat.size // h
+    return flat[: h * stride].reshape(h, stride)[:, :row].reshape(h, w, 3)
+
+
+class FrameRing:
+    def __init__(self, nslots: int = 3):
+        self._lock = threading.Lock()
+        self._slots: list[Optional[np.ndarray]] = [None] * max(3, nslots)
+        self._pts: list[int] = [-1] * len(self._slots)
+        self._times: list[tuple[int, int]] = [(0, 0)] * len(self._slots)  # (rtp, appsink) monotonic ns
+        self._writing: Optional[int] = None
+        self._pending: Optional[int] = None
+        self._held: Optional[int] = None
+        self._parked = False  # reader is waiting for a wake-up
+        self.stats: Dict[str, int] = dict(copies=0, overwritten=0, gated=0, allocs=0, taken=0, wakeups=0)
+
+    # ── writer side (GStreamer thread) ──
+    def begin_write(self, h: int, w: int) -> Tuple[int, np.ndarray]:
+        with self._lock:
+            idx = next(i for i in range(len(self._slots)) if i not in (self._pending, self._held))
+            self._writing = idx
+        buf = self._slots[idx]
+        if buf is None or buf.shape != (h, w, 3):
+            buf = np.empty((h, w, 3), dtype=np.uint8)  # first frame or caps change
+            self._slots[idx] = buf
+            self.stats["allocs"] += 1
+        return idx, buf
+
+    def write(self, src: np.ndarray, pts_ns: int, t_rtp_ns: int = 0, t_sample_ns: int = 0) -> bool:
+        """Copies `src` (h, w, 3) into a free slot and publishes it as pending.
+        The stamps (0 = unknown) travel with the slot for stage tracing.
+        Returns True when the reader is parked and must be woken."""
+        h, w = src.shape[:2]
+        idx, buf = self.begin_write(h, w)
+        np.copyto(buf, src)
+        self.stats["copies"] += 1
+        with self._lock:
+            self._pts[idx] = pts_ns
+            self._times[idx] = (t_rtp_ns, t_sample_ns)
+            if self._pending is not None:
+                self.stats["overwritten"] += 1
+            self._pending = idx
+            self._writing = None
+            wake, self._parked = self._parked, False
+            if wake:
+                self.stats["wakeups"] += 1
+            return wake
+
+    def note_gated(self) -> None:
+        self.stats["gated"] += 1
+
+    @property
+    def busy(self) -> bool:
+        """True while the processor holds a frame (the next one will wait as pending)."""
+        return self._held is not None
+
+    # ── reader side (asyncio loop) ──
+    def take(self) -> Optional[Tuple[np.ndarray, int]]:
+        """Releases the held slot and takes the pending one → (frame, pts_ns) or None."""
+        with self._lock:
+            self._held = self._pending
+            self._pending = None
+            if self._held is None:
+                return None
+            self.stats["taken"] += 1
+            return self._slots[self._held], self._pts[self._held]
+
+    def take_if_pending(self) -> Optional[Tuple[np.ndarray, int]]:
+        """Like take(), but with nothing pending keeps the current hold → None."""
+        with self._lock:
+            if self._pending is None:
+                return None
+            self._held, self._pending = self._pending, None
+            self.stats["taken"] += 1
+            return self._slots[self._held], self._pts[self._held]
+
+    def take_or_park(self) -> Optional[Tuple[np.ndarray, int]]:
+        """Like take(), but on an empty ring marks the reader parked: the next
+        write() then returns True and the caller must wake the reader."""
+        with self._lock:
+            if self._pending is None:
+                self._held = None
+                self._parked = True
+                return None
+        return self.take()
+
+    @property
+    def pending(self) -> bool:
+        return self._pending is not None
+
+    def held_times(self) -> tuple[int, int]:
+        """(RTP arrival, appsink) stamps of the held frame, monotonic ns (0 = unknown)."""
+        held = self._held
+        return self._times[held] if held is not None else (0, 0)
+
+    def release(self) -> None:
+        with self._lock:
+            self._held = None
+
+    @property
+    def nbytes(self) -> int:
+        return sum(b.nbytes for b in self._slots if b is not None)
+
+    def clear(self) -> None:
+        """Drops every slot buffer (session stopped); later writes reallocate."""
+        with self._lock:
+            self._slots = [None] * len(self._slots)
+            self._pending = self._held = None
+
+    def snapshot(self) -> Dict[str, int]:
+        return dict(self.stats, slots=len(self._slots), bytes=self.nbytes)
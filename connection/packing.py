@@ -0,0 +1,406 @@
+# connection/packing.py — binary PO/PD result packets (encoders + decoder)
+# Pure Python / NumPy only (no GStreamer), so it can be imported by tools and
+# benchmarks without a GI runtime. connection/webrtc.py re-exports the packers.
+#
+# Wire format (little-endian):
+#   PO v0 : "PO" ver:u8 n:u16 w:u16 h:u16 { k:u16 { x:u16 y:u16 }*k }*n
+#   PD v0 : "PD" ver:u8 kf:u8           n:u16 w:u16 h:u16 body
+#   PD v1+: "PD" ver:u8 kf:u8 seq:u16   n:u16 w:u16 h:u16 body
+#   PD v5+: "PD" ver:u8 kf:u8 seq:u16 ref:u16 n:u16 w:u16 h:u16 body
+#   body (kf=1): same as PO objects
+#   body (kf=0): { k:u16 mask:ceil(k/8) bytes (bit i = point i changed) { dx:i8 dy:i8 }*changed }*n
+#   body (kf=0, v3): as above but { dx:zvarint dy:zvarint }*changed — zig-zag LEB128,
+#                    1..3 bytes per component, lossless (no ±127 clamp). The v3
+#                    encoder emits a keyframe instead when that body is smaller.
+#   body (kf=0, v4): motion-compensated; per object
+#                    { k:u16 dx:zvarint dy:zvarint q:zvarint mask { rx:zvarint ry:zvarint }*changed }
+#                    The reference object is first scaled about its integer centroid by
+#                    (4096+q)/4096 and shifted by (dx, dy) (see `mc_predict`); the mask and
+#                    residuals are relative to that prediction. Same keyframe fallback as v3.
+#   body (kf=0, v5): v4 body relative to the frame sent with seq=ref (an acknowledged
+#                    one, not necessarily the previous), so a lost delta only costs
+#                    itself; receivers keep a short seq → points history (packet_ref_seq).
+#                    Keyframes carry ref=seq.
+#
+#   MX v1 : "MX" ver:u8 seq:u16 ts_ms:u32 n:u8 { name_len:u8 name:utf8 len:u32 payload }*n
+#           one container per frame carrying every adapter's PO/PD packet (same seq).
+#
+#   AK v2 : "AK" ver:u8 seq:u16 mask:u32   (ctrl channel, client → server)
+#           newest results seq received + bitmap of the 32 before it (see acks.py).
+
+from __future__ import annotations
+
+import struct
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+Points = List[List[Tuple[int, int]]]
+
+
+# ─────────────── Reference encoders (per-point struct.pack) ───────────────
+def pack_pose_frame(image_w: int, image_h: int, poses: List[List[Tuple[int, int]]]) -> bytes:
+    out = bytearray()
+    out += b"PO"
+    out += bytes([0])  # version
+    out += struct.pack("<H", min(len(poses), 0xFFFF))
+    out += struct.pack("<HH", image_w, image_h)
+    for pts in poses:
+        out += struct.pack("<H", min(len(pts), 0xFFFF))
+        for (x, y) in pts:
+            out += struct.pack("<HH", max(0, min(65535, x)), max(0, min(65535, y)))
+    return bytes(out)
+
+
+def pack_pose_frame_delta(
+    prev: List[List[Tuple[int, int]]] | None,
+    curr: List[List[Tuple[int, int]]],
+    image_w: int,
+    image_h: int,
+    keyframe: bool,
+    *,
+    seq: Optional[int] = None,
+    ver: int = 2,
+    ref_seq: Optional[int] = None,
+) -> bytes:
+    if ver >= 3:
+        return pack_pose_frame_delta_np(prev, curr, image_w, image_h, keyframe, seq=seq, ver=ver, ref_seq=ref_seq)
+    absolute_needed = (prev is None) or (len(prev) != len(curr))
+    keyframe = keyframe or absolute_needed
+    out = bytearray(b"PD")
+    out += bytes([ver & 0xFF])
+    out += bytes([1 if keyframe else 0])
+    if ver >= 1:
+        out += struct.pack("<H", (seq or 0) & 0xFFFF)
+    out += struct.pack("<H", min(len(curr), 0xFFFF))
+    out += struct.pack("<HH", image_w, image_h)
+    if keyframe:
+        for pts in curr:
+            out += struct.pack("<H", min(len(pts), 0xFFFF))
+            for (x, y) in pts:
+                out += struct.pack(
+                    "<HH", max(0, min(65535, x)), max(0, min(65535, y)),
+                )
+        return bytes(out)
+    for p, cpose in enumerate(curr):
+        npts = len(cpose)
+        out += struct.pack("<H", min(npts, 0xFFFF))
+        pmask = 0
+        for i, (x, y) in enumerate(cpose):
+            px, py = prev[p][i]
+            if x != px or y != py:
+                pmask |= (1 << i)
+        mask_bytes = (npts + 7) // 8
+        out += int(pmask).to_bytes(mask_bytes, "little", signed=False)
+        for i, (x, y) in enumerate(cpose):
+            if (pmask >> i) & 1:
+                dx = max(-127, min(127, x - prev[p][i][0]))
+                dy = max(-127, min(127, y - prev[p][i][1]))
+                out += struct.pack("<bb", dx, dy)
+    return bytes(out)
+
+
+# ─────────────── Zig-zag varints (vectorized) ───────────────
+def zigzag_varint_encode(values: np.ndarray) -> bytes:
+    """Signed ints (|v| < 2**20) → concatenated zig-zag LEB128 varints."""
+    v = np.asarray(values, dtype=np.int64).reshape(-1)
+    if v.size == 0:
+        return b""
+    z = ((v << 1) ^ (v >> 63)).astype(np.uint32)
+    nb = 1 + (z >= 0x80) + (z >= 0x4000)
+    out = np.empty((z.size, 3), dtype=np.uint8)
+    out[:, 0] = (z & 0x7F) | np.where(nb > 1, 0x80, 0)
+    out[:, 1] = ((z >> 7) & 0x7F) | np.where(nb > 2, 0x80, 0)
+    out[:, 2] = (z >> 14) & 0x7F
+    return out[np.arange(3) < nb[:, None]].tobytes()
+
+
+def zigzag_varint_decode(buf, offset: int, count: int) -> Tuple[np.ndarray, int]:
+    """Reads `count` zig-zag varints from `buf` at `offset` → (int32 values, new offset)."""
+    if count == 0:
+        return np.zeros(0, dtype=np.int32), offset
+    window = np.frombuffer(buf, dtype=np.uint8, count=min(3 * count, len(buf) - offset), offset=offset)
+    ends = np.flatnonzero((window & 0x80) == 0)
+    if ends.size < count:
+        raise ValueError("truncated varint payload")
+    ends = ends[:count]
+    used = int(ends[-1]) + 1
+    b = window[:used].astype(np.int64)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    group = np.repeat(np.arange(count), ends - starts + 1)
+    shift = 7 * (np.arange(used) - starts[group])
+    z = np.add.reduceat((b & 0x7F) << shift, starts)
+    return ((z >> 1) ^ -(z & 1)).astype(np.int32), offset + used
+
+
+# ─────────────── Motion compensation (PD v4) ───────────────
+MC_SCALE_ONE = 4096  # q is the scale offset in 1/4096 units
+
+
+def mc_predict(ref: np.ndarray, dx: int, dy: int, q: int) -> np.ndarray:
+    """Integer-exact prediction shared by encoder and decoder: scale `ref` (K,2)
+    about its floored centroid by (4096+q)/4096 (round half up), then shift."""
+    r = ref.astype(np.int64)
+    if r.shape[0] == 0:
+        return r
+    c = r.sum(axis=0) // r.shape[0]
+    scaled = ((r - c) * (MC_SCALE_ONE + q) + MC_SCALE_ONE // 2) // MC_SCALE_ONE
+    return c + scaled + np.array([dx, dy], dtype=np.int64)
+
+
+def mc_estimate(ref: np.ndarray, cur: np.ndarray) -> Tuple[int, int, int]:
+    """Global (dx, dy, q) for `ref` → `cur`: least-squares scale about the centroids,
+    then the median residual translation (robust to a few independently moving points)."""
+    if ref.shape[0] == 0:
+        return 0, 0, 0
+    r = ref.astype(np.float64)
+    c = cur.astype(np.float64)
+    rc = r - r.mean(axis=0)
+    cc = c - c.mean(axis=0)
+    den = float((rc * rc).sum())
+    s = float((rc * cc).sum()) / den if den > 0 else 1.0
+    q = int(np.clip(round((s - 1.0) * MC_SCALE_ONE), -(MC_SCALE_ONE - 1), MC_SCALE_ONE))
+    off = np.median(cur - mc_predict(ref, 0, 0, q), axis=0)
+    return int(np.rint(off[0])), int(np.rint(off[1])), q
+
+
+# ─────────────── NumPy encoders ((N,K,2) int arrays) ───────────────
+def as_points_array(points) -> np.ndarray:
+    """(N,K,2) int32 view of `points` (ndarray or list of lists of (x, y))."""
+    if isinstance(points, np.ndarray):
+        arr = points
+    elif len(points) == 0:
+        return np.zeros((0, 0, 2), dtype=np.int32)
+    else:
+        arr = np.asarray(points)
+    if arr.ndim != 3 or arr.shape[2] != 2:
+        raise ValueError(f"points must be (N,K,2); got shape {arr.shape}")
+    return arr.astype(np.int32, copy=False)
+
+
+def _objects_abs(cur: np.ndarray) -> bytes:
+    """Keyframe/PO body: per object k:u16 followed by k × (x:u16, y:u16)."""
+    n, k, _ = cur.shape
+    if n == 0:
+        return b""
+    body = np.empty((n, 1 + 2 * k), dtype="<u2")
+    body[:, 0] = min(k, 0xFFFF)
+    body[:, 1:] = np.clip(cur, 0, 65535).reshape(n, 2 * k)
+    return body.tobytes()
+
+
+def pack_pose_frame_np(image_w: int, image_h: int, poses) -> bytes:
+    """Byte-identical to `pack_pose_frame` for (N,K,2) input."""
+    cur = as_points_array(poses)
+    head = b"PO" + struct.pack("<BHHH", 0, min(cur.shape[0], 0xFFFF), image_w, image_h)
+    return head + _objects_abs(cur)
+
+
+def _pd_header(ver: int, keyframe: bool, seq: Optional[int], n: int, image_w: int, image_h: int,
+               ref_seq: Optional[int] = None) -> bytes:
+    head = b"PD" + bytes([ver & 0xFF, 1 if keyframe else 0])
+    if ver >= 1:
+        head += struct.pack("<H", (seq or 0) & 0xFFFF)
+    if ver >= 5:
+        # keyframes reference themselves; a delta without ref_seq is against the previous seq
+        ref = (seq or 0) if keyframe else ((seq or 0) - 1 if ref_seq is None else ref_seq)
+        head += struct.pack("<H", ref & 0xFFFF)
+    return head + struct.pack("<HHH", min(n, 0xFFFF), image_w, image_h)
+
+
+def pack_pose_frame_delta_np(
+    prev,
+    curr,
+    image_w: int,
+    image_h: int,
+    keyframe: bool,
+    *,
+    seq: Optional[int] = None,
+    ver: int = 2,
+    ref_seq: Optional[int] = None,
+) -> bytes:
+    """Byte-identical to `pack_pose_frame_delta` for (N,K,2) input (ver <= 2).
+    A shape mismatch with `prev` (not only a different N) forces a keyframe.
+    ver >= 3 codes lossless varint deltas (ver >= 4: relative to a motion-
+    compensated prediction) and falls back to a keyframe only when the keyframe
+    body is strictly smaller. ver >= 5: `prev` is the frame sent as `ref_seq`."""
+    cur = as_points_array(curr)
+    prv = as_points_array(prev) if prev is not None else None
+    keyframe = keyframe or prv is None or prv.shape != cur.shape
+    if keyframe:
+        return _pd_header(ver, True, seq, cur.shape[0], image_w, image_h) + _objects_abs(cur)
+
+    n, k, _ = cur.shape
+    d = cur - prv
+    changed = (d != 0).any(axis=2)                                   # (N,K)
+    masks = np.packbits(changed, axis=1, bitorder="little")          # (N, ceil(K/8))
+    kb = struct.pack("<H", min(k, 0xFFFF))
+
+    if ver >= 3:
+        parts = []
+        for p in range(n):
+            tr = b""
+            res = d[p]
+            if ver >= 4:
+                dx, dy, q = mc_estimate(prv[p], cur[p])
+                tr = zigzag_varint_encode(np.array([dx, dy, q]))
+                res = cur[p] - mc_predict(prv[p], dx, dy, q)
+            ch = (res != 0).any(axis=1)
+            parts.append(
+                kb + tr + np.packbits(ch, bitorder="little").tobytes() + zigzag_varint_encode(res[ch])
+            )
+        body = b"".join(parts)
+        if n * (2 + 4 * k) < len(body):
+            return _pd_header(ver, True, seq, n, image_w, image_h) + _objects_abs(cur)
+        return _pd_header(ver, False, seq, n, image_w, image_h, ref_seq) + body
+
+    head = _pd_header(ver, False, seq, n, image_w, image_h)
+    dd = np.clip(d, -127, 127).astype(np.int8)
+    parts = [head]
+    for p in range(n):
+        parts.append(kb)
+        parts.append(masks[p].tobytes())
+        parts.append(dd[p][changed[p]].tobytes())
+    return b"".join(parts)
+
+
+# ─────────────── Multiplexed container (MX) ───────────────
+def pack_mux_frame(seq: int, ts_ms: int, entries: List[Tuple[str, bytes]]) -> bytes:
+    """Wraps per-adapter packets of one frame into a single MX v1 packet."""
+    parts = [b"MX", struct.pack("<BHIB", 1, seq & 0xFFFF, ts_ms & 0xFFFFFFFF, min(len(entries), 0xFF))]
+    for name, payload in entries[:0xFF]:
+        nb = name.encode("utf-8")[:0xFF]
+        parts.append(struct.pack("<B", len(nb)) + nb + struct.pack("<I", len(payload)))
+        parts.append(payload)
+    return b"".join(parts)
+
+
+def unpack_mux_frame(data: bytes) -> Tuple[int, int, List[Tuple[str, bytes]]]:
+    """MX v1 → (seq, ts_ms, [(adapter name, PO/PD packet), ...])."""
+    buf = memoryview(data)
+    if bytes(buf[:2]) != b"MX":
+        raise ValueError("not an MX packet")
+    _ver, seq, ts_ms, n = struct.unpack_from("<BHIB", buf, 2)
+    off = 10
+    entries: List[Tuple[str, bytes]] = []
+    for _ in range(n):
+        ln = buf[off]
+        name = bytes(buf[off + 1:off + 1 + ln]).decode("utf-8")
+        off += 1 + ln
+        (plen,) = struct.unpack_from("<I", buf, off)
+        off += 4
+        entries.append((name, bytes(buf[off:off + plen])))
+        off += plen
+    return seq, ts_ms, entries
+
+
+# ─────────────── Ctrl-channel ACK (AK) ───────────────
+def pack_ack(seq: int, mask: int) -> bytes:
+    return b"AK" + struct.pack("<BHI", 2, seq & 0xFFFF, mask & 0xFFFFFFFF)
+
+
+def unpack_ack(data: bytes) -> Tuple[int, int]:
+    """AK v2 → (seq, mask)."""
+    if len(data) < 9 or bytes(data[:2]) != b"AK":
+        raise ValueError("not an AK packet")
+    _ver, seq, mask = struct.unpack_from("<BHI", data, 2)
+    return seq, mask
+
+
+# ─────────────── Decoder ───────────────
+@dataclass(frozen=True)
+class DecodedFrame:
+    kind: str                 # "PO" | "PD"
+    ver: int
+    keyframe: bool
+    seq: Optional[int]
+    image_w: int
+    image_h: int
+    points: np.ndarray        # (N,K,2) int32, absolute pixel coordinates
+    ref_seq: Optional[int] = None  # PD v5+: seq of the frame a delta is relative to
+
+
+def _read_objects_abs(buf: memoryview, off: int, n: int) -> Tuple[List[np.ndarray], int]:
+    objs: List[np.ndarray] = []
+    for _ in range(n):
+        (k,) = struct.unpack_from("<H", buf, off)
+        off += 2
+        xy = np.frombuffer(buf, dtype="<u2", count=2 * k, offset=off).astype(np.int32).reshape(k, 2)
+        off += 4 * k
+        objs.append(xy)
+    return objs, off
+
+
+def _stack(objs: List[np.ndarray]) -> np.ndarray:
+    if not objs:
+        return np.zeros((0, 0, 2), dtype=np.int32)
+    if len({o.shape[0] for o in objs}) != 1:
+        raise ValueError("objects with different point counts cannot form an (N,K,2) array")
+    return np.stack(objs)
+
+
+def packet_ref_seq(data: bytes) -> Optional[int]:
+    """Seq a PD v5+ delta needs as `prev` (look it up in the receiver's history);
+    None for keyframes and other formats (prev = last decoded points)."""
+    if len(data) < 8 or bytes(data[:2]) != b"PD" or data[2] < 5 or data[3]:
+        return None
+    (ref,) = struct.unpack_from("<H", data, 6)
+    return ref
+
+
+def decode_pose_packet(data: bytes, prev: Optional[np.ndarray] = None) -> DecodedFrame:
+    """Decodes a PO or PD packet. Delta packets need `prev` (the last decoded points,
+    or for PD v5+ the points of packet_ref_seq())."""
+    buf = memoryview(data)
+    kind = bytes(buf[:2]).decode("ascii", "replace")
+    if kind == "PO":
+        ver, n, w, h = struct.unpack_from("<BHHH", buf, 2)
+        objs, _ = _read_objects_abs(buf, 9, n)
+        return DecodedFrame("PO", ver, True, None, w, h, _stack(objs))
+    if kind != "PD":
+        raise ValueError(f"unknown packet magic {kind!r}")
+
+    ver, kf = buf[2], bool(buf[3])
+    off = 4
+    seq = ref_seq = None
+    if ver >= 1:
+        (seq,) = struct.unpack_from("<H", buf, off)
+        off += 2
+    if ver >= 5:
+        (ref_seq,) = struct.unpack_from("<H", buf, off)
+        off += 2
+    n, w, h = struct.unpack_from("<HHH", buf, off)
+    off += 6
+    if kf:
+        objs, _ = _read_objects_abs(buf, off, n)
+        return DecodedFrame("PD", ver, True, seq, w, h, _stack(objs), ref_seq)
+
+    if prev is None:
+        raise ValueError("delta packet without a reference frame")
+    ref = as_points_array(prev)
+    if ref.shape[0] != n:
+        raise ValueError(f"delta has {n} objects, reference has {ref.shape[0]}")
+    out = ref.copy()
+    for p in range(n):
+        (k,) = struct.unpack_from("<H", buf, off)
+        off += 2
+        pred = out[p]
+        if ver >= 4:
+            (dx, dy, q), off = zigzag_varint_decode(buf, off, 3)
+            pred = mc_predict(out[p], int(dx), int(dy), int(q)).astype(np.int32)
+        nb = (k + 7) // 8
+        changed = np.unpackbits(
+            np.frombuffer(buf, dtype=np.uint8, count=nb, offset=off), bitorder="little"
+        )[:k].astype(bool)
+        off += nb
+        m = int(changed.sum())
+        if ver >= 3:
+            d, off = zigzag_varint_decode(buf, off, 2 * m)
+            d = d.reshape(m, 2)
+        else:
+            d = np.frombuffer(buf, dtype=np.int8, count=2 * m, offset=off).reshape(m, 2)
+            off += 2 * m
+        out[p] = pred
+        out[p, changed] += d
+    return DecodedFrame("PD", ver, False, seq, w, h, out, ref_seq)
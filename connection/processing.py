@@ -2,12 +2,18 @@
 from __future__ import annotations
 
 import asyncio
+import functools
 import time
 import inspect
 from typing import Optional
 
 import numpy as np
-from gi.repository import Gst, GLib, GstWebRTC  # used by the original method
+from gi.repository import Gst, GLib, GstWebRTC
+
+from . import affinity
+from .dcsend import REPLACED, SENT
+from .events import EVENTS
+from .packing import as_points_array
 
 # Optional: for type checkers only (doesn't import at runtime)
 from typing import TYPE_CHECKING
@@ -15,103 +21,519 @@ if TYPE_CHECKING:
     from .webrtc import GSTWebRTCSession
 
 
+def _same_points(a, b) -> bool:
+    """Equality for list-of-tuples or (N,K,2) ndarray points (None never matches)."""
+    if a is None or b is None:
+        return False
+    if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+        return np.array_equal(np.asarray(a), np.asarray(b))
+    return a == b
+
+
+@functools.lru_cache(maxsize=None)
+def _accepts_indices(fn) -> bool:
+    try:
+        return "indices" in inspect.signature(fn).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+def _points_for(ad, res, shape, indices):
+    """points_from_result restricted to `indices` (None = all). Adapters that take
+    `indices=` convert only those landmarks; others are sliced afterwards."""
+    if indices is None:
+        return ad.points_from_result(res, shape)
+    if _accepts_indices(ad.points_from_result):
+        return ad.points_from_result(res, shape, indices=indices)
+    w0, h0, pts = ad.points_from_result(res, shape)
+    if isinstance(pts, np.ndarray):
+        return w0, h0, pts[:, indices] if pts.size else pts
+    return w0, h0, [[obj[i] for i in indices if i < len(obj)] for obj in pts]
+
+
+def _points_in_frame(ad, res, frame: np.ndarray, full_shape, box, indices):
+    """_points_for in full-frame sender pixels when inference ran on the crop `box`
+    (x0, y0, x1, y1 in frame px): the crop is sized in sender px, then shifted."""
+    if box is None:
+        return _points_for(ad, res, full_shape, indices)
+    sx, sy = full_shape[1] / frame.shape[1], full_shape[0] / frame.shape[0]
+    x0, y0, x1, y1 = box
+    crop_shape = (round((y1 - y0) * sy), round((x1 - x0) * sx), full_shape[2])
+    _w, _h, pts = _points_for(ad, res, crop_shape, indices)
+    pts = as_points_array(pts)
+    if pts.size:
+        pts = (pts + (round(x0 * sx), round(y0 * sy))).astype(np.int32)
+    return full_shape[1], full_shape[0], pts
+
+
+def _send_bytes(dc, packet: bytes) -> None:
+    try:
+        dc.emit("send-data", GLib.Bytes(packet))
+    except Exception:
+        gstbuf = Gst.Buffer.new_allocate(None, len(packet), None)
+        gstbuf.fill(0, packet)
+        dc.emit("send-data", gstbuf)
+
+
+class _SendPacer:
+    """Derives the send interval from the inference latency and, while a result DC
+    is backed up, from its drain rate (bytes/s leaving the buffers, measured by the
+    DC send gates). With ctrl ACKs it also backs off on loss and on queueing delay
+    (srtt − min RTT)."""
+
+    def __init__(self, min_ms: float, max_ms: float):
+        self.min_ms = float(min_ms)
+        self.max_ms = float(max(max_ms, min_ms))
+        self.interval_ms = self.min_ms
+        self.drain_bps = 0.0
+        self.frame_bytes_avg = 0.0
+        self._sent_since = 0
+        self.srtt_ms = 0.0
+        self.min_rtt_ms = 0.0
+        self.loss = 0.0
+
+    def on_feedback(self, srtt_ms: float, min_rtt_ms: float, loss: float) -> None:
+        self.srtt_ms, self.min_rtt_ms, self.loss = srtt_ms, min_rtt_ms, loss
+
+    def on_sent(self, nbytes: int) -> None:
+        self._sent_since += nbytes
+
+    def observe(self, backlogged: bool, drain_bps: float, infer_ms: float) -> float:
+        """Feeds the gates' state (any DC paused, summed drain rate); returns the new interval (ms)."""
+        if drain_bps > 0:
+            self.drain_bps = drain_bps
+        if self._sent_since:
+            # observe() runs once per inference pass, so this is one frame's packets
+            n = self._sent_since
+            self.frame_bytes_avg = n if not self.frame_bytes_avg else self.frame_bytes_avg * 0.9 + n * 0.1
+        self._sent_since = 0
+
+        target = max(self.min_ms, infer_ms)
+        if backlogged and self.drain_bps > 0:
+            # one frame's worth of bytes must drain before the next one is worth sending
+            target = max(target, self.frame_bytes_avg * 1000.0 / self.drain_bps)
+        if self.srtt_ms:
+            # results queue up somewhere on the path once the RTT grows past one interval
+            target = max(target, self.srtt_ms - self.min_rtt_ms)
+        if self.loss > 0.02:
+            target *= 1.0 + 4.0 * self.loss
+        target = min(target, self.max_ms)
+        # fast to back off, slow to speed up again
+        self.interval_ms = target if target > self.interval_ms else self.interval_ms * 0.9 + target * 0.1
+        return self.interval_ms
+
+
 async def process_frames(session: "GSTWebRTCSession"):
     """
-    Externalized version of GSTWebRTCSession._process_frames(session).
-    We import webrtc lazily to avoid circular imports, and bind the
-    globals/method alias so the pasted body can remain unchanged.
+    Per-session frame loop (GSTWebRTCSession._process_frames delegates here):
+    takes the newest decoded frame, runs the task adapters (through the
+    scheduler when enabled), and packs/sends the results on the data channels.
+    webrtc is imported lazily to avoid a circular import.
     """
     # Lazy import to avoid circular import at module load time
     from . import webrtc as W
+    from .scheduler import get_scheduler
 
-    # Keep the original code using `self.` without edits:
-    self = session  # alias so you can paste the original body as-is
+    self = session  # the loop reads and updates session state throughout
 
-    # Shadow the module-level constants the original method referenced:
+    # webrtc's module-level settings, read once per session:
     POSE_USE_VIDEO = W.POSE_USE_VIDEO
     ABSOLUTE_INTERVAL_MS = W.ABSOLUTE_INTERVAL_MS
     IDLE_TO_FORCE_KF_MS = W.IDLE_TO_FORCE_KF_MS
     RESULTS_REQUIRE_ACK = W.RESULTS_REQUIRE_ACK
-    ACK_WARN_MS = W.ACK_WARN_MS
+    PD_VERSION = W.PD_VERSION
+    GAP_KF_MS = W.GAP_KF_MS
+    STALE_KF_MS = W.STALE_KF_MS
+    NOCHANGE_KF_MS = W.NOCHANGE_KF_MS
 
-    # Packet helpers used in the method:
+    # Packet helpers:
     pack_pose_frame = W.pack_pose_frame
     pack_pose_frame_delta = getattr(W, "pack_pose_frame_delta", None)
+    pack_pose_frame_delta_np = W.pack_pose_frame_delta_np
+    pack_mux_frame = W.pack_mux_frame
+
+    pd_versions = {ad.name: (ad.pd_version or PD_VERSION) for ad in self.adapters}
+    if not self.mux_results:
+        # v5 references a frame seq, which only the MX container shares across tasks
+        pd_versions = {k: min(v, 4) for k, v in pd_versions.items()}
+    # PD v5 + ctrl ACKs: deltas against the newest acknowledged frame, so a lost packet
+    # costs only itself and the periodic keyframe timers can go
+    ref_deltas = RESULTS_REQUIRE_ACK and all(v >= 5 for v in pd_versions.values())
+    sent_hist = {name: {} for name, v in pd_versions.items() if v >= 5}  # task → {seq: points sent}
+    REF_HISTORY = 2 * W.ACK_WINDOW
+
+    def reference(name):
+        """(seq, points) a v5 delta is coded against; (None, None) → keyframe."""
+        hist = sent_hist[name]
+        if not hist:
+            return None, None
+        seq = self.ack_window.last_acked if RESULTS_REQUIRE_ACK else next(reversed(hist))
+        pts = hist.get(seq) if seq is not None else None
+        return (seq, pts) if pts is not None else (None, None)
+
+    def remember(name, seq, pts):
+        hist = sent_hist.get(name)
+        if hist is None:
+            return
+        hist[seq] = pts
+        while len(hist) > REF_HISTORY:
+            del hist[next(iter(hist))]
+
+    def pack_delta(name, prev, pts, w0, h0, *, keyframe, seq):
+        ver = pd_versions[name]
+        if ver >= 5:
+            ref_seq, prev = reference(name)
+            return pack_pose_frame_delta_np(prev, pts, w0, h0, keyframe=keyframe, seq=seq, ver=ver, ref_seq=ref_seq)
+        # ndarray points → vectorized encoder (byte-identical output)
+        if isinstance(pts, np.ndarray):
+            return pack_pose_frame_delta_np(prev, pts, w0, h0, keyframe=keyframe, seq=seq, ver=ver)
+        return pack_pose_frame_delta(prev, pts, w0, h0, keyframe=keyframe, seq=seq, ver=ver)
+
+    def note_held(status: str, label: str) -> None:
+        self.stats["dc_held"] = int(self.stats["dc_held"]) + 1
+        if status == REPLACED:
+            self.stats["drops_due_buffer"] = int(self.stats["drops_due_buffer"]) + 1
+        if EVENTS.on:
+            EVENTS.emit("skip_send", self.sid, "%s %s until buffered-amount-low", label, status)
+
+    def flushed(dc, seq: int, key: bool, held_ms: float) -> None:
+        """Frame-level bookkeeping for a packet a gate sent on buffered-amount-low."""
+        now_ms = int(time.monotonic() * 1000)
+        n = int(self.stats["dc_flushed"]) + 1
+        self.stats["dc_flushed"] = n
+        prev_avg = float(self.stats["dc_residency_ms_avg"])
+        self.stats["dc_residency_ms_avg"] = held_ms if n == 1 else prev_avg * 0.9 + held_ms * 0.1
+        if tracer is not None:
+            tracer.add("dc_residency", held_ms)
+        if not self.stats["ttfr_ms"]:
+            self.note_first_result(now_ms)
+        self.last_sent_ms = now_ms
+        self.last_dc_activity_ms = now_ms
+        if key:
+            self.last_key_ms = now_ms
+            self.last_abs_ms = now_ms
+        if RESULTS_REQUIRE_ACK and dc is self.results_dc:
+            self.ack_window.on_sent(seq, now_ms)
+
+    def send_mux(results, force_kf: bool, ts_ms: int) -> bool:
+        # Single channel, one send-data per frame; its gate sends now or holds the container
+        dc = self.results_dc
+        gate = self.dc_gates.get(dc) if dc else None
+        if gate is None or not gate.open:
+            return False
+        force_kf = force_kf or gate.holding_key  # a held keyframe is only replaced by another
+
+        entries = []
+        n_kf = 0
+        for name, (w0, h0), pts, packet, kf_local, _seq in results:
+            if force_kf and pack_pose_frame_delta is not None:
+                packet = pack_delta(name, self._prev_pts.get(name), pts, w0, h0, keyframe=True, seq=self.seq)
+                kf_local = True
+            entries.append((name, packet))
+            n_kf += int(bool(kf_local))
+        seq = self.seq
+        container = pack_mux_frame(seq, ts_ms, entries)
+
+        def commit(held_ms: float) -> None:
+            pacer.on_sent(len(container))
+            for name, _wh, pts, _packet, _kf, _seq in results:
+                self._prev_pts[name] = pts
+                remember(name, seq, pts)
+            self.stats["frames_sent"] = int(self.stats["frames_sent"]) + 1
+            self.stats["bytes_sent"] = int(self.stats["bytes_sent"]) + len(container)
+            self.stats["mux_entries"] = int(self.stats["mux_entries"]) + len(entries)
+            self.stats["kf_sent"] = int(self.stats["kf_sent"]) + n_kf
+            self.stats["delta_sent"] = int(self.stats["delta_sent"]) + len(entries) - n_kf
+            if EVENTS.on:
+                EVENTS.emit("packet", self.sid, "MX seq=%04d entries=%d kf=%d bytes=%d held=%.1fms",
+                            seq, len(entries), n_kf, len(container), held_ms)
+            if held_ms:
+                flushed(dc, seq, force_kf, held_ms)
+
+        try:
+            status = gate.offer(container, functools.partial(timed_send, dc), commit, key=force_kf)
+        except Exception as e:
+            self._warn(f"Send error on MX DC: {e}")
+            return False
+        if status != SENT:
+            note_held(status, "MX")
+            return False
+        return True
+
+    def commit_task(dc, name, pts, packet, kf_local, seq, forced, held_ms: float) -> None:
+        pacer.on_sent(len(packet))
+        self._prev_pts[name] = pts
+
+        self.stats["frames_sent"] = int(self.stats["frames_sent"]) + 1
+        self.stats["bytes_sent"] = int(self.stats["bytes_sent"]) + len(packet)
+        if kf_local:
+            self.stats["kf_sent"] = int(self.stats["kf_sent"]) + 1
+        else:
+            self.stats["delta_sent"] = int(self.stats["delta_sent"]) + 1
+
+        if EVENTS.on:
+            EVENTS.emit(
+                "packet", self.sid, "[%s] %s %s seq=%04d bytes=%d held=%.1fms objs=%d infer_ms(last/avg)=%.2f/%.2f",
+                name, "PD" if packet[:2] == b"PD" else "PO", "KF" if kf_local or forced else "Δ",
+                seq, len(packet), held_ms, len(pts),
+                self.stats["infer_ms_last"], self.stats["infer_ms_avg"],
+            )
+        if held_ms:
+            flushed(dc, seq, forced, held_ms)
 
     # ─────────────────────────────────────────────────────────────
-    # ⬇️ PASTE the original body of `_process_frames` here, UNCHANGED ⬇️
-    # (keep everything from: `SEND_THRESHOLD = 32_768` down to the end)
-    SEND_THRESHOLD = 32_768
+    # Main loop
     RECYCLE_AFTER_MS = 300
-    MIN_SEND_MS = 33  # ~30 fps
+    MIN_SEND_MS = W.MIN_SEND_MS  # ~30 fps
+    ADAPTIVE_SEND = W.ADAPTIVE_SEND
 
     congested_since_ms: Optional[int] = None
+    pacer = _SendPacer(MIN_SEND_MS, W.MAX_SEND_MS)
+
+    def result_channels():
+        if self.mux_results:
+            return [self.results_dc] if self.results_dc else []
+        return [dc for dc in (self.result_dcs.get(ad.name) for ad in self.adapters) if dc]
+
+    def open_gates():
+        gates = [g for g in (self.dc_gates.get(dc) for dc in result_channels()) if g is not None and g.open]
+        for g in gates:
+            try:
+                g.poll()  # a paused gate whose low signal didn't come reads buffered-amount now and then
+            except Exception as e:
+                self._warn(f"DC gate poll failed: {e}")
+        return gates
+
+    # Optional process-wide scheduler: fair grants across sessions + shared workers
+    sched = get_scheduler()
+    if sched is not None:
+        sched.register(self.sid, weight=self.sched_weight, max_fps=self.max_fps)
+
+    def run_blocking(fn, *args):
+        return sched.run_sync(fn, *args) if sched is not None else affinity.run_infer(fn, *args)
+
+    # Stage tracing (TRACE_STAGES=1): durations land in self.tracer's rolling windows
+    tracer = self.tracer
+    send_ns = [0]  # send-data time of the current frame
+
+    def timed_send(dc, packet: bytes) -> None:
+        if tracer is None:
+            _send_bytes(dc, packet)
+            return
+        t = time.perf_counter_ns()
+        try:
+            _send_bytes(dc, packet)
+        finally:
+            send_ns[0] += time.perf_counter_ns() - t
 
     while True:
         try:
-            (payload, w, h), pts_ns = await self.frame_q.get()
-            frame = np.frombuffer(payload, dtype=np.uint8).reshape((h, w, 3))
+            got = self.frame_ring.take_or_park()  # releases the previous frame
+            while got is None:
+                await self.frame_ready.wait()
+                self.frame_ready.clear()
+                got = self.frame_ring.take_or_park()
+            frame, pts_ns = got
+            t_deq_ns = time.monotonic_ns()
         except asyncio.CancelledError:
             break
         except Exception as e:
-            self._warn(f"frame_q.get error: {e}")
+            self._warn(f"frame wait error: {e}")
             continue
 
         self._proc_n += 1
-        if self._proc_n <= 5 or (self._proc_n % 30) == 0:
-            dc_state = (self.results_dc.get_property("ready-state") if self.results_dc else None)
-            self._dbg(f"PROCESS sample #{self._proc_n}: dequeued; dc_state={dc_state} q={self.frame_q.qsize()}")
+        if EVENTS.on:
+            EVENTS.emit("process", self.sid, "sample #%d dequeued; pending=%d", self._proc_n, self.frame_ring.pending)
 
         ts_ms = int(time.monotonic() * 1000)
         if ts_ms <= self.last_ts_input:
             ts_ms = self.last_ts_input + 1
         self.last_ts_input = ts_ms
 
-        # ACK overdue checks (primary channel only)
-        if RESULTS_REQUIRE_ACK and self._awaiting_ack:
-            to_warn = [s for s, t0 in list(self._awaiting_ack.items()) if (ts_ms - t0) >= ACK_WARN_MS and s not in self._ack_warned]
-            for s in to_warn:
-                self._ack_warned.add(s)
-                self._warn(f"ACK overdue for seq={s} > {ACK_WARN_MS}ms")
+        # ACK timeouts (primary channel only): the window checks its oldest entry only
+        if RESULTS_REQUIRE_ACK:
+            lost = self.ack_window.expire(ts_ms)
+            if lost:
+                self.stats["ack_lost"] = int(self.stats["ack_lost"]) + lost
+                if EVENTS.on:
+                    EVENTS.emit("ack", self.sid, "%d packet(s) unacked after %.0fms → lost",
+                                lost, self.ack_window.loss_after_ms())
 
         # Rate-gate globally for all adapters
-        if (ts_ms - self.last_sent_ms) < MIN_SEND_MS:
+        since_sent = ts_ms - self.last_sent_ms
+        if since_sent < MIN_SEND_MS:
+            continue
+
+        # Too many results unacknowledged: don't spend inference on a packet that can't go out
+        if RESULTS_REQUIRE_ACK and self.ack_window.full():
+            self.stats["infer_skipped_window"] = int(self.stats["infer_skipped_window"]) + 1
             continue
 
+        if ADAPTIVE_SEND:
+            if RESULTS_REQUIRE_ACK:
+                win = self.ack_window
+                pacer.on_feedback(win.srtt, win.min_rtt, win.loss)
+            gates = open_gates()
+            interval = pacer.observe(
+                any(g.paused for g in gates), sum(g.drain_bps for g in gates), float(self.stats["infer_ms_avg"]),
+            )
+            self.send_interval_ms = interval
+            self.stats["send_interval_ms"] = round(interval, 1)
+            self.stats["drain_bytes_per_s"] = round(pacer.drain_bps, 1)
+
+            # Every open result DC is paused: the packet could only replace a held one
+            if gates and all(g.paused for g in gates):
+                if congested_since_ms is None:
+                    congested_since_ms = ts_ms
+                    if EVENTS.on:
+                        EVENTS.emit("congestion", self.sid, "levels=%s; pausing inference", tuple(g.level for g in gates))
+                self.stats["infer_skipped_congested"] = int(self.stats["infer_skipped_congested"]) + 1
+                continue
+            if congested_since_ms is not None:
+                if EVENTS.on:
+                    EVENTS.emit("congestion", self.sid, "cleared after %dms", ts_ms - congested_since_ms)
+                congested_since_ms = None
+
+            if since_sent < interval:
+                self.stats["infer_skipped_paced"] = int(self.stats["infer_skipped_paced"]) + 1
+                continue
+
+        # Reduced-cadence tasks: which adapters really run detect on this frame
+        due = {ad.name: (ad.name not in self.trackers or self.trackers[ad.name].due(ts_ms)) for ad in self.adapters}
+
+        granted = False
+        t_grant = 0.0
+        if sched is not None and any(due.values()):
+            t_wait = time.perf_counter()
+            try:
+                await sched.acquire(self.sid)
+            except asyncio.CancelledError:
+                break
+            granted = True
+            t_grant = time.perf_counter()
+            if tracer is not None:
+                tracer.add("sched_wait", (t_grant - t_wait) * 1000.0)
+            # frames kept arriving while we waited: run on the latest one
+            newer = self.frame_ring.take_if_pending()  # else keep holding the current frame
+            if newer is not None:
+                frame, pts_ns = newer
+                t_deq_ns = time.monotonic_ns()
+            ts_ms = max(int(time.monotonic() * 1000), self.last_ts_input + 1)
+            self.last_ts_input = ts_ms
+
+        if tracer is not None:
+            t_rtp_ns, t_sample_ns = self.frame_ring.held_times()
+            if t_rtp_ns and t_sample_ns:
+                tracer.add_ns("rtp_to_appsink", t_rtp_ns, t_sample_ns)
+            if t_sample_ns:
+                tracer.add_ns("appsink_to_loop", t_sample_ns, t_deq_ns)
+            send_ns[0] = 0
+
         try:
+            if self.mux_results:
+                # one seq per frame, shared by every adapter packet in the container
+                self.seq = (self.seq + 1) & 0xFFFF
+
+            upstream = {}  # task → full-landmark points this frame, for dependent tasks
+            nodes = {}
+
             async def run_one(ad):
-                mp_img = ad.make_mp_image(frame)
-                if POSE_USE_VIDEO:
-                    if inspect.iscoroutinefunction(ad.detect_video):
-                        res = await ad.detect_video(mp_img, ts_ms)
-                    else:
-                        res = await asyncio.to_thread(ad.detect_video, mp_img, ts_ms)
+                if ad.depends_on:
+                    await asyncio.gather(*(nodes[d] for d in ad.depends_on if d in nodes))
+                ups = {d: upstream[d] for d in ad.depends_on if d in upstream}
+                tracker = self.trackers.get(ad.name)
+                roi = self.roi_trackers.get(ad.name)
+                indices = self.landmark_subsets.get(ad.name)
+                full = None
+                # no upstream points (dependency inactive or served a subset) → just run
+                skip = ad.run_if is not None and bool(ups) and not ad.run_if(ups)
+                if ad.name in self.dag_stats:
+                    self.dag_stats[ad.name]["skipped" if skip else "ran"] += 1
+                if skip:
+                    # not needed this frame (e.g. nobody in the pose result): empty result
+                    full_shape = self.points_shape(frame)
+                    w0, h0, pts = full_shape[1], full_shape[0], np.zeros((0, 0, 2), dtype=np.int32)
+                    full = pts
+                    if tracker is not None:
+                        tracker.update(w0, h0, pts, ts_ms)
+                    if roi is not None:
+                        roi.update(pts, frame.shape, (1.0, 1.0), cropped=False)
+                elif not due[ad.name]:
+                    # between inferences: filtered points extrapolated to this frame
+                    w0, h0, pts = tracker.predict(ts_ms)
+                    full = pts if indices is None else None
                 else:
-                    if inspect.iscoroutinefunction(ad.detect_image):
-                        res = await ad.detect_image(mp_img)
+                    full_shape = self.points_shape(frame)
+                    scale = (full_shape[1] / frame.shape[1], full_shape[0] / frame.shape[0])
+                    # roi None: cropping switched off for this task (offer "roi": {task: false})
+                    region = ad.roi_from(ups) if roi is not None and ad.roi_from is not None and ups else None
+                    forced_box = roi.box_around(region, frame.shape, scale) if region is not None else None
+                    t_img = time.perf_counter()
+                    img, box = roi.crop(frame, forced_box) if roi is not None else (frame, None)
+                    mp_img = ad.make_mp_image(img)
+                    t_det = time.perf_counter()
+                    if POSE_USE_VIDEO:
+                        if inspect.iscoroutinefunction(ad.detect_video):
+                            res = await ad.detect_video(mp_img, ts_ms)
+                        else:
+                            res = await run_blocking(ad.detect_video, mp_img, ts_ms)
                     else:
-                        res = await asyncio.to_thread(ad.detect_image, mp_img)
-                w0, h0, pts = ad.points_from_result(res, frame.shape)
+                        if inspect.iscoroutinefunction(ad.detect_image):
+                            res = await ad.detect_image(mp_img)
+                        else:
+                            res = await run_blocking(ad.detect_image, mp_img)
+                    if tracer is not None:
+                        tracer.add(f"mp_image:{ad.name}", (t_det - t_img) * 1000.0)
+                        tracer.add(f"detect:{ad.name}", (time.perf_counter() - t_det) * 1000.0)
+                    # sender resolution when the decode bin scaled the frame down
+                    if roi is None and ad.name not in self.upstream_tasks:
+                        w0, h0, pts = _points_in_frame(ad, res, frame, full_shape, box, indices)
+                    else:
+                        # the next crop and dependent tasks follow every landmark, not just the sent subset
+                        w0, h0, full = _points_in_frame(ad, res, frame, full_shape, box, None)
+                        full = as_points_array(full)
+                        if roi is not None:
+                            roi.update(full, frame.shape, scale, cropped=box is not None)
+                        pts = full[:, indices] if indices is not None and full.size else full
+                    if tracker is not None:
+                        pts = tracker.update(w0, h0, pts, ts_ms)
+                        if indices is None:
+                            full = pts
+                if full is not None and ad.name in self.upstream_tasks:
+                    upstream[ad.name] = full
                 prev = self._prev_pts.get(ad.name)
                 kf = prev is None or (prev is not None and len(prev) != len(pts))
-                self.seq = (self.seq + 1) & 0xFFFF
+                if not self.mux_results:
+                    self.seq = (self.seq + 1) & 0xFFFF
+                seq = self.seq  # this packet's seq (per-channel mode bumps it per adapter)
+                t_pack = time.perf_counter()
                 packet = (
-                    pack_pose_frame_delta(prev, pts, w0, h0, keyframe=kf, seq=self.seq, ver=2)
+                    pack_delta(ad.name, prev, pts, w0, h0, keyframe=kf, seq=seq)
                     if pack_pose_frame_delta is not None
                     else pack_pose_frame(w0, h0, pts)
                 )
-                return ad.name, (w0, h0), pts, packet, kf
+                if tracer is not None:
+                    tracer.add(f"pack:{ad.name}", (time.perf_counter() - t_pack) * 1000.0)
+                if packet[:2] == b"PD":
+                    kf = bool(packet[3])  # v3/v4 may pick a keyframe when it is smaller
+                return ad.name, (w0, h0), pts, packet, kf, seq
 
             t0 = time.perf_counter()
-            results = await asyncio.gather(*(run_one(ad) for ad in self.adapters))
+            # dependencies first (adapter_order); independent tasks still run concurrently
+            for ad in self.adapter_order:
+                nodes[ad.name] = asyncio.ensure_future(run_one(ad))
+            results = await asyncio.gather(*(nodes[ad.name] for ad in self.adapters))
             infer_ms = (time.perf_counter() - t0) * 1000.0
-            self.stats["infer_ms_last"] = float(infer_ms)
-            prev_avg = float(self.stats["infer_ms_avg"])
-            self.stats["infer_ms_avg"] = prev_avg * 0.9 + infer_ms * 0.1
+            if any(due.values()):
+                self.stats["infer_ms_last"] = float(infer_ms)
+                prev_avg = float(self.stats["infer_ms_avg"])
+                self.stats["infer_ms_avg"] = prev_avg * 0.9 + infer_ms * 0.1
+            else:
+                self.stats["infer_skipped_temporal"] = int(self.stats["infer_skipped_temporal"]) + 1
 
             primary_name = self.adapters[0].name
-            primary_pts = next((pts for (name, _wh, pts, _pkt, _kf) in results if name == primary_name), None)
-            changed = (primary_pts != self._prev_pts.get(primary_name))
+            primary_pts = next((pts for (name, _wh, pts, _pkt, _kf, _seq) in results if name == primary_name), None)
+            changed = not _same_points(primary_pts, self._prev_pts.get(primary_name))
             if changed or self.last_change_ms == 0:
                 self.last_change_ms = ts_ms
 
@@ -123,71 +545,72 @@ async def process_frames(session: "GSTWebRTCSession"):
 
             external_kf = self.need_keyframe
             self.need_keyframe = False
-            gap_key = (ts_ms - self.last_sent_ms) > 250
-            stale_key = (ts_ms - self.last_key_ms) >= 300
-            nochange_kf = (ts_ms - self.last_change_ms) >= 400
+            # with acked references (PD v5) a loss never outlives one packet: no loss-recovery timers
+            gap_key = not ref_deltas and (ts_ms - self.last_sent_ms) > GAP_KF_MS
+            stale_key = not ref_deltas and (ts_ms - self.last_key_ms) >= STALE_KF_MS
+            nochange_kf = not ref_deltas and (ts_ms - self.last_change_ms) >= NOCHANGE_KF_MS
             first_move_after_idle = changed and (self.idle_start_ms is not None)
             heartbeat_abs = ABSOLUTE_INTERVAL_MS > 0 and (ts_ms - self.last_abs_ms) >= ABSOLUTE_INTERVAL_MS
 
             force_kf = (external_kf or gap_key or stale_key or nochange_kf or first_move_after_idle or heartbeat_abs)
 
             sent_any = False
-            for name, (w0, h0), pts, packet, kf_local in results:
-                dc = self.result_dcs.get(name)
-                if not dc or dc.get_property("ready-state") != GstWebRTC.WebRTCDataChannelState.OPEN:
-                    continue
-
-                buf_amt = dc.get_property("buffered-amount") or 0
-                if buf_amt >= SEND_THRESHOLD:
-                    self.stats["drops_due_buffer"] = int(self.stats["drops_due_buffer"]) + 1
-                    self._dbg(f"Skip '{name}' send: buffered-amount={buf_amt}")
-                    continue
-
-                if force_kf and pack_pose_frame_delta is not None:
-                    packet = pack_pose_frame_delta(self._prev_pts.get(name), pts, w0, h0, keyframe=True, seq=self.seq, ver=2)
-                    kf_local = True
-
-                try:
+            acked_seq = None  # seq of the packet that went out on results_dc (ACKs cover only that DC)
+            if self.mux_results:
+                sent_any = send_mux(results, force_kf, ts_ms)
+                acked_seq = self.seq if sent_any else None
+            else:
+                for name, (w0, h0), pts, packet, kf_local, seq in results:
+                    dc = self.result_dcs.get(name)
+                    gate = self.dc_gates.get(dc) if dc else None
+                    if gate is None or not gate.open:
+                        continue
+
+                    forced = force_kf or gate.holding_key
+                    if forced and pack_pose_frame_delta is not None:
+                        packet = pack_delta(name, self._prev_pts.get(name), pts, w0, h0, keyframe=True, seq=seq)
+                        kf_local = True
+
                     try:
-                        dc.emit("send-data", GLib.Bytes(packet))
-                    except Exception:
-                        gstbuf = Gst.Buffer.new_allocate(None, len(packet), None)
-                        gstbuf.fill(0, packet)
-                        dc.emit("send-data", gstbuf)
-
-                    sent_any = True
-                    self._prev_pts[name] = pts
-
-                    self.stats["frames_sent"] = int(self.stats["frames_sent"]) + 1
-                    self.stats["bytes_sent"] = int(self.stats["bytes_sent"]) + len(packet)
-                    if kf_local:
-                        self.stats["kf_sent"] = int(self.stats["kf_sent"]) + 1
+                        status = gate.offer(
+                            packet, functools.partial(timed_send, dc),
+                            functools.partial(commit_task, dc, name, pts, packet, kf_local, seq, forced),
+                            key=forced,
+                        )
+                    except Exception as e:
+                        self._warn(f"Send error on DC '{name}': {e}")
+                        continue
+                    if status == SENT:
+                        sent_any = True
+                        if dc is self.results_dc:
+                            acked_seq = seq
                     else:
-                        self.stats["delta_sent"] = int(self.stats["delta_sent"]) + 1
-
-                    self._info(
-                        f"[{name}] PACKET {'PD' if packet[:2]==b'PD' else 'PO'} "
-                        f"{'KF' if kf_local or force_kf else 'Δ'} seq={self.seq:04d} "
-                        f"bytes={len(packet)} bufAmt={(dc.get_property('buffered-amount') or 0)} "
-                        f"pts-per-obj={[len(p) for p in pts]} "
-                        f"infer_ms(last/avg)={self.stats['infer_ms_last']:.2f}/{self.stats['infer_ms_avg']:.2f}"
-                    )
-                except Exception as e:
-                    self._warn(f"Send error on DC '{name}': {e}")
-                    continue
+                        note_held(status, f"'{name}'")
 
             if sent_any:
+                if not self.stats["ttfr_ms"]:
+                    self.note_first_result(ts_ms)
                 self.last_sent_ms = ts_ms
+                self.last_dc_activity_ms = ts_ms
+                if tracer is not None:
+                    tracer.add("send", send_ns[0] / 1e6)
+                    t_origin = t_rtp_ns or t_sample_ns
+                    if t_origin:
+                        tracer.add_ns("total", t_origin, time.monotonic_ns())
                 if force_kf:
                     self.last_key_ms = ts_ms
                     self.last_abs_ms = ts_ms
 
-                if RESULTS_REQUIRE_ACK and self.results_dc:
-                    self._awaiting_ack[self.seq] = ts_ms
-                    self._dbg(f"Awaiting ACK for seq={self.seq}")
-            else:
-                self._dbg("Skip send: all DCs closed or buffered-amount high")
+                if RESULTS_REQUIRE_ACK and acked_seq is not None:
+                    self.ack_window.on_sent(acked_seq, ts_ms)
+                    if EVENTS.on:
+                        EVENTS.emit("ack", self.sid, "awaiting seq=%d", acked_seq)
+            elif EVENTS.on:
+                EVENTS.emit("skip_send", self.sid, "all DCs closed or held for buffered-amount-low")
 
         except Exception as e:
             self._warn(f"Inference/send error: {e}")
             continue
+        finally:
+            if granted:
+                sched.release(self.sid, (time.perf_counter() - t_grant) * 1000.0)
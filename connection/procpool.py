@@ -0,0 +1,345 @@
+# connection/procpool.py — inference in worker processes, frames through shared memory
+#
+# All sessions' make_mp_image / detect / points_from_result run in the Sanic
+# process, so their Python parts (mp.Image, landmark → pixel conversion) share
+# one GIL. With INFER_PROCS=N the pool spawns N workers that each build their own
+# landmarkers (`init` = "module:function", called once per worker with
+# `init_args`, returns {task: fn(rgb) → (N,K,2) float32 normalized x,y}).
+#
+# Per job: the parent copies the frame into the worker's shared-memory segment
+# (one per worker, regrown when a bigger frame arrives), sends a small header over
+# a pipe, and the worker answers with the compact landmark array. Replies are
+# read with loop.add_reader on the pipe — no thread per job.
+#
+# pool_adapter() wraps a TaskAdapter so that make_mp_image passes the RGB frame
+# through, detect_* becomes an awaitable pool call and points_from_result reads
+# the compact array; the session code sees an ordinary adapter. Workers are fresh
+# interpreters (`python -m connection.procpool`, socketpair to the parent): no fork
+# of a process running GLib/GStreamer threads, and unlike multiprocessing's spawn
+# they don't re-import the server's __main__.
+
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import importlib
+import itertools
+import os
+import pickle
+import socket
+import subprocess
+import sys
+import time
+from collections import deque
+from multiprocessing import shared_memory
+from multiprocessing.connection import Connection
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+INFER_PROCS = int(os.getenv("INFER_PROCS", "0"))  # 0 = inference in the server process
+INFER_PROC_SHM_BYTES = int(os.getenv("INFER_PROC_SHM_BYTES", str(1280 * 720 * 3)))  # initial segment size
+RESPAWN_TRIES = 3  # per death, with exponential backoff; then the worker stays down
+
+
+# ─────────────── worker side ───────────────
+def _attach(name: str) -> shared_memory.SharedMemory:
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        # the parent owns the segment; keep the worker's tracker from unlinking it
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+    return shm
+
+
+def _worker_main(conn: Connection) -> None:
+    init, init_args = conn.recv()
+    mod_name, fn_name = init.split(":", 1)
+    try:
+        handlers = getattr(importlib.import_module(mod_name), fn_name)(**init_args)
+    except Exception as e:
+        conn.send(("init_error", repr(e)))
+        return
+    conn.send(("ready", sorted(handlers)))
+    shm: Optional[shared_memory.SharedMemory] = None
+    while True:
+        try:
+            msg = conn.recv()
+        except (EOFError, OSError):
+            break
+        if msg is None:
+            break
+        job, task, shm_name, h, w = msg
+        try:
+            if shm is None or shm.name != shm_name:
+                if shm is not None:
+                    shm.close()
+                shm = _attach(shm_name)
+            frame = np.ndarray((h, w, 3), dtype=np.uint8, buffer=shm.buf)
+            out = np.ascontiguousarray(handlers[task](frame), dtype=np.float32)
+            del frame  # no view may outlive the segment
+            conn.send((job, out, None))
+        except Exception as e:
+            conn.send((job, None, repr(e)))
+    if shm is not None:
+        shm.close()
+
+
+# ─────────────── parent side ───────────────
+class _Worker:
+    def __init__(self, idx: int):
+        self.idx = idx
+        self.proc = None
+        self.conn = None
+        self.shm: Optional[shared_memory.SharedMemory] = None
+        self.job: Optional[Tuple[int, asyncio.Future]] = None
+        self.jobs = 0
+        self.gen = 0  # bumped per respawn; idle-queue entries of an older gen are stale
+        self.respawning = False
+
+
+class ProcessInferencePool:
+    def __init__(self, init: str, init_args: Dict[str, Any] | None = None, *,
+                 procs: int = INFER_PROCS, shm_bytes: int = INFER_PROC_SHM_BYTES,
+                 warn: Callable[[str], None] | None = None):
+        self.init = init
+        self.init_args = dict(init_args or {})
+        pickle.dumps(self.init_args)  # fail here, not in every worker
+        self.procs = max(1, procs)
+        self.shm_bytes = max(1, shm_bytes)
+        self._warn = warn
+        self._workers: List[_Worker] = []
+        self._idle: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._ids = itertools.count(1)
+        self._rtt_ms: Deque[float] = deque(maxlen=512)
+        self.tasks: Tuple[str, ...] = ()
+        self.stats: Dict[str, int] = dict(jobs=0, errors=0, respawns=0, shm_regrows=0)
+
+    @property
+    def started(self) -> bool:
+        return self._loop is not None
+
+    def _usable(self) -> bool:
+        """Some worker is running or on its way back."""
+        return any(w.proc is not None or w.respawning for w in self._workers)
+
+    # ── lifecycle ──
+    def _spawn(self, w: _Worker) -> None:
+        ps, cs = socket.socketpair()
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(p for p in (root, os.environ.get("PYTHONPATH")) if p))
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "connection.procpool", str(cs.fileno())],
+            pass_fds=(cs.fileno(),), env=env,
+        )
+        cs.close()
+        parent = Connection(ps.detach())
+        try:
+            parent.send((self.init, self.init_args))
+            kind, info = parent.recv()  # blocks until the worker built its landmarkers
+        except (EOFError, OSError) as e:
+            kind, info = "init_error", f"exited ({proc.wait()}): {e!r}"
+        if kind != "ready":
+            parent.close()
+            if proc.poll() is None:
+                proc.kill()
+            raise RuntimeError(f"inference worker {w.idx} failed to start: {info}")
+        w.proc, w.conn, w.job = proc, parent, None
+        w.gen += 1
+        self.tasks = tuple(info)
+        if w.shm is None:
+            w.shm = shared_memory.SharedMemory(create=True, size=self.shm_bytes)
+
+    def start_blocking(self) -> None:
+        """Spawns the workers; blocks while each one loads its models."""
+        for i in range(self.procs):
+            w = _Worker(i)
+            self._spawn(w)
+            self._workers.append(w)
+
+    async def start(self) -> None:
+        await asyncio.to_thread(self.start_blocking)
+        self._loop = asyncio.get_running_loop()
+        self._idle = asyncio.Queue()
+        for w in self._workers:
+            self._loop.add_reader(w.conn.fileno(), self._on_reply, w)
+            self._idle.put_nowait((w, w.gen))
+
+    def close(self) -> None:
+        for w in self._workers:
+            if self._loop is not None and w.conn is not None:
+                try:
+                    self._loop.remove_reader(w.conn.fileno())
+                except Exception:
+                    pass
+            self._fail(w, RuntimeError("inference pool closed"))
+            try:
+                w.conn.send(None)
+            except Exception:
+                pass
+            if w.proc is not None:
+                try:
+                    w.proc.wait(timeout=2.0)
+                except subprocess.TimeoutExpired:
+                    w.proc.kill()
+            if w.conn is not None:
+                w.conn.close()
+            if w.shm is not None:
+                w.shm.close()
+                w.shm.unlink()
+                w.shm = None
+        self._workers.clear()
+        self._loop = None
+
+    # ── jobs ──
+    async def detect(self, task: str, frame: np.ndarray) -> np.ndarray:
+        """Runs `task` on an RGB (h, w, 3) uint8 frame in the next idle worker
+        → (N, K, 2) float32 normalized landmarks."""
+        if self._idle is None:
+            raise RuntimeError("inference pool not started")
+        while True:
+            if not self._usable():
+                raise RuntimeError("no inference worker alive")
+            w, gen = await self._idle.get()
+            if w is None:
+                # a worker gave up respawning: re-check, and pass the wake-up on to the next waiter
+                if not self._usable():
+                    self._idle.put_nowait((None, 0))
+                    raise RuntimeError("no inference worker alive")
+                continue
+            if gen == w.gen and w.proc is not None:
+                break
+        try:
+            h, wd = frame.shape[:2]
+            need = h * wd * 3
+            if need > w.shm.size:
+                # bigger frame than the segment: replace it (the worker attaches by name)
+                old, w.shm = w.shm, shared_memory.SharedMemory(create=True, size=need)
+                old.close()
+                old.unlink()
+                self.stats["shm_regrows"] += 1
+            np.copyto(np.ndarray((h, wd, 3), dtype=np.uint8, buffer=w.shm.buf), frame)
+            job = next(self._ids)
+            fut = self._loop.create_future()
+            w.job = (job, fut)
+            t0 = time.perf_counter()
+            w.conn.send((job, task, w.shm.name, h, wd))
+            out = await fut
+            self._rtt_ms.append((time.perf_counter() - t0) * 1000.0)
+            return out
+        finally:
+            w.job = None
+            if w.proc is not None and gen == w.gen:
+                self._idle.put_nowait((w, gen))
+
+    def _on_reply(self, w: _Worker) -> None:
+        try:
+            job, out, err = w.conn.recv()
+        except (EOFError, OSError):
+            self._on_worker_died(w)
+            return
+        if w.job is None or w.job[0] != job:
+            return  # reply to a cancelled job
+        fut = w.job[1]
+        w.jobs += 1
+        self.stats["jobs"] += 1
+        if fut.done():
+            return
+        if err is not None:
+            self.stats["errors"] += 1
+            fut.set_exception(RuntimeError(f"inference worker {w.idx}: {err}"))
+        else:
+            fut.set_result(out)
+
+    def _fail(self, w: _Worker, exc: BaseException) -> None:
+        if w.job is not None and not w.job[1].done():
+            w.job[1].set_exception(exc)
+
+    def _on_worker_died(self, w: _Worker) -> None:
+        self._loop.remove_reader(w.conn.fileno())
+        w.conn.close()
+        old, w.proc = w.proc, None
+        code = old.poll() if old is not None else None  # may not be reaped yet (None)
+        self._fail(w, RuntimeError(f"inference worker {w.idx} exited ({code})"))
+        if self._warn:
+            self._warn(f"Inference worker {w.idx} died (exit {code}); respawning")
+
+        async def _go():
+            if old is not None:
+                await asyncio.to_thread(old.wait)
+            for attempt in range(RESPAWN_TRIES):
+                try:
+                    await asyncio.to_thread(self._spawn, w)
+                    break
+                except Exception as e:
+                    if self._warn:
+                        self._warn(f"Inference worker {w.idx} respawn failed ({attempt + 1}/{RESPAWN_TRIES}): {e}")
+                    if attempt + 1 < RESPAWN_TRIES:
+                        await asyncio.sleep(0.5 * 2 ** attempt)
+            else:
+                w.respawning = False
+                self._idle.put_nowait((None, 0))  # waiters re-check _usable()
+                return
+            w.respawning = False
+            self.stats["respawns"] += 1
+            self._loop.add_reader(w.conn.fileno(), self._on_reply, w)
+            self._idle.put_nowait((w, w.gen))
+
+        w.respawning = True
+        self._loop.create_task(_go())
+
+    def snapshot(self) -> Dict[str, object]:
+        rtt = np.asarray(self._rtt_ms, dtype=np.float64)
+        return dict(
+            self.stats,
+            procs=self.procs,
+            started=self.started,
+            tasks=list(self.tasks),
+            busy=sum(1 for w in self._workers if w.job is not None),
+            alive=sum(1 for w in self._workers if w.proc is not None and w.proc.poll() is None),
+            jobs_per_worker=[w.jobs for w in self._workers],
+            shm_bytes=sum(w.shm.size for w in self._workers if w.shm is not None),
+            roundtrip_ms_p50=round(float(np.percentile(rtt, 50)), 2) if rtt.size else 0.0,
+            roundtrip_ms_p90=round(float(np.percentile(rtt, 90)), 2) if rtt.size else 0.0,
+        )
+
+
+# ─────────────── TaskAdapter glue ───────────────
+def points_from_compact(norm: np.ndarray, img_shape, indices=None) -> Tuple[int, int, np.ndarray]:
+    """(N,K,2) normalized float32 → (w, h, (N,K,2) int32 px) clipped to the image."""
+    h, w = img_shape[:2]
+    if norm is None or norm.size == 0:
+        return w, h, np.zeros((0, 0, 2), dtype=np.int32)
+    if indices is not None:
+        norm = norm[:, indices]
+    xy = np.rint(norm.astype(np.float64) * (w, h))
+    np.clip(xy, 0, (w - 1, h - 1), out=xy)
+    return w, h, xy.astype(np.int32)
+
+
+def pool_adapter(pool: ProcessInferencePool, base):
+    """`base` (a TaskAdapter) with its inference moved to `pool`'s workers; every
+    other field (presets, temporal, roi, DAG hooks) is kept."""
+    task = base.name
+
+    async def detect_image(frame):
+        return await pool.detect(task, frame)
+
+    async def detect_video(frame, _ts_ms):
+        # workers run IMAGE-mode landmarkers: jobs of one session may land on any worker
+        return await pool.detect(task, frame)
+
+    return dataclasses.replace(
+        base,
+        make_mp_image=lambda rgb: rgb,
+        detect_image=detect_image,
+        detect_video=detect_video,
+        points_from_result=points_from_compact,
+    )
+
+
+if __name__ == "__main__":
+    _worker_main(Connection(int(sys.argv[1])))
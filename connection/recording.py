@@ -0,0 +1,122 @@
+# connection/recording.py — opt-in recording of a session's decoded appsink frames
+#
+# Files per recording (same base path):
+#   <base>.raw   RGB frames back to back, written through a preallocated np.memmap
+#                (capacity = max_bytes; truncated to what was used on close)
+#   <base>.idx   one IDX_DTYPE record per frame: byte offset, shape, PTS and the
+#                appsink CLOCK_MONOTONIC stamp (replay at original speed uses it)
+#   <base>.json  metadata, written on close (frames, bytes, dropped, sid, ...)
+# Rows are stored unpadded (h, w, 3) whatever the appsink stride was.
+#
+# The writer runs on the GStreamer streaming thread (one memcpy into the page
+# cache per frame); close() may come from any thread. A full file stops recording
+# (later frames are counted as dropped), it never blocks the pipeline.
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterator, Optional, Tuple
+
+import numpy as np
+
+IDX_DTYPE = np.dtype([("offset", "<u8"), ("h", "<u2"), ("w", "<u2"), ("pts_ns", "<i8"), ("t_ns", "<i8")])
+FORMAT_VERSION = 1
+
+
+class FrameRecorder:
+    def __init__(self, base: str, max_bytes: int, meta: Optional[Dict[str, object]] = None):
+        self.base = base
+        self.max_bytes = max(1, int(max_bytes))
+        self.meta = dict(meta or {})
+        os.makedirs(os.path.dirname(os.path.abspath(base)), exist_ok=True)
+        self._raw = np.memmap(base + ".raw", dtype=np.uint8, mode="w+", shape=(self.max_bytes,))
+        self._idx = open(base + ".idx", "wb")
+        self._lock = threading.Lock()
+        self._used = 0
+        self.frames = 0
+        self.dropped = 0
+        self.closed = False
+        self.started_at = time.time()
+
+    def write(self, rgb: np.ndarray, pts_ns: int, t_ns: int) -> bool:
+        """Appends one (h, w, 3) uint8 frame; False once closed or full."""
+        h, w = rgb.shape[:2]
+        n = h * w * 3
+        with self._lock:
+            if self.closed or self._used + n > self.max_bytes:
+                self.dropped += 1
+                return False
+            off = self._used
+            self._raw[off:off + n].reshape(h, w, 3)[...] = rgb
+            rec = np.array([(off, h, w, pts_ns, t_ns)], dtype=IDX_DTYPE)
+            self._idx.write(rec.tobytes())
+            self._used += n
+            self.frames += 1
+        return True
+
+    def close(self) -> Dict[str, object]:
+        with self._lock:
+            if self.closed:
+                return self.snapshot()
+            self.closed = True
+            self._raw.flush()
+            del self._raw  # unmap before truncating
+            self._idx.close()
+            os.truncate(self.base + ".raw", self._used)
+            info = self.snapshot()
+            with open(self.base + ".json", "w") as f:
+                json.dump(dict(self.meta, version=FORMAT_VERSION, **info), f, indent=2)
+        return info
+
+    def snapshot(self) -> Dict[str, object]:
+        return dict(
+            base=self.base,
+            frames=self.frames,
+            bytes=self._used,
+            max_bytes=self.max_bytes,
+            dropped=self.dropped,
+            closed=self.closed,
+            started_at=self.started_at,
+        )
+
+
+class Recording:
+    """Read side: frames come back as read-only views into the memory-mapped file."""
+
+    def __init__(self, base: str):
+        for ext in (".raw", ".idx", ".json"):
+            if base.endswith(ext):
+                base = base[: -len(ext)]
+        self.base = base
+        self.index = np.fromfile(base + ".idx", dtype=IDX_DTYPE)
+        size = os.path.getsize(base + ".raw")
+        self._raw = np.memmap(base + ".raw", dtype=np.uint8, mode="r") if size else np.zeros(0, np.uint8)
+        try:
+            with open(base + ".json") as f:
+                self.meta: Dict[str, object] = json.load(f)
+        except (OSError, ValueError):
+            self.meta = {}  # recorder not closed cleanly: the index is still usable
+        # frames whose bytes didn't make it to disk (unclean stop) are ignored
+        end = self.index["offset"] + self.index["h"].astype(np.uint64) * self.index["w"] * 3
+        self.index = self.index[end <= size]
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def frame(self, i: int) -> Tuple[np.ndarray, int, int]:
+        """→ ((h, w, 3) uint8 view, pts_ns, appsink t_ns)."""
+        off, h, w, pts_ns, t_ns = self.index[i]
+        n = int(h) * int(w) * 3
+        return self._raw[int(off):int(off) + n].reshape(int(h), int(w), 3), int(pts_ns), int(t_ns)
+
+    def __iter__(self) -> Iterator[Tuple[np.ndarray, int, int]]:
+        for i in range(len(self)):
+            yield self.frame(i)
+
+    def duration_s(self) -> float:
+        if len(self) < 2:
+            return 0.0
+        return float(self.index["t_ns"][-1] - self.index["t_ns"][0]) / 1e9
@@ -0,0 +1,206 @@
+# connection/replay.py — replay a frame recording through the adapters and packers
+#
+#   python -m connection.replay recordings/20250101-120000-abc123            # max speed
+#   python -m connection.replay REC --speed 1                                # original timing
+#   python -m connection.replay REC --init modules.landmarkers_proceso:init_landmarkers \
+#       --arg pose_model=models/pose_landmarker.task --tasks pose
+#   python -m connection.replay REC --adapters mymod:ADAPTERS --json out.json
+#
+# Recordings come from the session recorder (connection/recording.py: offer
+# "record" or POST /webrtc/sessions/<sid>/record). No GStreamer and no WebRTC: each
+# frame goes through the per-task path process_frames runs — make_mp_image →
+# detect → points_from_result → PD packing — and every stage is timed.
+#
+# Inference sources:
+#   --init module:function   handlers as for INFER_PROCS workers ({task: fn(rgb) →
+#                            (N,K,2) normalized}), --arg k=v passed to the function
+#   --adapters module:attr   {task: TaskAdapter} (or a callable returning it)
+#   neither                  'synthetic': deterministic points from the frame's
+#                            brightest cells — no models, for packer benchmarks
+#
+# --speed 1 paces frames by their appsink stamps and, like the live frame ring,
+# skips to the newest frame when processing falls behind; --speed 0 runs every
+# frame as fast as possible (deterministic CPU benchmark).
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import importlib
+import inspect
+import json
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from .packing import pack_pose_frame_delta_np
+from .procpool import points_from_compact
+from .recording import Recording
+from .tracing import StageTracer
+
+
+class _Task:
+    """One task's make_mp_image / detect / points_from_result, from an adapter or a handler."""
+
+    def __init__(self, name: str, make_img: Callable, detect: Callable, to_points: Callable):
+        self.name = name
+        self.make_img = make_img
+        self.detect = detect
+        self.to_points = to_points
+        self.is_async = inspect.iscoroutinefunction(detect)
+        self.prev: Optional[np.ndarray] = None
+        self.bytes = 0
+        self.keyframes = 0
+
+
+def synthetic_handlers(points: int = 33) -> Dict[str, Callable[[np.ndarray], np.ndarray]]:
+    """Landmarks at the `points` brightest cells of a 16×16 grid, normalized (1,K,2)."""
+
+    def _pts(rgb: np.ndarray) -> np.ndarray:
+        h, w = rgb.shape[:2]
+        gy, gx = max(1, h // 16), max(1, w // 16)
+        cells = rgb[: gy * 16, : gx * 16, 1].reshape(16, gy, 16, gx).mean(axis=(1, 3))
+        order = np.argsort(cells, axis=None, kind="stable")[::-1][:points]
+        ys, xs = np.divmod(order, 16)
+        return np.stack([(xs + 0.5) / 16.0, (ys + 0.5) / 16.0], axis=-1)[None].astype(np.float32)
+
+    return {"synthetic": _pts}
+
+
+def _load(spec: str):
+    mod, attr = spec.split(":", 1)
+    return getattr(importlib.import_module(mod), attr)
+
+
+def build_tasks(init: Optional[str], adapters: Optional[str], args: Dict[str, Any],
+                only: Optional[List[str]]) -> List[_Task]:
+    tasks: List[_Task] = []
+    if adapters:
+        obj = _load(adapters)
+        ads = obj() if callable(obj) else obj
+        for name, ad in ads.items():
+            tasks.append(_Task(name, ad.make_mp_image, ad.detect_image, ad.points_from_result))
+    else:
+        handlers = _load(init)(**args) if init else synthetic_handlers(**args)
+        for name, fn in handlers.items():
+            tasks.append(_Task(name, lambda rgb: rgb, fn, points_from_compact))
+    if only:
+        tasks = [t for t in tasks if t.name in only]
+        if not tasks:
+            raise SystemExit(f"none of --tasks {only} is available")
+    return tasks
+
+
+async def replay(rec: Recording, tasks: List[_Task], *, speed: float = 0.0, loops: int = 1,
+                 pd_version: int = 2, kf_every: int = 30, src_size=None) -> Dict[str, object]:
+    tracer = StageTracer(window=max(1, len(rec) * loops))
+    n_run = n_skipped = 0
+    seq = 0
+    cpu0, wall0 = time.process_time(), time.perf_counter()
+    for _ in range(loops):
+        t_first = int(rec.index["t_ns"][0]) if len(rec) else 0
+        start = time.perf_counter()
+        i = 0
+        while i < len(rec):
+            if speed > 0:
+                # newest frame already "decoded" at this point of the original timeline
+                due = t_first + (time.perf_counter() - start) * speed * 1e9
+                j = int(np.searchsorted(rec.index["t_ns"], due, side="right")) - 1
+                if j < i:
+                    await asyncio.sleep((int(rec.index["t_ns"][i]) - due) / 1e9 / speed)
+                    continue
+                n_skipped += j - i
+                i = j
+            frame, _pts_ns, _t_ns = rec.frame(i)
+            i += 1
+            seq = (seq + 1) & 0xFFFF
+            full_shape = (src_size[1], src_size[0], 3) if src_size else frame.shape
+            t_frame = time.perf_counter()
+            for t in tasks:
+                t0 = time.perf_counter()
+                img = t.make_img(frame)
+                t1 = time.perf_counter()
+                res = await t.detect(img) if t.is_async else t.detect(img)
+                t2 = time.perf_counter()
+                w0, h0, pts = t.to_points(res, full_shape)
+                pts = np.asarray(pts, dtype=np.int32)
+                t3 = time.perf_counter()
+                kf = t.prev is None or t.prev.shape != pts.shape or (kf_every > 0 and seq % kf_every == 0)
+                pkt = pack_pose_frame_delta_np(t.prev, pts, w0, h0, keyframe=kf, seq=seq, ver=pd_version)
+                t4 = time.perf_counter()
+                t.prev = pts
+                t.bytes += len(pkt)
+                t.keyframes += int(bool(pkt[3]))
+                tracer.add(f"mp_image:{t.name}", (t1 - t0) * 1000.0)
+                tracer.add(f"detect:{t.name}", (t2 - t1) * 1000.0)
+                tracer.add(f"points:{t.name}", (t3 - t2) * 1000.0)
+                tracer.add(f"pack:{t.name}", (t4 - t3) * 1000.0)
+            tracer.add("frame", (time.perf_counter() - t_frame) * 1000.0)
+            n_run += 1
+    wall = time.perf_counter() - wall0
+    cpu = time.process_time() - cpu0
+    return {
+        "recording": rec.base,
+        "frames": len(rec),
+        "loops": loops,
+        "speed": speed,
+        "frames_run": n_run,
+        "frames_skipped": n_skipped,
+        "wall_s": round(wall, 3),
+        "fps": round(n_run / wall, 2) if wall > 0 else 0.0,
+        "cpu_ms_per_frame": round(cpu * 1000.0 / max(1, n_run), 3),
+        "bytes_per_frame": {t.name: round(t.bytes / max(1, n_run), 1) for t in tasks},
+        "keyframes": {t.name: t.keyframes for t in tasks},
+        "stages": tracer.percentiles(),
+    }
+
+
+def _parse_args(pairs: List[str]) -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    for p in pairs:
+        k, _, v = p.partition("=")
+        try:
+            out[k] = json.loads(v)
+        except ValueError:
+            out[k] = v  # plain string (paths)
+    return out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Replay a decoded-frame recording through adapters and packers")
+    ap.add_argument("recording", help="recording base path (with or without .raw/.idx/.json)")
+    ap.add_argument("--speed", type=float, default=0.0, help="1 = original timing, 0 = as fast as possible")
+    ap.add_argument("--loops", type=int, default=1)
+    ap.add_argument("--init", help="module:function returning {task: fn(rgb) → normalized (N,K,2)}")
+    ap.add_argument("--adapters", help="module:attr with {task: TaskAdapter} (or a callable returning it)")
+    ap.add_argument("--arg", action="append", default=[], help="k=v for --init / synthetic (JSON values)")
+    ap.add_argument("--tasks", nargs="*", help="subset of tasks to run")
+    ap.add_argument("--pd-version", type=int, default=2, choices=(2, 3, 4))
+    ap.add_argument("--kf-every", type=int, default=30, help="keyframe every N frames (0 = first only)")
+    ap.add_argument("--json", help="also write the report here")
+    args = ap.parse_args()
+
+    rec = Recording(args.recording)
+    if not len(rec):
+        raise SystemExit(f"{args.recording}: no frames")
+    tasks = build_tasks(args.init, args.adapters, _parse_args(args.arg), args.tasks)
+    src = rec.meta.get("src_size")
+    report = asyncio.run(replay(
+        rec, tasks, speed=args.speed, loops=max(1, args.loops),
+        pd_version=args.pd_version, kf_every=args.kf_every, src_size=src,
+    ))
+    print(f"{report['frames_run']} frames ({report['frames_skipped']} skipped) in {report['wall_s']}s "
+          f"→ {report['fps']} fps, {report['cpu_ms_per_frame']} ms CPU/frame")
+    print(f"{'stage':<22}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}")
+    for stage, st in report["stages"].items():
+        print(f"{stage:<22}{st['p50']:>9.3f}{st['p90']:>9.3f}{st['p99']:>9.3f}{st['max']:>9.3f}")
+    for name, b in report["bytes_per_frame"].items():
+        print(f"{name}: {b} B/frame, {report['keyframes'][name]} keyframes")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
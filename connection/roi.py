@@ -0,0 +1,101 @@
+# connection/roi.py — crop inference to the region around the previous landmarks
+#
+# A RoiTracker (one per session × task) turns the last result's points into a
+# box (+ margin, snapped to a 16 px grid so crop sizes stay stable) in frame
+# pixels. The next inference runs on that crop; points are remapped back to the
+# full frame by the caller (see crop_shape/offset). A full-frame pass runs every
+# `full_every` inferences, whenever the crop would cover most of the frame, and
+# right after tracking is lost (empty result on a crop).
+#
+# The crop may also come from another task's landmarks in the same frame (adapter
+# roi_from, e.g. face on the pose head); box_around() builds it with the same rules.
+#
+# Crops of an (H,W,3) frame are strided views; MediaPipe needs contiguous data, so
+# the tracker copies them into a buffer it reuses while the crop size is unchanged.
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+_GRID = 16
+
+
+@dataclass(frozen=True)
+class RoiConfig:
+    margin: float = 0.25       # padding around the landmark box, fraction of its larger side
+    full_every: int = 30       # inferences between forced full-frame passes (0 = never)
+    min_size: int = 96         # smallest crop side (frame px)
+    max_area: float = 0.7      # crop covering more than this fraction of the frame → full frame
+
+
+class RoiTracker:
+    def __init__(self, cfg: RoiConfig):
+        self.cfg = cfg
+        self.box: Optional[Tuple[int, int, int, int]] = None  # x0, y0, x1, y1 (frame px)
+        self._since_full = 0
+        self._buf: Optional[np.ndarray] = None
+        self.stats: Dict[str, float] = dict(crops=0, full=0, lost=0, area_avg=0.0)
+
+    def crop(self, frame: np.ndarray, box: Optional[Tuple[int, int, int, int]] = None
+             ) -> Tuple[np.ndarray, Optional[Tuple[int, int, int, int]]]:
+        """→ (image for inference, box or None for the full frame). An explicit `box`
+        (e.g. from an upstream task's landmarks) takes precedence over the tracked one."""
+        forced = box is not None
+        box = box or self.box
+        fh, fw = frame.shape[:2]
+        stale = box is not None and (box[2] > fw or box[3] > fh)  # caps change since the box was taken
+        periodic = bool(self.cfg.full_every) and self._since_full >= self.cfg.full_every
+        if box is None or stale or (periodic and not forced):
+            self._since_full = 0
+            self.stats["full"] += 1
+            return frame, None
+        x0, y0, x1, y1 = box
+        self._since_full += 1
+        self.stats["crops"] += 1
+        area = (x1 - x0) * (y1 - y0) / float(fh * fw)
+        prev = self.stats["area_avg"] if self.stats["crops"] > 1 else area
+        self.stats["area_avg"] = round(prev * 0.95 + area * 0.05, 4)  # crop area / frame area
+        shape = (y1 - y0, x1 - x0, frame.shape[2])
+        if self._buf is None or self._buf.shape != shape:
+            self._buf = np.empty(shape, dtype=frame.dtype)
+        np.copyto(self._buf, frame[y0:y1, x0:x1])
+        return self._buf, box
+
+    def update(self, pts: np.ndarray, frame_shape, scale: Tuple[float, float], cropped: bool) -> None:
+        """Feeds the full-frame points in sender px ((N,K,2)); `scale` = sender px per frame px."""
+        if pts.size == 0:
+            if cropped:
+                self.stats["lost"] += 1
+            self.box = None
+            return
+        self.box = self.box_around(pts, frame_shape, scale)
+
+    def box_around(self, pts: np.ndarray, frame_shape, scale: Tuple[float, float]) -> Optional[Tuple[int, int, int, int]]:
+        """Crop box (frame px) around sender-px points (…, 2), or None if it is not worth cropping."""
+        fh, fw = frame_shape[:2]
+        xy = np.asarray(pts, dtype=np.float64).reshape(-1, 2) / scale
+        if xy.size == 0:
+            return None
+        (bx0, by0), (bx1, by1) = xy.min(axis=0), xy.max(axis=0)
+        pad = self.cfg.margin * max(bx1 - bx0, by1 - by0)
+        side_min = self.cfg.min_size
+        cx, cy = (bx0 + bx1) / 2, (by0 + by1) / 2
+        hw = max(bx1 - bx0 + 2 * pad, side_min) / 2
+        hh = max(by1 - by0 + 2 * pad, side_min) / 2
+        x0 = max(0, int(cx - hw) // _GRID * _GRID)
+        y0 = max(0, int(cy - hh) // _GRID * _GRID)
+        x1 = min(fw, -(-int(cx + hw) // _GRID) * _GRID)
+        y1 = min(fh, -(-int(cy + hh) // _GRID) * _GRID)
+        if x1 <= x0 or y1 <= y0 or (x1 - x0) * (y1 - y0) > self.cfg.max_area * fw * fh:
+            return None
+        return x0, y0, x1, y1
+
+    @property
+    def nbytes(self) -> int:
+        return self._buf.nbytes if self._buf is not None else 0
+
+    def snapshot(self) -> Dict[str, object]:
+        return dict(self.stats, box=list(self.box) if self.box else None)
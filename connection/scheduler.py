@@ -0,0 +1,177 @@
+# connection/scheduler.py — process-wide inference scheduler shared by all WebRTC sessions
+#
+# Sessions ask for a grant before running their adapters on a frame. The
+# scheduler owns a fixed number of inference permits plus the worker threads
+# used for synchronous detect calls, and grants waiting sessions in
+#   • "wfq" (default): weighted fair order — virtual finish time += cost_ms / weight
+#   • "rr"           : round-robin — every grant costs 1 regardless of duration
+# A per-session FPS budget delays grants that would exceed it. While a session
+# waits, newer frames keep replacing its pending slot, so the grant always runs
+# on the latest frame. Everything runs on the asyncio loop thread (no locks).
+# Only synchronous detect callables go through run_sync (coroutine adapters, e.g.
+# the process pool, are awaited on the loop). Permits bound concurrency across
+# sessions, but adapters sharing one landmarker still serialize on its own lock
+# (MediaPipe landmarkers are not thread-safe), so extra workers only help when
+# sessions run different tasks or models.
+#
+# ENV: INFER_SCHEDULER=1 enables it; INFER_SCHED_WORKERS, INFER_SCHED_POLICY,
+#      SESSION_MAX_FPS (default budget, 0 = unlimited).
+
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, Optional
+
+from . import affinity
+
+INFER_SCHEDULER = os.getenv("INFER_SCHEDULER", "0") == "1"
+INFER_SCHED_WORKERS = int(os.getenv("INFER_SCHED_WORKERS", "2"))
+INFER_SCHED_POLICY = os.getenv("INFER_SCHED_POLICY", "wfq").lower()
+SESSION_MAX_FPS = float(os.getenv("SESSION_MAX_FPS", "0"))
+
+
+@dataclass
+class _Client:
+    key: str
+    weight: float = 1.0
+    max_fps: float = 0.0
+    vtime: float = 0.0
+    last_grant: float = 0.0
+    waiter: Optional[asyncio.Future] = None
+    t_request: float = 0.0
+    grants: int = 0
+    grant_times: Deque[float] = field(default_factory=lambda: deque(maxlen=120))
+    qdelay_ms: Deque[float] = field(default_factory=lambda: deque(maxlen=300))
+
+
+class InferenceScheduler:
+    def __init__(self, workers: int = INFER_SCHED_WORKERS, policy: str = INFER_SCHED_POLICY):
+        self.workers = max(1, workers)
+        self.policy = policy if policy in ("wfq", "rr") else "wfq"
+        self._free = self.workers
+        self._clients: Dict[str, _Client] = {}
+        self._vclock = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.executor: ThreadPoolExecutor = affinity.infer_executor() or ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="infer"
+        )
+
+    # ── registration ──
+    def register(self, key: str, *, weight: float = 1.0, max_fps: float = SESSION_MAX_FPS) -> None:
+        c = self._clients.get(key)
+        if c is None:
+            self._clients[key] = _Client(key, max(0.01, weight), max(0.0, max_fps), vtime=self._vclock)
+        else:
+            c.weight, c.max_fps = max(0.01, weight), max(0.0, max_fps)
+
+    def unregister(self, key: str) -> None:
+        c = self._clients.pop(key, None)
+        if c and c.waiter and not c.waiter.done():
+            c.waiter.cancel()
+
+    # ── grants ──
+    async def acquire(self, key: str) -> None:
+        """Waits until `key` may run inference; pair with release()."""
+        c = self._clients.get(key)
+        if c is None:
+            self.register(key)
+            c = self._clients[key]
+        loop = asyncio.get_running_loop()
+        c.waiter = loop.create_future()
+        c.t_request = time.monotonic()
+        # a session returning from idle does not get credit for the time it was away
+        c.vtime = max(c.vtime, self._vclock)
+        self._dispatch()
+        try:
+            await c.waiter
+        except asyncio.CancelledError:
+            if c.waiter.done() and not c.waiter.cancelled():
+                self._free += 1  # granted but cancelled before use
+                self._dispatch()
+            raise
+        finally:
+            c.waiter = None
+
+    def release(self, key: str, cost_ms: float) -> None:
+        self._free = min(self.workers, self._free + 1)
+        c = self._clients.get(key)
+        if c is not None:
+            c.vtime += (1.0 if self.policy == "rr" else max(cost_ms, 0.1)) / c.weight
+        # Next loop iteration: a backlogged releaser can re-request and compete fairly
+        asyncio.get_running_loop().call_soon(self._dispatch)
+
+    async def run_sync(self, fn: Callable[..., Any], *args) -> Any:
+        """Runs a blocking detect call on the scheduler's inference workers."""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    def _dispatch(self) -> None:
+        now = time.monotonic()
+        next_ready: Optional[float] = None
+        while self._free > 0:
+            best: Optional[_Client] = None
+            for c in self._clients.values():
+                if c.waiter is None or c.waiter.done():
+                    continue
+                ready_at = c.last_grant + (1.0 / c.max_fps if c.max_fps > 0 else 0.0)
+                if ready_at > now:
+                    next_ready = ready_at if next_ready is None else min(next_ready, ready_at)
+                    continue
+                if best is None or (c.vtime, c.t_request) < (best.vtime, best.t_request):
+                    best = c
+            if best is None:
+                break
+            self._free -= 1
+            self._vclock = best.vtime
+            best.last_grant = now
+            best.grants += 1
+            best.grant_times.append(now)
+            best.qdelay_ms.append((now - best.t_request) * 1000.0)
+            best.waiter.set_result(True)
+        if next_ready is not None and self._free > 0:
+            if self._timer:
+                self._timer.cancel()
+            loop = asyncio.get_running_loop()
+            self._timer = loop.call_later(max(0.0, next_ready - now), self._dispatch)
+
+    # ── metrics ──
+    def snapshot(self) -> Dict[str, object]:
+        now = time.monotonic()
+        sessions = {}
+        for key, c in self._clients.items():
+            recent = [t for t in c.grant_times if now - t <= 2.0]
+            span = now - recent[0] if recent else 0.0
+            qd = sorted(c.qdelay_ms)
+            sessions[key] = {
+                "weight": c.weight,
+                "max_fps": c.max_fps,
+                "grants": c.grants,
+                "achieved_fps": round(len(recent) / span, 2) if span > 0 else 0.0,
+                "queue_delay_ms_avg": round(sum(qd) / len(qd), 2) if qd else 0.0,
+                "queue_delay_ms_p95": round(qd[int(0.95 * (len(qd) - 1))], 2) if qd else 0.0,
+                "waiting": c.waiter is not None and not c.waiter.done(),
+            }
+        return {
+            "enabled": True,
+            "policy": self.policy,
+            "workers": self.workers,
+            "free": self._free,
+            "sessions": sessions,
+        }
+
+
+_scheduler: Optional[InferenceScheduler] = None
+
+
+def get_scheduler() -> Optional[InferenceScheduler]:
+    """The process-wide scheduler, or None when INFER_SCHEDULER=0."""
+    global _scheduler
+    if not INFER_SCHEDULER:
+        return None
+    if _scheduler is None:
+        _scheduler = InferenceScheduler()
+    return _scheduler
@@ -0,0 +1,120 @@
+# connection/temporal.py — reduced-cadence inference with landmark filtering/extrapolation
+#
+# A LandmarkTracker (one per session × task) decides which frames need a real
+# detect call. In between it emits the filtered points extrapolated to the frame
+# timestamp. Points are (N,K,2) arrays in sender pixels. Filters:
+#   • "one_euro": One-Euro filter (speed-adaptive low-pass) + filtered velocity
+#   • "cv"      : constant velocity, measurements pass through unsmoothed
+# Cadence adapts: the inference period grows by one frame after each quiet
+# inference (prediction error < motion_px / 2) up to max_every, and drops back to
+# every frame as soon as the error exceeds motion_px (the subject moved).
+
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from .packing import as_points_array
+
+FILTERS = ("one_euro", "cv")
+
+
+@dataclass(frozen=True)
+class TemporalConfig:
+    max_every: int = 4               # longest inference period (frames); 1 disables skipping
+    filter: str = "one_euro"         # "one_euro" | "cv"
+    min_cutoff: float = 1.0          # Hz, One-Euro cutoff at rest (lower = smoother)
+    beta: float = 0.02               # One-Euro speed coefficient (higher = less lag when moving)
+    d_cutoff: float = 1.0            # Hz, velocity low-pass
+    motion_px: float = 6.0           # prediction error that snaps the cadence back to 1
+    max_extrapolate_ms: int = 200    # never extrapolate further than this past the last inference
+
+    def __post_init__(self):
+        if self.filter not in FILTERS:
+            raise ValueError(f"unknown temporal filter '{self.filter}'; allowed={list(FILTERS)}")
+
+
+def _alpha(cutoff, dt_s: float):
+    tau = 1.0 / (2.0 * math.pi * cutoff)
+    return 1.0 / (1.0 + tau / dt_s)
+
+
+class LandmarkTracker:
+    def __init__(self, cfg: TemporalConfig):
+        self.cfg = cfg
+        self.every = 1
+        self._since = 0
+        self._x: Optional[np.ndarray] = None    # filtered points (float64)
+        self._dx: Optional[np.ndarray] = None   # filtered velocity, px/s
+        self._t_ms = 0
+        self._size: Tuple[int, int] = (0, 0)
+        self.stats: Dict[str, float] = dict(inferred=0, predicted=0, resets=0, motion_px=0.0)
+
+    def reset(self) -> None:
+        self._x = self._dx = None
+        self.every = 1
+        self._since = 0
+        self.stats["resets"] += 1
+
+    def due(self, ts_ms: int) -> bool:
+        """True when this frame needs a real inference."""
+        if self._x is None or self.every <= 1:
+            return True
+        if ts_ms - self._t_ms > self.cfg.max_extrapolate_ms:
+            return True
+        return self._since + 1 >= self.every
+
+    def predict(self, ts_ms: int) -> Tuple[int, int, np.ndarray]:
+        """Filtered points extrapolated to `ts_ms` → (w, h, (N,K,2) int32). Call after due() is False."""
+        self._since += 1
+        self.stats["predicted"] += 1
+        return (*self._size, self._extrapolate(ts_ms))
+
+    def update(self, w: int, h: int, pts, ts_ms: int) -> np.ndarray:
+        """Feeds a measurement (ndarray or lists); returns the points to send (filtered, int32)."""
+        self.stats["inferred"] += 1
+        self._since = 0
+        cur = as_points_array(pts)
+        meas = cur.astype(np.float64)
+        if meas.size == 0 or self._x is None or self._x.shape != meas.shape or (w, h) != self._size:
+            # first detection, object count/subset change or lost subject → start over
+            if self._x is not None:
+                self.reset()
+            self._size = (w, h)
+            self._t_ms = ts_ms
+            if meas.size:
+                self._x, self._dx = meas, np.zeros_like(meas)
+            return cur
+
+        dt_s = max(ts_ms - self._t_ms, 1) / 1000.0
+        err = float(np.abs(self._x + self._dx * dt_s - meas).max())
+        self.stats["motion_px"] = round(err, 2)
+
+        raw_dx = (meas - self._x) / dt_s
+        a_d = _alpha(self.cfg.d_cutoff, dt_s)
+        self._dx = a_d * raw_dx + (1.0 - a_d) * self._dx
+        if self.cfg.filter == "cv":
+            self._x = meas
+        else:
+            speed = np.hypot(self._dx[..., 0], self._dx[..., 1])[..., None]
+            a = _alpha(self.cfg.min_cutoff + self.cfg.beta * speed, dt_s)
+            self._x = a * meas + (1.0 - a) * self._x
+        self._t_ms = ts_ms
+
+        if err > self.cfg.motion_px:
+            self.every = 1
+        elif err < self.cfg.motion_px / 2:
+            self.every = min(self.every + 1, max(1, self.cfg.max_every))
+        return self._extrapolate(ts_ms)
+
+    def _extrapolate(self, ts_ms: int) -> np.ndarray:
+        dt_s = min(max(ts_ms - self._t_ms, 0), self.cfg.max_extrapolate_ms) / 1000.0
+        x = self._x + self._dx * dt_s
+        w, h = self._size
+        return np.clip(np.rint(x), 0, (max(w - 1, 0), max(h - 1, 0))).astype(np.int32)
+
+    def snapshot(self) -> Dict[str, object]:
+        return dict(self.stats, every=self.every, filter=self.cfg.filter)
@@ -0,0 +1,78 @@
+# connection/tracing.py — per-stage latency windows for one WebRTC session
+#
+# Frames carry CLOCK_MONOTONIC stamps from the RTP pad probe (last packet of the
+# frame, matched by PTS) and the appsink callback (stored with the frame-ring slot);
+# process_frames adds the rest. Every stage keeps a rolling window of its last
+# `window` durations (ms) → count / avg / p50 / p90 / p99 / max on demand.
+#
+# Stages (names as reported):
+#   rtp_to_appsink   jitterbuffer + depay + decode + convert/scale
+#   appsink_to_loop  ring pending slot + wake-up until process_frames takes it
+#   sched_wait       waiting for an inference grant (INFER_SCHEDULER=1)
+#   mp_image:<task>  make_mp_image (incl. ROI crop copy)
+#   detect:<task>    detect call
+#   pack:<task>      PO/PD encoding
+#   send             send-data for the frame (all channels / MX container)
+#   total            RTP arrival (or appsink when unknown) → last send-data
+
+from __future__ import annotations
+
+from collections import deque
+from typing import Deque, Dict, Optional
+
+import numpy as np
+
+_RTP_PTS_KEEP = 256
+
+
+class StageTracer:
+    def __init__(self, window: int = 512):
+        self.window = window
+        self._win: Dict[str, Deque[float]] = {}
+        self.last_frame: Dict[str, float] = {}  # breakdown of the most recent complete frame
+        self._rtp_arrival: Dict[int, int] = {}
+
+    # ── RTP side (GStreamer thread) ──
+    def note_rtp(self, pts_ns: int, now_ns: int) -> None:
+        # packets of one frame share the PTS: the last one wins (frame complete)
+        arr = self._rtp_arrival
+        arr[pts_ns] = now_ns
+        if len(arr) > _RTP_PTS_KEEP:
+            try:
+                del arr[next(iter(arr))]
+            except (StopIteration, KeyError, RuntimeError):
+                pass
+
+    def rtp_arrival(self, pts_ns: int) -> Optional[int]:
+        return self._rtp_arrival.get(pts_ns) if pts_ns >= 0 else None
+
+    # ── durations ──
+    def add(self, stage: str, ms: float) -> None:
+        d = self._win.get(stage)
+        if d is None:
+            d = self._win[stage] = deque(maxlen=self.window)
+        d.append(ms)
+        self.last_frame[stage] = round(ms, 3)
+
+    def add_ns(self, stage: str, t0_ns: int, t1_ns: int) -> None:
+        self.add(stage, (t1_ns - t0_ns) / 1e6)
+
+    def percentiles(self) -> Dict[str, Dict[str, float]]:
+        out: Dict[str, Dict[str, float]] = {}
+        for stage, d in list(self._win.items()):
+            if not d:
+                continue
+            a = np.fromiter(d, dtype=np.float64, count=len(d))
+            p50, p90, p99 = np.percentile(a, (50, 90, 99))
+            out[stage] = {
+                "n": int(a.size),
+                "avg": round(float(a.mean()), 3),
+                "p50": round(float(p50), 3),
+                "p90": round(float(p90), 3),
+                "p99": round(float(p99), 3),
+                "max": round(float(a.max()), 3),
+            }
+        return out
+
+    def snapshot(self) -> Dict[str, object]:
+        return {"window": self.window, "stages": self.percentiles(), "last_frame": dict(self.last_frame)}
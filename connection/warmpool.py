@@ -0,0 +1,181 @@
+# connection/warmpool.py — pre-built webrtcbin pipelines and decode bins
+#
+# Building a Gst.Pipeline + webrtcbin, and later the depay → decoder → convert →
+# appsink bin (HW decoders open their device on READY), sits on the critical path
+# of every /webrtc/offer and of the first decoded frame. The pool keeps a few of
+# each ready:
+#   • pipelines    : fresh pipeline + configured webrtcbin, set to READY
+#   • decode bins  : per encoding, built with the default decode options and no
+#                    callbacks (decoding.wire_decode_bin connects them), set to READY
+# Objects handed out are never returned; a background thread tops the pool back
+# up after each take. Builders are passed in so this module stays GI-agnostic.
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+
+class WarmPool:
+    def __init__(
+        self,
+        make_pipeline: Callable[[], Any],
+        make_decode_bin: Callable[[str], Any],
+        prewarm: Callable[[Any], None],
+        *,
+        pipelines: int = 2,
+        codecs: Tuple[str, ...] = ("VP8", "H264"),
+        per_codec: int = 1,
+        decode_key: Hashable = None,
+        discard: Callable[[Any], None] | None = None,
+        warn: Callable[[str], None] | None = None,
+    ):
+        self._make_pipeline = make_pipeline
+        self._make_decode_bin = make_decode_bin
+        self._prewarm = prewarm
+        self._discard = discard  # releases an object built after drain() (e.g. → NULL)
+        self.n_pipelines = max(0, pipelines)
+        self.codecs = tuple(c.upper() for c in codecs)
+        self.per_codec = max(0, per_codec)
+        self.decode_key = decode_key  # decode options the pooled bins were built with
+        self._warn = warn
+        self._pipelines: Deque[Any] = deque()
+        self._bins: Dict[str, Deque[Any]] = {c: deque() for c in self.codecs}
+        self._lock = threading.Lock()
+        self._filling = False
+        self._closed = False
+        self.stats: Dict[str, float] = dict(
+            pipeline_hits=0, pipeline_misses=0, decoder_hits=0, decoder_misses=0,
+            build_errors=0, pipeline_build_ms=0.0, decoder_build_ms=0.0,
+        )
+
+    # ── hand-out (any thread) ──
+    def take_pipeline(self) -> Optional[Any]:
+        with self._lock:
+            got = self._pipelines.popleft() if self._pipelines else None
+            self.stats["pipeline_hits" if got is not None else "pipeline_misses"] += 1
+        self.refill_async()
+        return got
+
+    def take_decode_bin(self, encoding: str, key: Hashable) -> Optional[Any]:
+        """A pre-built bin for `encoding`, if one exists for these decode options."""
+        enc = (encoding or "").upper()
+        got = None
+        with self._lock:
+            q = self._bins.get(enc)
+            if q is not None and key == self.decode_key and q:
+                got = q.popleft()
+            self.stats["decoder_hits" if got is not None else "decoder_misses"] += 1
+        if got is not None:
+            self.refill_async()
+        return got
+
+    # ── building (background) ──
+    def fill(self) -> None:
+        """Builds until every target is met. Blocking; run off the event loop."""
+        while not self._closed:
+            with self._lock:
+                enc = None
+                if len(self._pipelines) >= self.n_pipelines:
+                    enc = next((c for c in self.codecs if len(self._bins[c]) < self.per_codec), None)
+                    if enc is None:
+                        return
+            t0 = time.perf_counter()
+            try:
+                obj = self._make_pipeline() if enc is None else self._make_decode_bin(enc)
+                self._prewarm(obj)
+            except Exception as e:
+                with self._lock:
+                    self.stats["build_errors"] += 1
+                if self._warn:
+                    self._warn(f"Warm pool build failed ({enc or 'pipeline'}): {e}")
+                if enc is None:
+                    return
+                # don't retry a codec this machine can't decode
+                with self._lock:
+                    self._bins.pop(enc, None)
+                    self.codecs = tuple(c for c in self.codecs if c != enc)
+                continue
+            self._note_build("pipeline_build_ms" if enc is None else "decoder_build_ms", t0)
+            with self._lock:
+                closed = self._closed
+                if not closed:
+                    (self._pipelines if enc is None else self._bins[enc]).append(obj)
+            if closed:
+                # drain() ran during the build: nobody else will release this one
+                if self._discard is not None:
+                    self._discard(obj)
+                return
+
+    def refill_async(self) -> None:
+        with self._lock:
+            if self._filling or self._closed:
+                return
+            self._filling = True
+
+        def _run():
+            try:
+                self.fill()
+            finally:
+                with self._lock:
+                    self._filling = False
+
+        threading.Thread(target=_run, name="WarmPoolFill", daemon=True).start()
+
+    def drain(self) -> List[Any]:
+        """Stops refilling and returns every pooled object (caller sets them to NULL)."""
+        with self._lock:
+            self._closed = True
+            out = list(self._pipelines)
+            self._pipelines.clear()
+            for q in self._bins.values():
+                out.extend(q)
+                q.clear()
+        return out
+
+    def _note_build(self, key: str, t0: float) -> None:
+        ms = (time.perf_counter() - t0) * 1000.0
+        with self._lock:
+            prev = self.stats[key]
+            self.stats[key] = round(ms if not prev else prev * 0.8 + ms * 0.2, 2)
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._lock:
+            return dict(
+                self.stats,
+                pipelines=len(self._pipelines),
+                pipelines_target=self.n_pipelines,
+                decode_bins={c: len(q) for c, q in self._bins.items()},
+                per_codec=self.per_codec,
+            )
+
+
+class StartupTimes:
+    """Rolling time-to-first-frame / time-to-first-result per session, split by
+    whether the session got a pre-built pipeline ('warm') or not ('cold')."""
+
+    def __init__(self, keep: int = 128):
+        self._rec: Deque[Tuple[bool, str, float]] = deque(maxlen=keep)
+
+    def add(self, warm: bool, what: str, ms: float) -> None:
+        self._rec.append((warm, what, float(ms)))
+
+    def snapshot(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        out: Dict[str, Dict[str, Dict[str, float]]] = {}
+        for warm in (True, False):
+            for what in ("first_frame", "first_result"):
+                v = [ms for w, k, ms in list(self._rec) if w == warm and k == what]
+                if not v:
+                    continue
+                a = np.asarray(v, dtype=np.float64)
+                out.setdefault("warm" if warm else "cold", {})[what] = {
+                    "n": int(a.size),
+                    "p50": round(float(np.percentile(a, 50)), 1),
+                    "p90": round(float(np.percentile(a, 90)), 1),
+                    "max": round(float(a.max()), 1),
+                }
+        return out
@@ -11,8 +11,11 @@ import asyncio
 import struct
 import threading
 import contextlib
+import gc
 import traceback
 import inspect
+import dataclasses
+import functools
 from dataclasses import dataclass
 from collections import deque
 from typing import Callable, Optional, Dict, Set, List, Tuple, Any, Awaitable
@@ -29,8 +32,19 @@ gi.require_version("GstApp", "1.0")
 from gi.repository import Gst, GstWebRTC, GstSdp, GstApp, GLib, GObject
 
 from .robust_bytes import _as_bytes
-from .decoding import attach_rtp_video_decode_chain  # ← keeps decode chain separate
+from .decoding import attach_rtp_video_decode_chain, build_rtp_video_decode_bin, probe_factories
 from .processing import process_frames  # ← NEW: externalized frame loop
+from .framering import FrameRing, rgb_view
+from . import affinity  # optional CPU pinning (CPU_AFFINITY)
+from .scheduler import get_scheduler, SESSION_MAX_FPS
+from .temporal import LandmarkTracker, TemporalConfig
+from .acks import AckWindow
+from .events import EVENTS
+from .roi import RoiConfig, RoiTracker
+from .tracing import StageTracer
+from .warmpool import StartupTimes, WarmPool
+from .recording import FrameRecorder
+from .dcsend import DcSendGate
 
 Gst.init(None)
 
@@ -125,19 +139,46 @@ def _gdebug(msg: str):
     _log_print(f"Srv 0 {_ts()} DEBUG: {msg}", flush=True)
 
 
+if PRINT_LOGS:
+    EVENTS.set_echo(lambda line: _log_print(f"Srv 0 {_ts()} EVENT: {line}", flush=True))
+
+
 def _exc_str(e: BaseException) -> str:
     """repr + traceback for returning in JSON and printing."""
     tb = traceback.format_exc()
     return f"{e!r}\n{tb}"
 
 
+def _parse_flag(v: Any) -> bool:
+    """JSON boolean, or "true"/"false"/"1"/"0"/"on"/"off" strings; anything else → ValueError."""
+    if isinstance(v, bool):
+        return v
+    if isinstance(v, str):
+        key = v.strip().lower()
+        if key in ("1", "true", "yes", "on"):
+            return True
+        if key in ("0", "false", "no", "off"):
+            return False
+    raise ValueError(v)
+
+
 # ──────────────────────────────────────────────────────────────────────────────
 # Adapter API (modular multi-task):
 # - For each task:
 #   make_mp_image(rgb_np) -> mp.Image
 #   detect_image(mp_image) -> result
 #   detect_video(mp_image, ts_ms: int) -> result
-#   points_from_result(result, img_shape) -> (w, h, List[List[(x,y)]])
+#   points_from_result(result, img_shape) -> (w, h, List[List[(x,y)]] | (N,K,2) int ndarray)
+#   (ndarray points are packed with the vectorized encoders in connection/packing.py)
+#   Optional: points_from_result(..., indices=ndarray) converts only those landmarks
+#   (per-session subsets; adapters without the kwarg get their output sliced).
+#   Optional: temporal=TemporalConfig(...) runs detect at an adaptive cadence and
+#   sends filtered/extrapolated points in between (connection/temporal.py).
+#   Optional: roi=RoiConfig(...) feeds make_mp_image a crop around the previous
+#   result (connection/roi.py); points_from_result sees the crop's shape and the
+#   session shifts the points back to full-frame coordinates.
+#   Optional: depends_on/run_if/roi_from make a small per-frame DAG, e.g. face only
+#   when pose found someone, on a crop around the pose head landmarks.
 # If you don't pass adapters, we fallback to the legacy single-task hooks.
 # ──────────────────────────────────────────────────────────────────────────────
 @dataclass(frozen=True)
@@ -146,8 +187,100 @@ class TaskAdapter:
     make_mp_image: Callable[[np.ndarray], Any]
     detect_image: Callable[[Any], Awaitable[Any] | Any]
     detect_video: Callable[[Any, int], Awaitable[Any] | Any]
-    points_from_result: Callable[[Any, tuple[int, int, int]], tuple[int, int, List[List[Tuple[int, int]]]]]
+    points_from_result: Callable[[Any, tuple[int, int, int]], tuple[int, int, List[List[Tuple[int, int]]] | np.ndarray]]
     log_label: str = "keypoints"
+    pd_version: Optional[int] = None  # PD format for this task (None → PD_VERSION; 4 = motion-compensated)
+    landmark_presets: Optional[Dict[str, Tuple[int, ...]]] = None  # named index subsets
+    num_landmarks: Optional[int] = None  # points per object (validates subsets, "every:N")
+    temporal: Optional[TemporalConfig] = None  # inference every N frames + filtered extrapolation
+    roi: Optional[RoiConfig] = None  # infer on a crop around the previous landmarks
+    # Per-frame dependencies between tasks of one session (ignored when the dependency
+    # isn't active). Callables get {task: (N,K,2) int32 full-landmark points, sender px};
+    # run_if isn't consulted when that dict is empty.
+    depends_on: Tuple[str, ...] = ()
+    run_if: Optional[Callable[[Dict[str, np.ndarray]], bool]] = None  # False → skip (empty result)
+    roi_from: Optional[Callable[[Dict[str, np.ndarray]], Optional[np.ndarray]]] = None  # region points
+
+
+def resolve_landmark_subset(ad: TaskAdapter, spec: Any) -> Optional[np.ndarray]:
+    """Subset spec → int32 index array, order preserved (None = all points).
+    Accepts a preset name, "every:N" (decimation), "i,j,k", a list of ints or
+    "all"/None. Raises ValueError for unknown presets, out-of-range indices or
+    any other spec type."""
+    if spec is None:
+        return None
+    if isinstance(spec, str):
+        key = spec.strip().lower()
+        if key in ("", "all", "none", "full"):
+            return None
+        presets = ad.landmark_presets or {}
+        if key in presets:
+            return np.asarray(presets[key], dtype=np.int32)
+        if key.startswith("every:"):
+            step = int(key.split(":", 1)[1])
+            if step < 1 or not ad.num_landmarks:
+                raise ValueError(f"'{spec}' needs a positive step and a task with num_landmarks")
+            return np.arange(0, ad.num_landmarks, step, dtype=np.int32)
+        try:
+            spec = [int(t) for t in key.replace(" ", "").split(",") if t]
+        except ValueError:
+            raise ValueError(
+                f"unknown landmark preset '{spec}' for task '{ad.name}'; allowed={sorted(presets)}"
+            ) from None
+    if not isinstance(spec, (list, tuple)) or not all(
+        isinstance(i, (int, np.integer)) and not isinstance(i, bool) for i in spec
+    ):
+        raise ValueError(f"landmark subset for task '{ad.name}' must be a preset name or a list of ints")
+    idx = np.asarray(spec, dtype=np.int32).reshape(-1)
+    if idx.size == 0:
+        raise ValueError("empty landmark subset")
+    if idx.min() < 0 or (ad.num_landmarks and idx.max() >= ad.num_landmarks):
+        raise ValueError(f"landmark index out of range for task '{ad.name}' (0..{(ad.num_landmarks or 0) - 1})")
+    return idx
+
+
+def adapter_order(adapters: List[TaskAdapter]) -> List[TaskAdapter]:
+    """Topological order of `adapters` by depends_on (dependencies outside the list
+    are ignored). Raises ValueError on a cycle."""
+    by_name = {a.name: a for a in adapters}
+    order: List[TaskAdapter] = []
+    state: Dict[str, int] = {}  # 1 = visiting, 2 = done
+
+    def visit(ad: TaskAdapter, path: Tuple[str, ...]) -> None:
+        if state.get(ad.name) == 2:
+            return
+        if state.get(ad.name) == 1:
+            raise ValueError(f"adapter dependency cycle: {' -> '.join(path + (ad.name,))}")
+        state[ad.name] = 1
+        for dep in ad.depends_on:
+            if dep in by_name:
+                visit(by_name[dep], path + (ad.name,))
+        state[ad.name] = 2
+        order.append(ad)
+
+    for ad in adapters:
+        visit(ad, ())
+    return order
+
+
+def options_from_spec(base, spec: Any, label: str):
+    """Per-session override of a frozen options dataclass: False/None → None (off),
+    True → `base`, dict → `base` with those fields replaced (values coerced to the
+    field's type). Raises ValueError for unknown fields or bad values."""
+    if not spec:
+        return None
+    if spec is True:
+        return base
+    if not isinstance(spec, dict):
+        raise ValueError(f"{label}: expected true/false or an object of options")
+    fields = set(base.__dataclass_fields__)
+    unknown = set(spec) - fields
+    if unknown:
+        raise ValueError(f"{label}: unknown option(s) {sorted(unknown)}; allowed={sorted(fields)}")
+    try:
+        return dataclasses.replace(base, **{k: type(getattr(base, k))(v) for k, v in spec.items()})
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"{label}: bad options {spec} ({e})") from None
 
 
 # ─────────────── Config por ENV ───────────────
@@ -155,10 +288,38 @@ POSE_USE_VIDEO = os.getenv("POSE_USE_VIDEO", "0") == "1"
 ABSOLUTE_INTERVAL_MS = int(os.getenv("ABSOLUTE_INTERVAL_MS", "0"))
 IDLE_TO_FORCE_KF_MS = int(os.getenv("IDLE_TO_FORCE_KF_MS", "500"))
 FRAME_GAP_WARN_MS = int(os.getenv("FRAME_GAP_WARN_MS", "180"))
+MIN_SEND_MS = int(os.getenv("MIN_SEND_MS", "33"))  # global rate gate (~30 fps)
+FRAME_RING_SLOTS = int(os.getenv("FRAME_RING_SLOTS", "3"))
+# Congestion-aware pacing: skip inference while every result DC is paused (see below)
+# and stretch the send interval to the inference latency and DC drain rate
+ADAPTIVE_SEND = os.getenv("ADAPTIVE_SEND", "1") == "1"
+MAX_SEND_MS = int(os.getenv("MAX_SEND_MS", "250"))  # upper bound of the adaptive interval
+# Per result DC: sending pauses once buffered-amount reaches DC_BUFFER_HIGH (the newest
+# packet is held meanwhile) and resumes on on-buffered-amount-low at DC_BUFFER_LOW
+DC_BUFFER_HIGH = int(os.getenv("DC_BUFFER_HIGH", "32768"))
+DC_BUFFER_LOW = int(os.getenv("DC_BUFFER_LOW", "8192"))
+
+# Inference resolution inside the decode bin (0 = native). Downscale only; a 0
+# dimension follows the aspect ratio. Points are still reported in sender pixels.
+INFER_WIDTH = int(os.getenv("INFER_WIDTH", "0"))
+INFER_HEIGHT = int(os.getenv("INFER_HEIGHT", "0"))
+CONVERT_THREADS = int(os.getenv("CONVERT_THREADS", "0"))  # videoconvert/videoscale n-threads
+DECODER_LOWRES = int(os.getenv("DECODER_LOWRES", "0"))    # avdec_* lowres: 1 = 1/2, 2 = 1/4
+
+# PD delta format: 2 = int8 deltas clamped to ±127 (legacy clients), 3 = lossless
+# zig-zag varint deltas, 4 = v3 relative to a global (dx, dy, scale) prediction,
+# 5 = v4 relative to the newest frame the client acknowledged (MX only; with
+# RESULTS_REQUIRE_ACK=1 the GAP/STALE/NOCHANGE keyframe timers are skipped).
+# With v3/v4 the keyframe timers below only cover packet loss, so they can be relaxed.
+PD_VERSION = int(os.getenv("PD_VERSION", "2"))
+GAP_KF_MS = int(os.getenv("GAP_KF_MS", "250"))            # no send for this long → keyframe
+STALE_KF_MS = int(os.getenv("STALE_KF_MS", "300"))        # last keyframe older than this → keyframe
+NOCHANGE_KF_MS = int(os.getenv("NOCHANGE_KF_MS", "400"))  # no motion for this long → keyframe
 
 # ACK opcional (confirma entrega real desde el cliente por 'ctrl')
 RESULTS_REQUIRE_ACK = os.getenv("RESULTS_REQUIRE_ACK", "0") == "1"
-ACK_WARN_MS = int(os.getenv("ACK_WARN_MS", "400"))
+ACK_WARN_MS = int(os.getenv("ACK_WARN_MS", "400"))  # floor of the no-ACK → lost timeout
+ACK_WINDOW = int(os.getenv("ACK_WINDOW", "32"))      # max results packets in flight before sending pauses
 
 STUN_URL = os.getenv("STUN_URL", "stun:stun.l.google.com:19302")
 TURN_URL = os.getenv("TURN_URL")
@@ -175,12 +336,52 @@ SEND_GREETING = os.getenv("SEND_GREETING", "0") == "1"
 # NEW: additional negotiated DC id for FACE (optional; others auto-assign)
 DC_FACE_ID = int(os.getenv("DC_FACE_ID", "2"))
 
+# Opt-in: one MX container per frame with every adapter's packet on the 'results' DC
+# (overridable per offer with {"mux": true|false})
+RESULTS_MUX = os.getenv("RESULTS_MUX", "0") == "1"
+
+# Per-stage latency windows (RTP → appsink → loop → detect → pack → send), see tracing.py
+TRACE_STAGES = os.getenv("TRACE_STAGES", "1") == "1"
+TRACE_WINDOW = int(os.getenv("TRACE_WINDOW", "512"))
+
+# Session limits: offers beyond MAX_SESSIONS get 503; the reaper stops sessions with no
+# decoded frame for SESSION_IDLE_MS or no data-channel traffic (in or out) for DC_IDLE_MS
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", "16"))           # 0 = unlimited
+SESSION_IDLE_MS = int(os.getenv("SESSION_IDLE_MS", "30000"))  # 0 = never
+DC_IDLE_MS = int(os.getenv("DC_IDLE_MS", "60000"))            # 0 = never
+REAPER_INTERVAL_MS = int(os.getenv("REAPER_INTERVAL_MS", "5000"))
+
+# Warm pool (opt-in): pre-built pipelines (webrtcbin) and decode bins per codec, set to
+# READY so /webrtc/offer and the first decoded frame skip element creation/device setup.
+# Off by default: idle READY pipelines hold decoder/device resources from startup.
+WARM_PIPELINES = int(os.getenv("WARM_PIPELINES", "0"))   # 0 = build on demand
+WARM_CODECS = tuple(c.strip().upper() for c in os.getenv("WARM_CODECS", "VP8,H264").split(",") if c.strip())
+WARM_PER_CODEC = int(os.getenv("WARM_PER_CODEC", "0"))   # decode bins kept per codec (default infer size only)
+
+# Opt-in per-session recording of decoded frames (offer "record" or POST .../record);
+# replay offline with `python -m connection.replay <file>`. Clients can only ask for
+# it when the server enables it; their max_mb is capped at RECORD_MAX_MB.
+RECORD_ENABLE = os.getenv("RECORD_ENABLE", "0") == "1"
+RECORD_DIR = os.getenv("RECORD_DIR", "recordings")
+RECORD_MAX_MB = int(os.getenv("RECORD_MAX_MB", "512"))  # per recording; later frames are dropped
+
 # NEW: optional ICE wait time (0 = don't wait, return answer immediately)
 WAIT_FOR_ICE_MS = int(os.getenv("WAIT_FOR_ICE_MS", "0"))  # 0 = don't wait
 
 
 # ─────────────── Estado global ───────────────
 _sessions: Set["GSTWebRTCSession"] = set()
+_reaper_stats: Dict[str, int] = dict(
+    rejected=0,
+    reaped_media_idle=0,
+    reaped_dc_idle=0,
+    reaped_pc_closed=0,
+    reclaimed_bytes=0,  # frame buffers held by stopped sessions (estimate)
+    rss_reclaimed_bytes=0,  # process RSS drop measured around reaper passes
+)
+_warm_pool: Optional[WarmPool] = None
+_startup_times = StartupTimes()
+_factory_probe: Dict[str, object] = {}
 
 # GStreamer MainLoop (GLib) — ejecutar en 2º hilo
 _gst_loop_started = False
@@ -211,6 +412,8 @@ def _ensure_gst_mainloop():
     _ginfo("Starting GstMainLoop thread")
 
     def _run():
+        if affinity.pin_current_thread("gst"):
+            _ginfo(f"GstMainLoop pinned to cores {sorted(affinity.LAYOUT['gst'])}")
         try:
             _gst_loop.run()
         except Exception as e:
@@ -222,68 +425,75 @@ def _ensure_gst_mainloop():
     _gst_loop_thread.start()
 
 
-# Helper to check element availability
+# Helper to check element availability (the registry is fixed once loaded)
+@functools.lru_cache(maxsize=None)
 def _has_factory(name: str) -> bool:
     return Gst.ElementFactory.find(name) is not None
 
 
+def _new_webrtc_pipeline() -> Gst.Pipeline:
+    """Pipeline holding a webrtcbin with the server-wide settings (session-independent)."""
+    pipeline = Gst.Pipeline.new(None)
+    webrtc = Gst.ElementFactory.make("webrtcbin", "webrtcbin")
+    assert webrtc is not None, "webrtcbin plugin not available"
+    webrtc.set_property("latency", 0)
+
+    # STUN/TURN
+    webrtc.set_property("stun-server", _fmt_stun(STUN_URL))
+    turl = _fmt_turn(TURN_URL, TURN_USER, TURN_PASS)
+    if turl:
+        webrtc.set_property("turn-server", turl)
+
+    # Bundle policy
+    webrtc.set_property("bundle-policy", GstWebRTC.WebRTCBundlePolicy.MAX_BUNDLE)
+    pipeline.add(webrtc)
+    return pipeline
+
+
+def _decode_key(opts: Dict[str, Any]) -> Tuple:
+    # decode options a pooled bin must match (callbacks are wired per session)
+    return tuple(opts.get(k) for k in ("out_width", "out_height", "convert_threads", "decoder_lowres"))
+
+
+def _default_decode_opts() -> Dict[str, Any]:
+    return dict(
+        out_width=INFER_WIDTH or None,
+        out_height=INFER_HEIGHT or None,
+        convert_threads=CONVERT_THREADS,
+        decoder_lowres=DECODER_LOWRES,
+    )
+
+
+def _start_warm_pool() -> None:
+    global _warm_pool
+    if _warm_pool is not None or not (WARM_PIPELINES or (WARM_CODECS and WARM_PER_CODEC)):
+        return
+    opts = _default_decode_opts()
+    _warm_pool = WarmPool(
+        _new_webrtc_pipeline,
+        lambda enc: build_rtp_video_decode_bin(enc, None, name=f"rxdecbin-{enc.lower()}", **opts)[0],
+        lambda elem: elem.set_state(Gst.State.READY),
+        pipelines=WARM_PIPELINES,
+        codecs=WARM_CODECS if WARM_PER_CODEC else (),
+        per_codec=WARM_PER_CODEC,
+        decode_key=_decode_key(opts),
+        discard=lambda elem: elem.set_state(Gst.State.NULL),
+        warn=_gwarn,
+    )
+    _warm_pool.refill_async()
+
+
 # ─────────────── Empaquetadores binarios (PO/PD) ───────────────
-def pack_pose_frame(image_w: int, image_h: int, poses: List[List[Tuple[int, int]]]) -> bytes:
-    out = bytearray()
-    out += b"PO"
-    out += bytes([0])  # version
-    out += struct.pack("<H", min(len(poses), 0xFFFF))
-    out += struct.pack("<HH", image_w, image_h)
-    for pts in poses:
-        out += struct.pack("<H", min(len(pts), 0xFFFF))
-        for (x, y) in pts:
-            out += struct.pack("<HH", max(0, min(65535, x)), max(0, min(65535, y)))
-    return bytes(out)
-
-
-def pack_pose_frame_delta(
-    prev: List[List[Tuple[int, int]]] | None,
-    curr: List[List[Tuple[int, int]]],
-    image_w: int,
-    image_h: int,
-    keyframe: bool,
-    *,
-    seq: Optional[int] = None,
-    ver: int = 2,
-) -> bytes:
-    absolute_needed = (prev is None) or (len(prev) != len(curr))
-    keyframe = keyframe or absolute_needed
-    out = bytearray(b"PD")
-    out += bytes([ver & 0xFF])
-    out += bytes([1 if keyframe else 0])
-    if ver >= 1:
-        out += struct.pack("<H", (seq or 0) & 0xFFFF)
-    out += struct.pack("<H", min(len(curr), 0xFFFF))
-    out += struct.pack("<HH", image_w, image_h)
-    if keyframe:
-        for pts in curr:
-            out += struct.pack("<H", min(len(pts), 0xFFFF))
-            for (x, y) in pts:
-                out += struct.pack(
-                    "<HH", max(0, min(65535, x)), max(0, min(65535, y)),
-                )
-        return bytes(out)
-    for p, cpose in enumerate(curr):
-        npts = len(cpose)
-        out += struct.pack("<H", min(npts, 0xFFFF))
-        pmask = 0
-        for i, (x, y) in enumerate(cpose):
-            px, py = prev[p][i]
-            if x != px or y != py:
-                pmask |= (1 << i)
-        mask_bytes = (npts + 7) // 8
-        out += int(pmask).to_bytes(mask_bytes, "little", signed=False)
-        for i, (x, y) in enumerate(cpose):
-            if (pmask >> i) & 1:
-                dx = max(-127, min(127, x - prev[p][i][0]))
-                dy = max(-127, min(127, y - prev[p][i][1]))
-                out += struct.pack("<bb", dx, dy)
-    return bytes(out)
+# Implemented in connection/packing.py (no GI dependency); re-exported here.
+from .packing import (  # noqa: E402
+    pack_pose_frame,
+    pack_pose_frame_delta,
+    pack_pose_frame_np,
+    pack_pose_frame_delta_np,
+    pack_mux_frame,
+    decode_pose_packet,
+    unpack_ack,
+)
 
 
 # ─────────────── PyAV-based AV1 decoder check (opcional) ───────────────
@@ -356,6 +566,31 @@ def _fmt_turn(turn_url: Optional[str], user: Optional[str], pwd: Optional[str])
     return f"{scheme}://{auth}{hostpart}?transport=udp"
 
 
+# ─────────────── Límites de sesión / reaper ───────────────
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+async def _reap_session(sess: "GSTWebRTCSession", reason: str) -> None:
+    """stop() + bookkeeping for sessions ended by the server (idle, PC closed/failed)."""
+    if sess._stopping:
+        return
+    held = sess.memory_bytes()
+    _ginfo(f"[WebRTC {sess.sid}] Reaping session: {reason} (frame buffers {held / 1e6:.1f} MB)")
+    try:
+        await sess.stop()
+    except Exception as e:
+        _gwarn(f"[WebRTC {sess.sid}] stop() during reap failed: {e!r}")
+    _sessions.discard(sess)
+    key = f"reaped_{reason}"
+    _reaper_stats[key] = _reaper_stats.get(key, 0) + 1
+    _reaper_stats["reclaimed_bytes"] += held
+
+
 # ─────────────── Sesión por peer (GStreamer WebRTC) ───────────────
 class GSTWebRTCSession:
     def __init__(
@@ -363,12 +598,25 @@ class GSTWebRTCSession:
         *,
         adapters: List[TaskAdapter],
         loop: asyncio.AbstractEventLoop,
+        mux_results: bool = RESULTS_MUX,
+        infer_size: Tuple[int, int] = (INFER_WIDTH, INFER_HEIGHT),
+        sched_weight: float = 1.0,
+        max_fps: float = SESSION_MAX_FPS,
     ):
         self.loop = loop
+        # All adapters' results in one MX packet per frame on the primary DC
+        self.mux_results = mux_results
 
         # Multi-task adapters (at least one)
         assert adapters and isinstance(adapters, list), "adapters list required"
         self.adapters: List[TaskAdapter] = adapters
+        # Dependency order (depends_on) and the tasks whose points feed another task
+        self.adapter_order: List[TaskAdapter] = adapter_order(adapters)
+        active = {a.name for a in adapters}
+        self.upstream_tasks: Set[str] = {d for a in adapters for d in a.depends_on if d in active}
+        self.dag_stats: Dict[str, Dict[str, int]] = {
+            a.name: dict(ran=0, skipped=0) for a in adapters if a.run_if is not None
+        }
 
         self.pipeline: Optional[Gst.Pipeline] = None
         self.webrtc: Optional[Gst.Element] = None
@@ -378,17 +626,45 @@ class GSTWebRTCSession:
         self.results_dc: Optional[GstWebRTC.WebRTCDataChannel] = None  # alias of first adapter DC
         self.face_dc: Optional[GstWebRTC.WebRTCDataChannel] = None  # convenience
         self.ctrl_dc: Optional[GstWebRTC.WebRTCDataChannel] = None
+        # Send gate per result DC (see connection/dcsend.py); its methods run on the loop
+        self.dc_gates: Dict[GstWebRTC.WebRTCDataChannel, DcSendGate] = {}
 
         # Create asyncio primitives on the right loop/thread
-        self.frame_q: asyncio.Queue = asyncio.Queue(maxsize=1)
+        # frame_ring's pending slot is the mailbox; frame_ready is set only when the
+        # processor parked on an empty ring (see FrameRing.take_or_park)
+        self.frame_ready = asyncio.Event()
+        self.frame_ring = FrameRing(FRAME_RING_SLOTS)
         self.process_task: Optional[asyncio.Task] = None
 
         # Per-adapter last points for delta packing
         self._prev_pts: Dict[str, List[List[Tuple[int, int]]]] = {}
 
+        # Share of the global inference scheduler (INFER_SCHEDULER=1) and FPS budget
+        self.sched_weight = sched_weight
+        self.max_fps = max_fps
+
+        # Decode-bin output size (0 = native) and the sender's size before scaling
+        self.infer_size: Tuple[int, int] = infer_size
+        self._src_size: Optional[Tuple[int, int]] = None
+        self.scale_factor: Tuple[float, float] = (1.0, 1.0)
+
+        # Per-task landmark index subsets (offer "landmarks" or ctrl "SUBSET <task> <spec>")
+        self.landmark_subsets: Dict[str, np.ndarray] = {}
+
+        # Per-task reduced-cadence trackers (adapter temporal=..., offer "temporal")
+        self.trackers: Dict[str, LandmarkTracker] = {
+            ad.name: LandmarkTracker(ad.temporal) for ad in adapters if ad.temporal is not None
+        }
+        # Per-task ROI croppers (adapter roi=..., offer "roi")
+        self.roi_trackers: Dict[str, RoiTracker] = {
+            ad.name: RoiTracker(ad.roi or RoiConfig())
+            for ad in adapters if ad.roi is not None or ad.roi_from is not None
+        }
+
         # Timing / control (shared across tasks)
         self.last_key_ms: int = 0
         self.last_sent_ms: int = 0
+        self.send_interval_ms: float = float(MIN_SEND_MS)  # adaptive (ADAPTIVE_SEND=1)
         self.last_change_ms: int = 0
         self.last_abs_ms: int = 0
         self.idle_start_ms: Optional[int] = None
@@ -396,11 +672,24 @@ class GSTWebRTCSession:
         self.seq: int = 0
         self.last_ts_input: int = 0
 
-        # ACK tracking (for the primary results DC)
-        self._awaiting_ack: Dict[int, int] = {}
-        self._ack_warned: Set[int] = set()
+        # ACK tracking (for the primary results DC); see connection/acks.py
+        self.ack_window = AckWindow(ACK_WINDOW, ACK_WARN_MS)
         self.last_ack_seq: Optional[int] = None
 
+        # Stage latency windows (None = TRACE_STAGES=0)
+        self.tracer: Optional[StageTracer] = StageTracer(TRACE_WINDOW) if TRACE_STAGES else None
+
+        # Liveness (monotonic ms) for the idle reaper; 0 = never
+        self.created_ms: int = int(time.monotonic() * 1000)
+        # Warm pool hits (see _build / _warm_decode_bin)
+        self.warm_pipeline = False
+        self.warm_decoder = False
+        self.last_dc_activity_ms: int = 0
+        self._stopping = False
+
+        # Decoded-frame recorder (None = not recording); written from the appsink thread
+        self.recorder: Optional[FrameRecorder] = None
+
         # CREATE the futures on the provided loop (not the GLib thread)
         self._gathering_done = self.loop.create_future()
         self._local_answer_set = self.loop.create_future()  # NEW: to wait for set-local-description
@@ -413,12 +702,25 @@ class GSTWebRTCSession:
             kf_sent=0,
             delta_sent=0,
             bytes_sent=0,
-            drops_due_buffer=0,
+            drops_due_buffer=0,  # held results replaced by a newer one before the DC drained
+            dc_held=0,           # results that waited for on-buffered-amount-low
+            dc_flushed=0,
+            dc_residency_ms_avg=0.0,
             dc_recycles=0,  # maintained for backward compat; no actual recycle on negotiated
             infer_ms_last=0.0,
             infer_ms_avg=0.0,
             acks=0,
-            ack_rtt_ms_avg=0.0,
+            ack_rtt_ms_avg=0.0,  # smoothed RTT (RFC 6298 srtt)
+            ack_lost=0,
+            mux_entries=0,
+            infer_skipped_congested=0,
+            infer_skipped_paced=0,
+            infer_skipped_temporal=0,  # frames served entirely from the temporal trackers
+            infer_skipped_window=0,    # ACK window full (RESULTS_REQUIRE_ACK=1)
+            ttff_ms=0,  # offer → first decoded frame
+            ttfr_ms=0,  # offer → first results packet sent
+            send_interval_ms=float(MIN_SEND_MS),
+            drain_bytes_per_s=0.0,
         )
 
         # ── Appsink / processing visibility
@@ -431,7 +733,7 @@ class GSTWebRTCSession:
         # ── New: ring buffer for bus diagnostics
         self._bus_tail: deque[str] = deque(maxlen=50)
 
-        self._info(f"New session created; tasks={[a.name for a in adapters]}")
+        self._info(f"New session created; tasks={[a.name for a in adapters]} mux={self.mux_results}")
 
     # ─────────────── session-scope print helpers ───────────────
     def _info(self, msg: str):
@@ -458,21 +760,101 @@ class GSTWebRTCSession:
         if not self._local_answer_set.done():
             self._local_answer_set.set_result(True)
 
+    def set_landmark_subset(self, task: str, spec: Any) -> None:
+        """Selects the landmark subset sent for `task` (loop thread). The next packet
+        for that task is a keyframe since the point count changes."""
+        ad = self._task_adapter(task)
+        idx = resolve_landmark_subset(ad, spec)
+        if idx is None:
+            self.landmark_subsets.pop(ad.name, None)
+        else:
+            self.landmark_subsets[ad.name] = idx
+        self._prev_pts.pop(ad.name, None)
+        tracker = self.trackers.get(ad.name)
+        if tracker is not None:
+            tracker.reset()  # else predict() keeps serving the old subset until the next inference
+        self.need_keyframe = True
+        self._info(f"Landmark subset for '{ad.name}': {'all' if idx is None else f'{idx.size} pts'}")
+
+    def _task_adapter(self, task: str) -> TaskAdapter:
+        ad = next((a for a in self.adapters if a.name == task.lower()), None)
+        if ad is None:
+            raise ValueError(f"task '{task}' not active in this session")
+        return ad
+
+    def set_temporal(self, task: str, spec: Any) -> None:
+        """Enables/disables/tunes reduced-cadence inference for `task`: False/None = off,
+        True = adapter defaults, dict = TemporalConfig fields (e.g. {"max_every": 6})."""
+        ad = self._task_adapter(task)
+        cfg = options_from_spec(ad.temporal or TemporalConfig(), spec, f"temporal ({ad.name})")
+        if cfg is None:
+            self.trackers.pop(ad.name, None)
+            return
+        self.trackers[ad.name] = LandmarkTracker(cfg)
+        self._info(f"Temporal mode for '{ad.name}': {cfg}")
+
+    def set_roi(self, task: str, spec: Any) -> None:
+        """Same contract as set_temporal for ROI cropping (RoiConfig fields)."""
+        ad = self._task_adapter(task)
+        cfg = options_from_spec(ad.roi or RoiConfig(), spec, f"roi ({ad.name})")
+        if cfg is None:
+            self.roi_trackers.pop(ad.name, None)
+            return
+        self.roi_trackers[ad.name] = RoiTracker(cfg)
+        self._info(f"ROI cropping for '{ad.name}': {cfg}")
+
+    def _apply_ctrl_subset(self, text: str) -> None:
+        # "SUBSET <task> <preset|every:N|i,j,k|all>"
+        parts = text.strip().split(None, 2)
+        if len(parts) < 3:
+            self._warn(f"Bad SUBSET command: {text!r}")
+            return
+        try:
+            self.set_landmark_subset(parts[1], parts[2])
+        except ValueError as e:
+            self._warn(f"SUBSET rejected: {e}")
+
+    def _decode_opts(self) -> Dict[str, Any]:
+        w, h = self.infer_size
+        return dict(
+            out_width=w or None,
+            out_height=h or None,
+            convert_threads=CONVERT_THREADS,
+            decoder_lowres=DECODER_LOWRES,
+            on_src_size=self._on_src_size,
+        )
+
+    def _warm_decode_bin(self, enc: str):
+        if _warm_pool is None:
+            return None
+        bin_ = _warm_pool.take_decode_bin(enc, _decode_key(self._decode_opts()))
+        self.warm_decoder = bin_ is not None
+        return bin_
+
+    def note_first_result(self, now_ms: int):
+        ms = now_ms - self.created_ms
+        self.stats["ttfr_ms"] = ms
+        _startup_times.add(self.warm_pipeline, "first_result", ms)
+        self._info(f"First result after {ms}ms (warm pipeline={self.warm_pipeline} decoder={self.warm_decoder})")
+
+    def _on_src_size(self, w: int, h: int):
+        # streaming thread; tuple assignment is atomic
+        self._src_size = (w, h)
+        self._dbg(f"Sender size (before lowres/scaling): {w}x{h}")
+
+    def points_shape(self, frame: np.ndarray) -> Tuple[int, int, int]:
+        """Shape handed to points_from_result: the sender's resolution when the
+        decode bin scaled the frame, so points come out in sender pixels."""
+        if self._src_size is None:
+            return frame.shape
+        return (self._src_size[1], self._src_size[0], frame.shape[2])
+
     def _start_processing_task(self):
         if not self.process_task or self.process_task.done():
             self._info("Starting frame processing task")
             # now call the externalized loop
             self.process_task = self.loop.create_task(process_frames(self))
 
-    def _enqueue_frame(self, frame_np, pts_ns, w, h):
-        try:
-            self.frame_q.put_nowait((frame_np, pts_ns))
-        except asyncio.QueueFull:
-            with contextlib.suppress(Exception):
-                _ = self.frame_q.get_nowait()  # drop oldest
-            self.frame_q.put_nowait((frame_np, pts_ns))
-            self._warn("Frame queue full; dropped oldest (keep-latest policy)")
-
     # ---- pad-buffer probe helper (print-only)
     def _add_buf_probe(self, elem: Gst.Element, label: str, pad_name: str = "src"):
         try:
@@ -522,23 +904,12 @@ class GSTWebRTCSession:
 
     # ───── Pipeline / webrtcbin setup ─────
     def _build(self):
-        self.pipeline = Gst.Pipeline.new(None)
-
-        self.webrtc = Gst.ElementFactory.make("webrtcbin", "webrtcbin")
-        assert self.webrtc is not None, "webrtcbin plugin not available"
-        self.webrtc.set_property("latency", 0)
-
-        # STUN/TURN
-        self.webrtc.set_property("stun-server", _fmt_stun(STUN_URL))
+        pooled = _warm_pool.take_pipeline() if _warm_pool is not None else None
+        self.warm_pipeline = pooled is not None
+        self.pipeline = pooled or _new_webrtc_pipeline()
+        self.webrtc = self.pipeline.get_by_name("webrtcbin")
         turl = _fmt_turn(TURN_URL, TURN_USER, TURN_PASS)
-        if turl:
-            self.webrtc.set_property("turn-server", turl)
-        self._info(f"Using STUN={_fmt_stun(STUN_URL)} TURN={'set' if turl else 'False'}")
-
-        # Bundle policy
-        self.webrtc.set_property("bundle-policy", GstWebRTC.WebRTCBundlePolicy.MAX_BUNDLE)
-
-        self.pipeline.add(self.webrtc)
+        self._info(f"Using STUN={_fmt_stun(STUN_URL)} TURN={'set' if turl else 'False'} warm={self.warm_pipeline}")
 
         # Signals
         self.webrtc.connect("on-data-channel", self._on_data_channel)
@@ -551,6 +922,10 @@ class GSTWebRTCSession:
         bus = self.pipeline.get_bus()
         bus.add_signal_watch()
         bus.connect("message", self._on_bus_message)
+        if affinity.enabled("gst"):
+            # STREAM_STATUS/ENTER is posted synchronously from the new streaming thread
+            bus.enable_sync_message_emission()
+            bus.connect("sync-message::stream-status", self._on_stream_status)
 
         # IMPORTANT: Do NOT pre-create negotiated DCs here anymore.
         # We'll create them *after* set-remote-description and *before* create-answer.
@@ -570,7 +945,9 @@ class GSTWebRTCSession:
         assigned_ids: Set[int] = set()
         next_id = max(DC_RESULTS_ID, DC_CTRL_ID, DC_FACE_ID) + 1
 
-        for idx, ad in enumerate(self.adapters):
+        # MX mode: a single results channel carries every adapter
+        dc_adapters = self.adapters[:1] if self.mux_results else self.adapters
+        for idx, ad in enumerate(dc_adapters):
             if idx == 0:
                 label = "results"
                 dcid = DC_RESULTS_ID
@@ -646,13 +1023,71 @@ class GSTWebRTCSession:
             pass
         return
 
+    def _on_stream_status(self, bus: Gst.Bus, msg: Gst.Message):
+        try:
+            st_type, _owner = msg.parse_stream_status()
+            if st_type == Gst.StreamStatusType.ENTER and affinity.pin_current_thread("gst"):
+                self._dbg(f"Streaming thread '{threading.current_thread().name}' pinned to gst cores")
+        except Exception:
+            pass
+
     def start(self):
         if not self.pipeline:
             self._build()
         self.pipeline.set_state(Gst.State.PLAYING)
         self._info("Pipeline PLAYING")
 
+    def idle_reason(self, now_ms: int) -> Optional[str]:
+        """'media' / 'dc' when the session exceeded an idle timeout, else None."""
+        if SESSION_IDLE_MS and now_ms - max(self.created_ms, self._appsink_last_cb_ms) > SESSION_IDLE_MS:
+            return "media"
+        if DC_IDLE_MS and now_ms - max(self.created_ms, self.last_dc_activity_ms) > DC_IDLE_MS:
+            return "dc"
+        return None
+
+    def start_recording(self, max_mb: Optional[int] = None) -> Dict[str, object]:
+        if self.recorder is not None and not self.recorder.closed:
+            return self.recorder.snapshot()
+        base = os.path.join(RECORD_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{self.sid}")
+        max_mb = min(max_mb, RECORD_MAX_MB) if max_mb and max_mb > 0 else RECORD_MAX_MB
+        self.recorder = FrameRecorder(base, max_mb << 20, meta={
+            "sid": self.sid,
+            "tasks": [a.name for a in self.adapters],
+            "infer_size": list(self.infer_size),
+            "src_size": list(self._src_size) if self._src_size else None,
+        })
+        self._info(f"Recording decoded frames to {base}.raw")
+        return self.recorder.snapshot()
+
+    def stop_recording(self) -> Optional[Dict[str, object]]:
+        rec, self.recorder = self.recorder, None
+        if rec is None:
+            return None
+        info = rec.close()
+        self._info(f"Recording closed: {info['frames']} frames, {info['bytes']} bytes, dropped={info['dropped']}")
+        return info
+
+    def memory_bytes(self) -> int:
+        """Frame buffers owned by the session (ring slots + ROI crop buffers)."""
+        total = self.frame_ring.nbytes
+        for roi in self.roi_trackers.values():
+            total += roi.nbytes
+        return total
+
+    def _schedule_stop(self, reason: str):
+        # any thread → stop() on the session loop, once
+        def _go():
+            if not self._stopping:
+                self.loop.create_task(_reap_session(self, reason))
+        try:
+            self.loop.call_soon_threadsafe(_go)
+        except RuntimeError:
+            pass  # loop already closed
+
     async def stop(self):
+        if self._stopping:
+            return
+        self._stopping = True
         self._info("Stopping session")
         try:
             if self.process_task:
@@ -662,6 +1097,10 @@ class GSTWebRTCSession:
         except Exception as e:
             self._warn(f"Error awaiting process_task cancel: {e}")
 
+        sched = get_scheduler()
+        if sched is not None:
+            sched.unregister(self.sid)
+
         if self.pipeline:
             self.pipeline.set_state(Gst.State.NULL)
 
@@ -670,7 +1109,11 @@ class GSTWebRTCSession:
         self.results_dc = None
         self.face_dc = None
         self.result_dcs.clear()
+        self.dc_gates.clear()
         self.ctrl_dc = None
+        self.frame_ring.clear()
+        if self.recorder is not None:
+            await asyncio.to_thread(self.stop_recording)  # msync + truncate
         self._info("Session stopped")
 
     # ───── Signaling (HTTP) helpers ─────
@@ -748,8 +1191,20 @@ class GSTWebRTCSession:
         if not dc:
             return
 
+        gate = DcSendGate(lambda: int(dc.get_property("buffered-amount") or 0),
+                          high=DC_BUFFER_HIGH, low=DC_BUFFER_LOW)
+        gate.open = dc.get_property("ready-state") == GstWebRTC.WebRTCDataChannelState.OPEN
+        self.dc_gates[dc] = gate
+        try:
+            dc.set_property("buffered-amount-low-threshold", gate.low)
+            dc.connect("on-buffered-amount-low", lambda ch: self.loop.call_soon_threadsafe(self._on_dc_low, ch))
+        except Exception as e:
+            # the gate falls back to probing buffered-amount while paused
+            self._warn(f"buffered-amount-low unavailable on '{dc.props.label}': {e}")
+
         def on_open(ch):
             self._info(f"DataChannel '{ch.props.label}' open")
+            self.loop.call_soon_threadsafe(gate.set_open, True)
             if SEND_GREETING and (ch.props.label or "").startswith("results"):
                 try:
                     ch.emit("send-string", "HELLO_FROM_SERVER")
@@ -765,16 +1220,19 @@ class GSTWebRTCSession:
 
         def on_close(ch):
             self._warn(f"DataChannel '{ch.props.label}' closed")
+            self.loop.call_soon_threadsafe(gate.set_open, False)
 
         def on_error(ch, err):
             self._warn(f"DataChannel '{ch.props.label}' error: {err}")
 
         def _on_msg_str(ch, msg):
+            self.last_dc_activity_ms = int(time.monotonic() * 1000)
             if isinstance(msg, str) and msg.strip().upper() == "KF":
                 self._info(f"Received KF on '{ch.props.label}' (string) → will keyframe next send")
                 self.need_keyframe = True
 
         def _on_msg_bin(ch, data):
+            self.last_dc_activity_ms = int(time.monotonic() * 1000)
             try:
                 b = _as_bytes(data)
                 if b and b.strip().upper() == b"KF":
@@ -789,16 +1247,32 @@ class GSTWebRTCSession:
         dc.connect("on-message-string", _on_msg_str)
         dc.connect("on-message-data", _on_msg_bin)
 
-    def _handle_ack(self, seq: int):
-        ts_now = int(time.monotonic() * 1000)
-        if seq in self._awaiting_ack:
-            rtt = ts_now - self._awaiting_ack.pop(seq)
-            self._ack_warned.discard(seq)
-            self.last_ack_seq = seq
-            prev = float(self.stats["ack_rtt_ms_avg"])
-            self.stats["ack_rtt_ms_avg"] = prev * 0.9 + float(rtt) * 0.1
-            self.stats["acks"] = int(self.stats["acks"]) + 1
-            self._info(f"ACK received for seq={seq} rtt={rtt}ms avg={self.stats['ack_rtt_ms_avg']:.1f}ms")
+    def _on_dc_low(self, dc: GstWebRTC.WebRTCDataChannel):
+        # runs on the asyncio loop; flushes the packet held while the DC was backed up
+        gate = self.dc_gates.get(dc)
+        if gate is None:
+            return
+        try:
+            gate.on_low()
+        except Exception as e:
+            self._warn(f"Flush on '{dc.props.label}' failed: {e}")
+
+    def _handle_ack(self, seq: int, mask: int, now_ms: int, cumulative: bool):
+        # runs on the asyncio loop (ctrl messages arrive on a GStreamer thread), like process_frames
+        win = self.ack_window
+        lost = win.on_ack(seq, mask, now_ms, cumulative)
+        self.last_ack_seq = win.last_acked
+        self.stats["acks"] = int(self.stats["acks"]) + 1
+        self.stats["ack_rtt_ms_avg"] = round(win.srtt, 1)
+        if lost:
+            self.stats["ack_lost"] = int(self.stats["ack_lost"]) + lost
+        if EVENTS.on:
+            EVENTS.emit("ack", self.sid, "received seq=%d mask=%08x srtt=%.1fms loss=%.3f lost=%d",
+                        seq, mask, win.srtt, win.loss, lost)
+
+    def _post_ack(self, seq: int, mask: int = 0, cumulative: bool = False):
+        now_ms = int(time.monotonic() * 1000)
+        self.loop.call_soon_threadsafe(self._handle_ack, seq, mask, now_ms, cumulative)
 
     def _wire_ctrl_dc(self, dc: GstWebRTC.WebRTCDataChannel | None):
         if not dc:
@@ -826,31 +1300,41 @@ class GSTWebRTCSession:
             return None
 
         def _on_msg_str(ch, msg):
+            self.last_dc_activity_ms = int(time.monotonic() * 1000)
             if not isinstance(msg, str):
                 return
             if msg.strip().upper() == "KF":
                 self._info("Received KF on 'ctrl' (string) → will keyframe next send")
                 self.need_keyframe = True
                 return
+            if msg.strip().upper().startswith("SUBSET"):
+                self.loop.call_soon_threadsafe(self._apply_ctrl_subset, msg)
+                return
             seq = _parse_ack_string(msg)
             if seq is not None:
-                self._dbg(f"ACK (string) received: seq={seq}")
-                self._handle_ack(seq)
+                self._post_ack(seq)
 
         def _on_msg_bin(ch, data):
+            self.last_dc_activity_ms = int(time.monotonic() * 1000)
             try:
                 b = _as_bytes(data)
                 if not b:
                     return
+                if b[:2] == b"AK":
+                    seq, mask = unpack_ack(b)
+                    self._post_ack(seq, mask, cumulative=True)
+                    return
                 ub = b.upper()
                 if ub == b"KF":
                     self._info("Received KF on 'ctrl' (binary) → will keyframe next send")
                     self.need_keyframe = True
                     return
+                if ub.startswith(b"SUBSET"):
+                    self.loop.call_soon_threadsafe(self._apply_ctrl_subset, b.decode("utf-8", "replace"))
+                    return
                 if len(b) >= 5 and ub.startswith(b"ACK"):
                     seq = int.from_bytes(b[3:5], "little", signed=False)
-                    self._dbg(f"ACK (binary) received: seq={seq}")
-                    self._handle_ack(seq)
+                    self._post_ack(seq)
             except Exception as e:
                 self._warn(f"Error parsing 'ctrl' binary msg: {e}")
 
@@ -899,15 +1383,8 @@ class GSTWebRTCSession:
             GstWebRTC.WebRTCPeerConnectionState.CLOSED,
             GstWebRTC.WebRTCPeerConnectionState.DISCONNECTED,
         ):
-            try:
-                _sessions.discard(self)
-            except Exception:
-                pass
-            try:
-                if self.pipeline:
-                    self.pipeline.set_state(Gst.State.NULL)
-            except Exception:
-                pass
+            # full stop on the loop (processing task, scheduler slot, frame buffers)
+            self._schedule_stop("pc_closed")
 
     # ───── Incoming media handling ─────
     def _on_incoming_pad(self, webrtc, pad: Gst.Pad):
@@ -929,13 +1406,18 @@ class GSTWebRTCSession:
         # (Optional) quickly count incoming RTP buffers
         try:
             counter = {"n": 0}
+            tracer = self.tracer
 
             def _rtp_probe(_pad, info):
                 if not info or not (info.type & Gst.PadProbeType.BUFFER):
                     return Gst.PadProbeReturn.OK
+                if tracer is not None:
+                    rtp_buf = info.get_buffer()
+                    if rtp_buf is not None and rtp_buf.pts != Gst.CLOCK_TIME_NONE:
+                        tracer.note_rtp(int(rtp_buf.pts), time.monotonic_ns())
                 counter["n"] += 1
-                if counter["n"] <= 5 or (counter["n"] % 50) == 0:
-                    self._dbg(f"RTP PAD buf #{counter['n']} on {pad.name} (encoding={enc})")
+                if EVENTS.on:
+                    EVENTS.emit("rtp", self.sid, "buf #%d on %s (encoding=%s)", counter["n"], pad.name, enc)
                 return Gst.PadProbeReturn.OK
 
             pad.add_probe(Gst.PadProbeType.BUFFER, _rtp_probe)
@@ -953,6 +1435,8 @@ class GSTWebRTCSession:
                     on_new_sample=self._on_new_sample,
                     dbg=(self._dbg if PRINT_LOGS else _noop),
                     warn=self._warn,
+                    prebuilt=self._warm_decode_bin(enc),
+                    **self._decode_opts(),
                 )
                 self._info("Appsink wired (fallback); waiting for decoded RGB frames…")
                 if not self.process_task:
@@ -1033,6 +1517,8 @@ class GSTWebRTCSession:
                 on_new_sample=self._on_new_sample,
                 dbg=(self._dbg if PRINT_LOGS else _noop),
                 warn=self._warn,
+                prebuilt=self._warm_decode_bin(enc),
+                **self._decode_opts(),
             )
             self._info("Appsink wired; waiting for decoded RGB frames…")
             if not self.process_task:
@@ -1042,10 +1528,11 @@ class GSTWebRTCSession:
             self._warn(f"Failed to attach decode chain via jbuf/queue: {e}")
             _fallback_direct_attach()
 
-    # appsink callback (GStreamer thread) — copy frame & enqueue via loop.call_soon_threadsafe
+    # appsink callback (GStreamer thread) — copy frame into the ring, wake the loop if idle
     def _on_new_sample(self, sink: GstApp.AppSink):
         try:
-            now_ms = int(time.monotonic() * 1000)
+            t_sample_ns = time.monotonic_ns()
+            now_ms = t_sample_ns // 1_000_000
 
             sample: Gst.Sample = sink.emit("pull-sample")
             buf: Gst.Buffer = sample.get_buffer()
@@ -1058,42 +1545,63 @@ class GSTWebRTCSession:
             caps_sig = f"{w}x{h}/{fmt}"
             if caps_sig != self._appsink_caps_sig:
                 self._appsink_caps_sig = caps_sig
-                self._info(f"APPSINK caps: {caps.to_string()}")
+                if self._src_size:
+                    self.scale_factor = (self._src_size[0] / w, self._src_size[1] / h)
+                self._info(f"APPSINK caps: {caps.to_string()} scale={self.scale_factor}")
+
+            pts_ns = int(buf.pts) if buf.pts is not None and buf.pts >= 0 else -1
+
+            # every decoded frame counts for Δcb and liveness, gated or not
+            dcb_ms = (now_ms - self._appsink_last_cb_ms) if self._appsink_last_cb_ms else 0
+            self._appsink_last_cb_ms = now_ms
+            last_pts_ns, self._appsink_last_pts_ns = self._appsink_last_pts_ns, pts_ns
+            self._appsink_n += 1
+            if self._appsink_n == 1:
+                self.stats["ttff_ms"] = now_ms - self.created_ms
+                _startup_times.add(self.warm_pipeline, "first_frame", self.stats["ttff_ms"])
+
+            if FRAME_GAP_WARN_MS > 0 and dcb_ms and dcb_ms > FRAME_GAP_WARN_MS:
+                if EVENTS.on:
+                    EVENTS.emit("appsink_gap", self.sid, "Δcb=%dms (> %dms)", dcb_ms, FRAME_GAP_WARN_MS)
+
+            # Idle processor + rate gate still closed → it would drop this frame; skip the copy.
+            gated = not self.frame_ring.busy and (now_ms - self.last_sent_ms) + 2 < self.send_interval_ms
+            recorder = self.recorder
+            if gated and recorder is None:
+                self.frame_ring.note_gated()
+                return Gst.FlowReturn.OK
 
             ok, mapinfo = buf.map(Gst.MapFlags.READ)
             if not ok:
                 self._warn("Failed to map buffer from appsink")
                 return Gst.FlowReturn.ERROR
             try:
-                payload = bytes(mapinfo.data)  # one compact copy
-                pts_ns = int(buf.pts) if buf.pts is not None and buf.pts >= 0 else -1
+                view = rgb_view(mapinfo.data, w, h)
+                if recorder is not None:
+                    # every decoded frame, gated or not: replay sees the real decode cadence
+                    recorder.write(view, pts_ns, t_sample_ns)
+                if gated:
+                    self.frame_ring.note_gated()
+                    return Gst.FlowReturn.OK
+                # single copy into a preallocated slot (no per-frame allocation)
+                t_rtp_ns = (self.tracer.rtp_arrival(pts_ns) or 0) if self.tracer is not None else 0
+                wake = self.frame_ring.write(view, pts_ns, t_rtp_ns, t_sample_ns)
             finally:
                 buf.unmap(mapinfo)
 
-            dcb_ms = (now_ms - self._appsink_last_cb_ms) if self._appsink_last_cb_ms else 0
-            self._appsink_last_cb_ms = now_ms
-            pts_ms = (pts_ns / 1_000_000.0) if pts_ns >= 0 else -1.0
-            dpts_ms = None
-            if self._appsink_last_pts_ns is not None and pts_ns >= 0:
-                dpts_ms = (pts_ns - self._appsink_last_pts_ns) / 1_000_000.0
-            self._appsink_last_pts_ns = pts_ns
-            self._appsink_n += 1
-
-            if FRAME_GAP_WARN_MS > 0 and dcb_ms and dcb_ms > FRAME_GAP_WARN_MS:
-                self._warn(f"APPSINK gap Δcb={dcb_ms}ms (> {FRAME_GAP_WARN_MS}ms)")
-
-            if self._appsink_n <= 5 or (self._appsink_n % 30) == 0:
-                qsz = self.frame_q.qsize()
-                dpts_str = f"{dpts_ms:.1f}ms" if dpts_ms is not None else "n/a"
-                self._dbg(
-                    f"APPSINK sample #{self._appsink_n}: {w}x{h}/{fmt} "
-                    f"pts={pts_ms:.1f}ms Δcb={dcb_ms}ms Δpts={dpts_str} q={qsz}"
+            if EVENTS.on:
+                dpts_ms = (pts_ns - last_pts_ns) / 1e6 if last_pts_ns is not None and pts_ns >= 0 else -1.0
+                EVENTS.emit(
+                    "appsink", self.sid, "sample #%d: %dx%d/%s pts=%.1fms Δcb=%dms Δpts=%.1fms wake=%d",
+                    self._appsink_n, w, h, fmt, pts_ns / 1e6, dcb_ms, dpts_ms, wake,
                 )
 
-            try:
-                self.loop.call_soon_threadsafe(self._enqueue_frame, (payload, w, h), pts_ns, w, h)
-            except Exception as e:
-                self._warn(f"call_soon_threadsafe enqueue failed: {e}")
+            # processor busy → it picks the pending slot up by itself when done
+            if wake:
+                try:
+                    self.loop.call_soon_threadsafe(self.frame_ready.set)
+                except Exception as e:
+                    self._warn(f"call_soon_threadsafe wake failed: {e}")
 
             return Gst.FlowReturn.OK
         except Exception as e:
@@ -1166,10 +1674,26 @@ class GSTWebRTCSession:
                 "results_dc_state": res_state,
                 "ctrl_dc_state": ctrl_state,
                 "stats": dict(self.stats),
+                "frame_ring": self.frame_ring.snapshot(),
+                "infer_size": list(self.infer_size),
+                "src_size": list(self._src_size) if self._src_size else None,
+                "scale_factor": list(self.scale_factor),
                 "bus_tail": list(self._bus_tail),
                 "factories": factories,
                 "adapters": [a.name for a in self.adapters],
+                "landmark_subsets": {k: int(v.size) for k, v in self.landmark_subsets.items()},
+                "temporal": {k: t.snapshot() for k, t in self.trackers.items()},
+                "roi": {k: t.snapshot() for k, t in self.roi_trackers.items()},
+                "trace": self.tracer.snapshot() if self.tracer is not None else None,
+                "acks": self.ack_window.snapshot() if RESULTS_REQUIRE_ACK else None,
+                "warm": {"pipeline": self.warm_pipeline, "decoder": self.warm_decoder},
+                "recording": self.recorder.snapshot() if self.recorder is not None else None,
+                "dag": {
+                    k: dict(v, skip_ratio=round(v["skipped"] / max(1, v["ran"] + v["skipped"]), 3))
+                    for k, v in self.dag_stats.items()
+                },
                 "result_dcs": {k: (v.get_property("ready-state").value_nick if v else None) for k, v in self.result_dcs.items()},
+                "dc_send": {k: self.dc_gates[v].snapshot() for k, v in self.result_dcs.items() if v in self.dc_gates},
             }
         except Exception as e:
             return {"snapshot_error": str(e)}
@@ -1189,6 +1713,8 @@ def build_webrtc_blueprint(
     url_prefix: str = "",
 ) -> Blueprint:
     _ensure_gst_mainloop()
+    if adapters:
+        adapter_order(list(adapters.values()))  # fail fast on dependency cycles
 
     bp = Blueprint("webrtc", url_prefix=url_prefix)
 
@@ -1217,6 +1743,136 @@ def build_webrtc_blueprint(
                 except Exception:
                     pass
 
+    @bp.listener("before_server_start")
+    async def _apply_cpu_affinity(app, loop):
+        if not affinity.enabled():
+            return
+        for ov in affinity.layout_overlaps(affinity.LAYOUT):
+            _gwarn(f"CPU_AFFINITY roles overlap: {ov}")
+        applied = affinity.install_loop_affinity(loop)
+        layout = {r: sorted(c) for r, c in affinity.LAYOUT.items()}
+        _ginfo(f"CPU affinity layout={layout} applied={applied}")
+
+    reaper_task: Dict[str, asyncio.Task] = {}
+
+    async def _reap_loop():
+        while True:
+            await asyncio.sleep(REAPER_INTERVAL_MS / 1000.0)
+            now_ms = int(time.monotonic() * 1000)
+            idle = [(s, r) for s in list(_sessions) if (r := s.idle_reason(now_ms))]
+            if not idle:
+                continue
+            rss0 = _rss_bytes()
+            for sess, reason in idle:
+                await _reap_session(sess, f"{reason}_idle")
+            gc.collect()
+            _reaper_stats["rss_reclaimed_bytes"] += max(0, rss0 - _rss_bytes())
+
+    @bp.listener("before_server_start")
+    async def _prewarm(app, loop):
+        # registry lookups once, then pipelines/decode bins built in the background
+        _factory_probe.update(await asyncio.to_thread(probe_factories, ("webrtcbin",)))
+        _start_warm_pool()
+
+    @bp.get("/webrtc/pool")
+    async def warm_pool_stats(request):
+        return response.json({
+            "pool": _warm_pool.snapshot() if _warm_pool is not None else None,
+            "startup_ms": _startup_times.snapshot(),
+            "factories": _factory_probe,
+        })
+
+    @bp.listener("before_server_start")
+    async def _start_reaper(app, loop):
+        if SESSION_IDLE_MS or DC_IDLE_MS:
+            reaper_task["task"] = loop.create_task(_reap_loop())
+
+    @bp.get("/webrtc/reaper")
+    async def reaper_stats(request):
+        return response.json({
+            "sessions": len(_sessions),
+            "max_sessions": MAX_SESSIONS,
+            "session_idle_ms": SESSION_IDLE_MS,
+            "dc_idle_ms": DC_IDLE_MS,
+            "held_bytes": sum(s.memory_bytes() for s in _sessions),
+            "rss_bytes": _rss_bytes(),
+            **_reaper_stats,
+        })
+
+    @bp.get("/webrtc/sessions")
+    async def list_sessions(request):
+        now_ms = int(time.monotonic() * 1000)
+        out = []
+        for sess in list(_sessions):
+            out.append({
+                "sid": sess.sid,
+                "adapters": [a.name for a in sess.adapters],
+                "age_ms": now_ms - sess.created_ms,
+                "frames_sent": sess.stats["frames_sent"],
+                "infer_ms_avg": round(float(sess.stats["infer_ms_avg"]), 2),
+                "send_interval_ms": sess.stats["send_interval_ms"],
+                "total_ms_p50": (sess.tracer.percentiles().get("total") or {}).get("p50")
+                if sess.tracer is not None else None,
+            })
+        return response.json({"sessions": out, "count": len(out)})
+
+    @bp.get("/webrtc/sessions/<sid>")
+    async def session_detail(request, sid: str):
+        sess = next((s for s in list(_sessions) if s.sid == sid), None)
+        if sess is None:
+            return response.json({"error": f"unknown session '{sid}'"}, status=404)
+        return response.json(sess.snapshot())
+
+    @bp.post("/webrtc/sessions/<sid>/record")
+    async def session_record(request, sid: str):
+        # {"on": true, "max_mb": 256} starts recording decoded frames; {"on": false} closes the files
+        sess = next((s for s in list(_sessions) if s.sid == sid), None)
+        if sess is None:
+            return response.json({"error": f"unknown session '{sid}'"}, status=404)
+        body = request.json or {}
+        if not body.get("on", True):
+            return response.json({"recording": await asyncio.to_thread(sess.stop_recording)})
+        if not RECORD_ENABLE:
+            return response.json({"error": "recording is disabled on this server (RECORD_ENABLE=0)"}, status=403)
+        try:
+            max_mb = int(body["max_mb"]) if body.get("max_mb") else None
+            info = await asyncio.to_thread(sess.start_recording, max_mb)
+        except (TypeError, ValueError):
+            return response.json({"error": "'max_mb' must be an integer"}, status=400)
+        except OSError as e:
+            return response.json({"error": f"cannot create recording: {e}"}, status=500)
+        return response.json({"recording": info})
+
+    @bp.get("/webrtc/events")
+    async def events_dump(request):
+        try:
+            limit = int(request.args.get("limit", "200"))
+        except ValueError:
+            return response.json({"error": "limit must be an integer"}, status=400)
+        return response.json({
+            **EVENTS.stats(),
+            "events": EVENTS.dump(etype=request.args.get("type"), sid=request.args.get("sid"), limit=limit),
+        })
+
+    @bp.post("/webrtc/events")
+    async def events_configure(request):
+        # {"rules": "packet=every:10;*=rate:200"}; "" turns the log off (unless PRINT_LOGS echoes)
+        rules = (request.json or {}).get("rules", "")
+        try:
+            EVENTS.configure(str(rules))
+        except ValueError as e:
+            return response.json({"error": str(e)}, status=400)
+        return response.json(EVENTS.stats())
+
+    @bp.get("/webrtc/cpu")
+    async def cpu_usage(request):
+        return response.json(affinity.cpu_report())
+
+    @bp.get("/webrtc/scheduler")
+    async def scheduler_stats(request):
+        sched = get_scheduler()
+        return response.json(sched.snapshot() if sched else {"enabled": False})
+
     @bp.get("/webrtc/av1/selftest")
     async def av1_selftest(request):
         file_arg = request.args.get("file")
@@ -1234,6 +1890,15 @@ def build_webrtc_blueprint(
             _gwarn("Bad /webrtc/offer: type != offer")
             return response.json({"error": "Type must be 'offer'."}, status=400)
 
+        if MAX_SESSIONS and len(_sessions) >= MAX_SESSIONS:
+            _reaper_stats["rejected"] += 1
+            _gwarn(f"Rejecting /webrtc/offer: {len(_sessions)}/{MAX_SESSIONS} sessions active")
+            return response.json(
+                {"error": "server at capacity", "max_sessions": MAX_SESSIONS},
+                status=503,
+                headers={"Retry-After": str(max(1, REAPER_INTERVAL_MS // 1000))},
+            )
+
         sdp_head = (params.get("sdp") or "")[:512]
         loop = asyncio.get_event_loop()
 
@@ -1267,8 +1932,77 @@ def build_webrtc_blueprint(
                 log_label="default"
             )]
 
-        sess = GSTWebRTCSession(adapters=selected_adapters, loop=loop)
+        mux = params.get("mux")
+        try:
+            mux_results = RESULTS_MUX if mux is None else _parse_flag(mux)
+        except ValueError:
+            return response.json({"error": "'mux' must be true or false"}, status=400)
+        # Optional per-session inference resolution: {"infer_size": [640, 0]} or {"width": 640}
+        isz = params.get("infer_size")
+        try:
+            if isinstance(isz, dict):
+                infer_size = (int(isz.get("width") or 0), int(isz.get("height") or 0))
+            elif isinstance(isz, (list, tuple)) and len(isz) == 2:
+                infer_size = (int(isz[0] or 0), int(isz[1] or 0))
+            elif isz is None:
+                infer_size = (INFER_WIDTH, INFER_HEIGHT)
+            else:
+                raise ValueError
+            if any(v != 0 and v < 16 for v in infer_size):  # 0 = keep aspect / sender size
+                raise ValueError
+        except (TypeError, ValueError):
+            return response.json(
+                {"error": "'infer_size' must be [w, h] or {width, height}, each 0 or >= 16"}, status=400
+            )
+        # Optional scheduler share / FPS budget: {"weight": 2, "max_fps": 15}
+        try:
+            sched_weight = float(params.get("weight", 1.0))
+            max_fps = float(params.get("max_fps", SESSION_MAX_FPS))
+        except (TypeError, ValueError):
+            return response.json({"error": "'weight' and 'max_fps' must be numbers"}, status=400)
+        sess = GSTWebRTCSession(
+            adapters=selected_adapters,
+            loop=loop,
+            mux_results=mux_results,
+            infer_size=infer_size,
+            sched_weight=sched_weight,
+            max_fps=max_fps,
+        )
+        # Optional per-task landmark subsets: {"landmarks": {"face": "portrait", "pose": [0, 11, 12]}}
+        subsets = params.get("landmarks") or {}
+        if not isinstance(subsets, dict):
+            return response.json({"error": "'landmarks' must be an object {task: spec}"}, status=400)
+        try:
+            for task_name, spec in subsets.items():
+                sess.set_landmark_subset(str(task_name), spec)
+        except ValueError as e:
+            return response.json({"error": str(e)}, status=400)
+        # Optional per-task modes: {"temporal": {"face": {"max_every": 6}, "pose": false}, "roi": {"face": true}}
+        for key, setter in (("temporal", sess.set_temporal), ("roi", sess.set_roi)):
+            opts = params.get(key) or {}
+            if not isinstance(opts, dict):
+                return response.json({"error": f"'{key}' must be an object {{task: bool | options}}"}, status=400)
+            try:
+                for task_name, spec in opts.items():
+                    setter(str(task_name), spec)
+            except ValueError as e:
+                return response.json({"error": str(e)}, status=400)
+        # Optional recording of the decoded frames: {"record": true} or {"record": {"max_mb": 256}}
+        rec = params.get("record")
+        if rec and not RECORD_ENABLE:
+            return response.json({"error": "recording is disabled on this server (RECORD_ENABLE=0)"}, status=403)
+        # take the MAX_SESSIONS slot before the first await: concurrent offers see it
         _sessions.add(sess)
+        if rec:
+            try:
+                max_mb = int(rec.get("max_mb") or 0) if isinstance(rec, dict) else 0
+                await asyncio.to_thread(sess.start_recording, max_mb or None)
+            except (TypeError, ValueError):
+                _sessions.discard(sess)
+                return response.json({"error": "'record' must be true or {\"max_mb\": int}"}, status=400)
+            except OSError as e:
+                _sessions.discard(sess)
+                return response.json({"error": f"cannot create recording: {e}"}, status=500)
         sess.start()
 
         try:
@@ -1305,6 +2039,13 @@ def build_webrtc_blueprint(
     @bp.listener("after_server_stop")
     async def _cleanup(app, loop_):
         _ginfo("Server stopping; cleaning sessions")
+        task = reaper_task.pop("task", None)
+        if task:
+            task.cancel()
+        if _warm_pool is not None:
+            for elem in _warm_pool.drain():
+                with contextlib.suppress(Exception):
+                    elem.set_state(Gst.State.NULL)
         for sess in list(_sessions):
             try:
                 await sess.stop()
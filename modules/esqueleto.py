@@ -25,6 +25,16 @@ DEFAULT_MODEL_URLS = [
 os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "0")  # show delegate logs (optional)
 
 
+# ───────────────────── Landmark subsets (BlazePose, 33 pts) ─────────────────────
+NUM_POSE_LANDMARKS = 33
+
+POSE_LANDMARK_PRESETS = {
+    "head": tuple(range(0, 11)),          # nose, eyes, ears, mouth
+    "upper_body": tuple(range(0, 25)),    # head + arms/hands + hips
+    "torso": (11, 12, 23, 24),            # shoulders + hips
+}
+
+
 @dataclass
 class AppConfig:
     model_path: Path
@@ -0,0 +1,72 @@
+# modules/landmarkers_proceso.py
+#
+# Lado "worker" de connection/procpool.py (INFER_PROCS > 0): cada proceso crea sus
+# propios landmarkers de pose y cara (modo IMAGE) y devuelve, por tarea, una función
+# rgb (H,W,3) uint8 → (N,K,2) float32 con x,y normalizados. Solo importa lo necesario
+# para inferir (nada de Sanic ni GStreamer). Los umbrales llegan desde app.py para que
+# coincidan con los del camino WebRTC en proceso.
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+import numpy as np
+import mediapipe as mp
+from mediapipe.tasks.python import vision as mp_vision
+
+from modules.esqueleto import AppConfig as PoseAppConfig, LandmarkerFactory as PoseLandmarkerFactory
+from modules.puntos_faciales import AppConfig as FaceAppConfig, LandmarkerFactory as FaceLandmarkerFactory
+
+
+def _normalizados(landmark_lists) -> np.ndarray:
+    if not landmark_lists:
+        return np.zeros((0, 0, 2), dtype=np.float32)
+    return np.array([[(lm.x, lm.y) for lm in lms] for lms in landmark_lists], dtype=np.float32)
+
+
+def init_landmarkers(
+    pose_model: Optional[str] = None,
+    face_model: Optional[str] = None,
+    delegate: str = "gpu",
+    pose_min_detection: float = 0.5,
+    pose_min_tracking: Optional[float] = None,
+    face_min_detection: float = 0.5,
+) -> Dict[str, Callable[[np.ndarray], np.ndarray]]:
+    """Crea los landmarkers de este proceso; los modelos ya deben estar descargados."""
+    handlers: Dict[str, Callable[[np.ndarray], np.ndarray]] = {}
+
+    if pose_model:
+        pose = PoseLandmarkerFactory(PoseAppConfig(
+            model_path=Path(pose_model),
+            model_urls=[],
+            delegate_preference=delegate,
+            running_mode=mp_vision.RunningMode.IMAGE,
+            max_poses=1,
+            min_pose_detection_confidence=pose_min_detection,
+            min_tracking_confidence=pose_min_tracking,  # MediaPipe solo lo usa en VIDEO/LIVE_STREAM
+        )).create_with_fallback()
+
+        def _pose(rgb: np.ndarray) -> np.ndarray:
+            res = pose.detect(mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb))
+            return _normalizados(getattr(res, "pose_landmarks", None) if res else None)
+
+        handlers["pose"] = _pose
+
+    if face_model:
+        face = FaceLandmarkerFactory(FaceAppConfig(
+            model_path=Path(face_model),
+            model_urls=[],
+            delegate_preference=delegate,
+            running_mode=mp_vision.RunningMode.IMAGE,
+            max_faces=1,
+            min_face_detection_confidence=face_min_detection,
+        )).create_with_fallback()
+
+        def _face(rgb: np.ndarray) -> np.ndarray:
+            res = face.detect(mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb))
+            return _normalizados(getattr(res, "face_landmarks", None) if res else None)
+
+        handlers["face"] = _face
+
+    return handlers
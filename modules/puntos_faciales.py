@@ -26,6 +26,30 @@ DEFAULT_MODEL_URLS = [
 os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "0")  # mostrar logs de delegados (opcional)
 
 
+# ─────────────────── Subconjuntos de landmarks (Face Mesh) ───────────────────
+# Índices del modelo de 478 puntos (468 de malla + 10 de iris), mismos que
+# mp.solutions.face_mesh.FACEMESH_* ("left" = lado izquierdo del sujeto).
+NUM_FACE_LANDMARKS = 478
+
+FACE_OVAL = (10, 338, 297, 332, 284, 251, 389, 356, 454, 323, 361, 288, 397, 365, 379, 378, 400, 377,
+             152, 148, 176, 149, 150, 136, 172, 58, 132, 93, 234, 127, 162, 21, 54, 103, 67, 109)
+LEFT_EYE = (263, 249, 390, 373, 374, 380, 381, 382, 362, 466, 388, 387, 386, 385, 384, 398)
+RIGHT_EYE = (33, 7, 163, 144, 145, 153, 154, 155, 133, 246, 161, 160, 159, 158, 157, 173)
+LIPS_OUTER = (61, 146, 91, 181, 84, 17, 314, 405, 321, 375, 291, 409, 270, 269, 267, 0, 37, 39, 40, 185)
+LIPS_INNER = (78, 95, 88, 178, 87, 14, 317, 402, 318, 324, 308, 415, 310, 311, 312, 13, 82, 81, 80, 191)
+RIGHT_IRIS = (468, 469, 470, 471, 472)
+LEFT_IRIS = (473, 474, 475, 476, 477)
+
+FACE_LANDMARK_PRESETS = {
+    "contour": FACE_OVAL,
+    "eyes": LEFT_EYE + RIGHT_EYE,
+    "lips": LIPS_OUTER + LIPS_INNER,
+    "irises": RIGHT_IRIS + LEFT_IRIS,
+    # contorno + ojos + boca exterior (88 puntos) — lo que usa el cliente de retratos
+    "portrait": FACE_OVAL + LEFT_EYE + RIGHT_EYE + LIPS_OUTER,
+}
+
+
 @dataclass
 class AppConfig:
     model_path: Path